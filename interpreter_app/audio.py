@@ -0,0 +1,117 @@
+# interpreter_app/audio.py
+#
+# Recordings on their way to /transcribe: decoded from whatever container
+# the browser produced (WebM/Ogg Opus, WAV, ...), resampled to the speech
+# model's rate, trimmed of leading and trailing silence and re-emitted as a
+# WAV stream. Everything is a generator over chunks, so audio is forwarded
+# as it is decoded instead of after the whole file. Django-free.
+
+import io
+import struct
+from itertools import chain
+
+import av
+import numpy as np
+
+SPEECH_RATE = 16000
+FRAME_MS = 30
+
+
+class _ChunkReader(io.RawIOBase):
+    """Read-only, non-seekable file over an iterable of byte chunks."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            self._buffer = next(self._chunks, None)
+            if self._buffer is None:
+                self._buffer = b''
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def decode_pcm(chunks, rate=SPEECH_RATE):
+    """Yields mono int16 arrays at rate from an audio file given as byte chunks."""
+    with av.open(_ChunkReader(chunks), mode='r') as container:
+        resampler = av.AudioResampler(format='s16', layout='mono', rate=rate)
+        for frame in container.decode(audio=0):
+            for resampled in resampler.resample(frame):
+                yield resampled.to_ndarray().reshape(-1)
+        for resampled in resampler.resample(None):
+            yield resampled.to_ndarray().reshape(-1)
+
+
+def _frames(pcm, size):
+    pending = np.empty(0, dtype=np.int16)
+    for samples in pcm:
+        pending = np.concatenate([pending, samples])
+        whole = len(pending) - len(pending) % size
+        for start in range(0, whole, size):
+            yield pending[start:start + size]
+        pending = pending[whole:]
+    if len(pending):
+        yield pending
+
+
+def trim_silence(pcm, rate=SPEECH_RATE, threshold_db=-50.0, padding_ms=300):
+    """
+    Drops silence before the first and after the last frame louder than
+    threshold_db (RMS, dBFS), keeping padding_ms around speech. Silence
+    between words is kept. A recording with no frame above the threshold
+    is passed through whole rather than dropped.
+    """
+    size = rate * FRAME_MS // 1000
+    padding = max(0, padding_ms // FRAME_MS)
+    threshold = 32768.0 * 10 ** (threshold_db / 20)
+    quiet = []
+    heard = False
+    for frame in _frames(pcm, size):
+        if np.sqrt(np.mean(frame.astype(np.float64) ** 2)) < threshold:
+            quiet.append(frame)
+            continue
+        kept = quiet if heard else quiet[max(0, len(quiet) - padding):]
+        if kept:
+            yield np.concatenate(kept)
+        quiet = []
+        heard = True
+        yield frame
+    if quiet:
+        kept = quiet[:padding] if heard else quiet
+        if kept:
+            yield np.concatenate(kept)
+
+
+def wav_stream(pcm, rate=SPEECH_RATE):
+    """
+    16-bit mono WAV bytes for a PCM stream of unknown length: the RIFF and
+    data sizes are set to the maximum, as ffmpeg does for non-seekable
+    output, and readers take the data to run to the end of the stream.
+    """
+    yield (b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE'
+           + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, rate, rate * 2, 2, 16)
+           + b'data' + struct.pack('<I', 0xFFFFFFFF))
+    for samples in pcm:
+        if len(samples):
+            yield samples.astype('<i2').tobytes()
+
+
+def speech_wav(chunks, rate=SPEECH_RATE, trim=True, threshold_db=-50.0, padding_ms=300):
+    """
+    WAV stream of the speech in an audio file given as byte chunks. The
+    first chunk is decoded before returning, so a file that cannot be
+    decoded raises here (av.FFmpegError) rather than mid-stream.
+    """
+    pcm = decode_pcm(chunks, rate)
+    if trim:
+        pcm = trim_silence(pcm, rate, threshold_db, padding_ms)
+    first = next(pcm, np.empty(0, dtype=np.int16))
+    return wav_stream(chain([first], pcm), rate)
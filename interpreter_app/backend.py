@@ -0,0 +1,109 @@
+# interpreter_app/backend.py
+
+import asyncio
+import contextlib
+import random
+import weakref
+
+import httpx
+from django.conf import settings
+
+RETRY_STATUSES = {502, 503, 504}
+# Errors raised before the backend could have acted on the request; anything
+# later (e.g. a read timeout on /converse) is not retried.
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError)
+
+
+def _attempt(kwargs):
+    content = kwargs.get('content')
+    return {**kwargs, 'content': content()} if callable(content) else kwargs
+
+
+class BackendClient:
+    """
+    Shared keep-alive HTTP client for the speech/LLM backend with per-endpoint
+    timeouts, retries with exponential backoff and a cap on in-flight calls.
+    httpx clients are bound to an event loop, so one client (and limiter) is
+    kept per running loop. A body that can only be read once (a stream) is
+    passed as a function returning it, called again for every attempt.
+    """
+
+    def __init__(self, base_url, timeouts=None, default_timeout=60, retries=2, backoff=0.5,
+                 max_concurrency=200, max_connections=100, max_keepalive_connections=20):
+        self.base_url = base_url
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_concurrency = max_concurrency
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections)
+        self._per_loop = weakref.WeakKeyDictionary()
+
+    def _loop_state(self):
+        loop = asyncio.get_running_loop()
+        state = self._per_loop.get(loop)
+        if state is None:
+            client = httpx.AsyncClient(base_url=self.base_url, limits=self.limits)
+            state = (client, asyncio.Semaphore(self.max_concurrency))
+            self._per_loop[loop] = state
+        return state
+
+    async def post(self, endpoint, **kwargs):
+        client, limiter = self._loop_state()
+        timeout = self.timeouts.get(endpoint, self.default_timeout)
+        async with limiter:
+            for attempt in range(self.retries + 1):
+                last_attempt = attempt == self.retries
+                try:
+                    response = await client.post(f'/{endpoint}', timeout=timeout, **_attempt(kwargs))
+                except RETRY_ERRORS:
+                    if last_attempt:
+                        raise
+                else:
+                    if response.status_code not in RETRY_STATUSES or last_attempt:
+                        return response
+                await asyncio.sleep(self.backoff * 2 ** attempt * (0.5 + random.random()))
+
+    @contextlib.asynccontextmanager
+    async def stream(self, endpoint, **kwargs):
+        """
+        Like post(), but yields the response before its body is read. Only
+        opening the response is retried; once yielded, the caller owns the
+        stream and the concurrency slot until the block exits.
+        """
+        client, limiter = self._loop_state()
+        timeout = self.timeouts.get(endpoint, self.default_timeout)
+        async with limiter:
+            for attempt in range(self.retries + 1):
+                last_attempt = attempt == self.retries
+                try:
+                    response = await client.send(
+                        client.build_request('POST', f'/{endpoint}', timeout=timeout, **_attempt(kwargs)), stream=True)
+                except RETRY_ERRORS:
+                    if last_attempt:
+                        raise
+                else:
+                    if response.status_code not in RETRY_STATUSES or last_attempt:
+                        break
+                    await response.aclose()
+                await asyncio.sleep(self.backoff * 2 ** attempt * (0.5 + random.random()))
+            try:
+                yield response
+            finally:
+                await response.aclose()
+
+    async def aclose(self):
+        client, _ = self._loop_state()
+        await client.aclose()
+        del self._per_loop[asyncio.get_running_loop()]
+
+
+backend = BackendClient(
+    base_url=getattr(settings, 'BACKEND_API_URL', 'http://10.32.15.88:6000'),
+    timeouts=getattr(settings, 'BACKEND_TIMEOUTS', {}),
+    retries=getattr(settings, 'BACKEND_RETRIES', 2),
+    backoff=getattr(settings, 'BACKEND_RETRY_BACKOFF', 0.5),
+    max_concurrency=getattr(settings, 'BACKEND_MAX_CONCURRENCY', 200),
+    max_connections=getattr(settings, 'BACKEND_MAX_CONNECTIONS', 100),
+)
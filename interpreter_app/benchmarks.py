@@ -0,0 +1,271 @@
+# interpreter_app/benchmarks.py
+#
+# Benchmarks of the request hot paths (upload, metadata profiling, code
+# execution, rendering and the backend round trips) on synthetic datasets,
+# and of a server process's cold start. Views are driven through the Django test client against a test database,
+# with /converse and /transcribe answered by the local stub backend. Used
+# by the run_benchmarks management command.
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import plotly.express as px
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, override_settings
+from django.test.runner import DiscoverRunner
+
+from interpreter_app.backend import backend
+from interpreter_app.helpers import MetadataProfiler
+from interpreter_app.rendering import render_outputs
+from interpreter_app.reply_cache import reply_cache
+from interpreter_app.result_cache import result_cache
+from interpreter_app.store import df_store
+from interpreter_app.stub_backend import StubBackend
+
+# name: (columns, share of string columns)
+SHAPES = {
+    'narrow-numeric': (8, 0.0),
+    'narrow-string': (8, 0.75),
+    'wide-numeric': (100, 0.0),
+    'wide-string': (100, 0.75),
+}
+DEFAULT_ROWS = (1_000, 10_000, 100_000)
+STAGES = ('startup', 'upload', 'profile', 'execute', 'render', 'converse', 'transcribe')
+
+# Column 0 is always numeric, so every snippet runs on every shape.
+EXECUTE_SNIPPETS = {
+    'describe': "summary = df.describe()\nsummary",
+    'groupby': "means = df.groupby(df[df.columns[0]].round()).mean(numeric_only=True)\nmeans",
+    'hist': "plt.hist(df[df.columns[0]], bins=50)",
+    'head': "top = df.head(1000)\ntop",
+}
+
+# Metrics compared against the baseline, with the smallest difference that
+# counts as a regression whatever the threshold (timer and allocator noise).
+COMPARED_METRICS = {'p50_ms': 5.0, 'peak_rss_mb': 20.0}
+
+
+def make_dataset(rows, shape, seed=0):
+    columns, string_share = SHAPES[shape]
+    rng = np.random.default_rng(seed)
+    string_columns = int(columns * string_share)
+    words = np.array([f'value_{i}' for i in range(1000)])
+    data = {}
+    for i in range(columns):
+        name = f'c{i}'
+        if 0 < i <= string_columns:
+            data[name] = words[rng.integers(0, len(words), rows)]
+        elif i % 2:
+            data[name] = rng.integers(0, 1_000_000, rows)
+        else:
+            data[name] = rng.normal(size=rows)
+    return pd.DataFrame(data)
+
+
+def speech_wav(seconds=5.0, rate=48000):
+    # A tone between stretches of near-silence, like a short spoken command.
+    t = np.arange(int(seconds * rate)) / rate
+    signal = np.where((t > 1) & (t < seconds - 1), 0.3 * np.sin(2 * np.pi * 220 * t), 0.001)
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes((signal * 32767).astype('<i2').tobytes())
+    return buf.getvalue()
+
+
+def _rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakRss:
+    """Samples this process's resident set size on a thread while the block runs."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start = self.peak = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _rss())
+
+    def __enter__(self):
+        self.start = self.peak = _rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss())
+
+
+def measure(fn, repeats, warmup=1):
+    """Runs fn warmup + repeats times; returns latency percentiles and peak RSS of the timed runs."""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    with PeakRss() as rss:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p90_ms': float(np.percentile(timings, 90)),
+        'p99_ms': float(np.percentile(timings, 99)),
+        'mean_ms': float(np.mean(timings)),
+        'peak_rss_mb': rss.peak / 1024 ** 2,
+        'rss_delta_mb': (rss.peak - rss.start) / 1024 ** 2,
+    }
+
+
+def _check(response):
+    data = response.json()
+    if response.status_code != 200 or data.get('status') != 'success':
+        raise RuntimeError(f'{response.request["PATH_INFO"]} failed: {data.get("message")}')
+    return data
+
+
+@contextlib.contextmanager
+def benchmark_environment(sandbox=False):
+    """
+    Test database, scratch media directory, caches disabled (every run does
+    the work) and the stub backend; restores everything afterwards.
+    """
+    runner = DiscoverRunner(verbosity=0, interactive=False)
+    runner.setup_test_environment()
+    databases = runner.setup_databases()
+    media_root = tempfile.mkdtemp(prefix='benchmarks-')
+    stub = StubBackend(port=0, token_latency=0).start_in_thread()
+    # spill_dir for the in-memory store, root for the shared one.
+    store_dir = 'root' if hasattr(df_store, 'root') else 'spill_dir'
+    saved = (getattr(df_store, store_dir), result_cache.memory_budget, result_cache.disk_dir,
+             reply_cache.memory_budget, backend.base_url)
+    setattr(df_store, store_dir, os.path.join(media_root, 'df_store'))
+    result_cache.memory_budget, result_cache.disk_dir = 0, None
+    reply_cache.memory_budget = 0
+    # The client is created per event loop from base_url, so the next
+    # request goes to the stub.
+    backend.base_url = f'http://127.0.0.1:{stub.port}'
+    try:
+        with override_settings(MEDIA_ROOT=media_root,
+                               RENDER_DIR=os.path.join(media_root, 'renders'),
+                               TRANSCRIBE_UPLOAD_DIR=os.path.join(media_root, 'audio_uploads'),
+                               EXECUTE_SANDBOX_DIR=os.path.join(media_root, 'sandbox'),
+                               EXECUTE_SANDBOX_WORKERS=1 if sandbox else 0):
+            yield media_root
+    finally:
+        (directory, result_cache.memory_budget, result_cache.disk_dir,
+         reply_cache.memory_budget, backend.base_url) = saved
+        setattr(df_store, store_dir, directory)
+        runner.teardown_databases(databases)
+        runner.teardown_test_environment()
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+def _startup(*args):
+    # A fresh process, so its peak RSS is not in the metrics.
+    subprocess.run([sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'startup_report', *args],
+                   check=True, capture_output=True)
+
+
+def run_suite(rows=DEFAULT_ROWS, shapes=tuple(SHAPES), stages=STAGES, repeats=5, sandbox=False, log=None):
+    """Returns {benchmark name: metrics}, names being 'stage[shape/rows]'."""
+    from interpreter_app.views import _render_options
+
+    results = {}
+
+    def record(name, fn):
+        results[name] = measure(fn, repeats)
+        if log:
+            log(name, results[name])
+
+    if 'startup' in stages:
+        # Up to the URLconf (what light endpoints wait for), then with the
+        # libraries preloaded and warmed up.
+        record('startup:lazy', lambda: _startup('--no-preload'))
+        record('startup:preload', lambda: _startup())
+    with benchmark_environment(sandbox):
+        client = Client()
+        if 'converse' in stages:
+            record('converse', lambda: _check(client.post(
+                '/generate_code/', json.dumps({'command': 'show the first rows'}),
+                content_type='application/json')))
+        if 'transcribe' in stages:
+            recording = speech_wav()
+            record('transcribe', lambda: _check(client.post(
+                '/transcribe/', {'file': SimpleUploadedFile('recording.wav', recording, 'audio/wav')})))
+        for shape in shapes:
+            for n in rows:
+                df = make_dataset(n, shape)
+                label = f'{shape}/{n}'
+                csv = df.to_csv(index=False).encode()
+                upload = lambda: _check(client.post(
+                    '/upload_data/', {'file': SimpleUploadedFile('data.csv', csv, 'text/csv')}))
+                if 'upload' in stages:
+                    record(f'upload[{label}]', upload)
+                if 'profile' in stages:
+                    record(f'profile[{label}]', lambda: MetadataProfiler().profile(df))
+                if 'execute' in stages:
+                    upload()
+                    for snippet, code in EXECUTE_SNIPPETS.items():
+                        record(f'execute:{snippet}[{label}]', lambda: _check(client.post(
+                            '/execute_code/', json.dumps({'code': code}), content_type='application/json')))
+                if 'render' in stages:
+                    options = _render_options()
+                    numeric = df.columns[0]
+
+                    def figure():
+                        fig, ax = plt.subplots()
+                        ax.hist(df[numeric], bins=50)
+                        try:
+                            render_outputs([fig], options)
+                        finally:
+                            plt.close(fig)
+
+                    record(f'render:figure[{label}]', figure)
+                    record(f'render:table[{label}]', lambda: render_outputs([df], options))
+                    record(f'render:plotly[{label}]', lambda: render_outputs(
+                        [px.scatter(df, x=numeric, y=df.columns[-1])], options))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Regressions of results against baseline: (name, metric, baseline value,
+    value) for each compared metric more than threshold (a fraction) and
+    more than its noise floor above the baseline.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric, floor in COMPARED_METRICS.items():
+            if metric in base and metrics[metric] > base[metric] * (1 + threshold) + floor:
+                regressions.append((name, metric, base[metric], metrics[metric]))
+    return regressions
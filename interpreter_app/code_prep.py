@@ -0,0 +1,236 @@
+# interpreter_app/code_prep.py
+#
+# Turns generated code into what run_code executes, working on the syntax
+# tree: imports of the libraries already in scope are dropped or turned
+# into assignments, a trailing expression (over any number of lines) is
+# split off to be evaluated as the result, and the columns of df the code
+# reads are found so that only those need loading. Prepared code is
+# compiled once and cached by the hash of its text. Django-free, as it runs
+# inside sandbox workers too.
+
+import ast
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Modules the code gets in scope, by import name, and the names they have.
+MODULES = {
+    'pandas': 'pd',
+    'numpy': 'np',
+    'matplotlib.pyplot': 'plt',
+    'seaborn': 'sns',
+    'plotly.express': 'px',
+    'plotly': 'plotly',
+}
+SCOPE_NAMES = set(MODULES.values()) | {'df'}
+# Trailing calls on these are run for their effect: pyplot returns artists
+# that would show up as text next to the rendered figure.
+EFFECT_ROOTS = {'plt', 'print'}
+# Plotly Express and seaborn functions given df plot every column (wide
+# form) unless one of these names the columns to plot.
+AXIS_KEYWORDS = {
+    'x', 'y', 'z', 'names', 'values', 'path', 'dimensions', 'vars', 'x_start',
+    'locations', 'lat', 'lon', 'r', 'theta', 'a', 'b', 'c',
+}
+# Names on which df.<name> is not a column.
+FRAME_ATTRIBUTES = set(dir(pd.DataFrame))
+
+CACHE_SIZE = 256
+
+
+class PreparedCode:
+    """
+    body and expression are code objects: exec body, then eval expression
+    (None when the code does not end in an expression) for the result.
+    imported holds names bound by rewritten imports, columns the df columns
+    read (None when the code may use any of them).
+    """
+
+    def __init__(self, source, body, expression, imported, columns):
+        self.source = source
+        self.body = body
+        self.expression = expression
+        self.imported = imported
+        self.columns = columns
+
+
+def _module_expression(dotted):
+    # pandas.api.types -> pd.api.types, via the longest prefix in scope.
+    parts = dotted.split('.')
+    for i in range(len(parts), 0, -1):
+        name = MODULES.get('.'.join(parts[:i]))
+        if name is not None:
+            node = ast.Name(id=name, ctx=ast.Load())
+            for attr in parts[i:]:
+                node = ast.Attribute(value=node, attr=attr, ctx=ast.Load())
+            return node
+    return None
+
+
+class _Imports(ast.NodeTransformer):
+    # The code runs without builtins, so imports cannot run; the modules are
+    # in scope already. Imports of them (or of their contents) under another
+    # name become assignments, imports of anything else are dropped (using
+    # it fails as before).
+
+    def __init__(self):
+        self.imported = set()
+
+    def _bind(self, statements, name, dotted):
+        value = _module_expression(dotted) if dotted else None
+        if value is None or (isinstance(value, ast.Name) and value.id == name):
+            return
+        self.imported.add(name)
+        statements.append(ast.Assign(targets=[ast.Name(id=name, ctx=ast.Store())], value=value))
+
+    def visit_Import(self, node):
+        statements = []
+        for alias in node.names:
+            if alias.asname:
+                self._bind(statements, alias.asname, alias.name)
+            else:
+                top = alias.name.split('.')[0]
+                self._bind(statements, top, top)
+        return statements or ast.Pass()
+
+    def visit_ImportFrom(self, node):
+        statements = []
+        for alias in node.names:
+            if node.module and not node.level and alias.name != '*':
+                self._bind(statements, alias.asname or alias.name, f'{node.module}.{alias.name}')
+        return statements or ast.Pass()
+
+
+def _root(node):
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Call)):
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _strings(node):
+    """The strings of a constant string or list/tuple of them, else None."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple)):
+        values = [elt.value for elt in node.elts if isinstance(elt, ast.Constant) and isinstance(elt.value, str)]
+        if len(values) == len(node.elts):
+            return values
+    return None
+
+
+def _loaded(node):
+    return getattr(node, 'ctx', None) is None or isinstance(node.ctx, ast.Load)
+
+
+def _plot_columns(call):
+    # px.scatter(df, x='a', ...) or sns.histplot(data=df, x='a', ...).
+    # Every string argument may name a column (those that do not are left
+    # out when loading); a variable might name one too, so any gives None.
+    if _root(call.func) not in {'px', 'sns'}:
+        return None
+    columns = []
+    axes = False
+    for keyword in call.keywords:
+        if keyword.arg is None or any(isinstance(n, ast.Name) and n.id not in SCOPE_NAMES
+                                      for n in ast.walk(keyword.value)):
+            return None
+        names = _strings(keyword.value)
+        if names is not None:
+            columns.extend(names)
+            axes = axes or keyword.arg in AXIS_KEYWORDS
+    return columns if axes else None
+
+
+def _use_columns(node, parents):
+    """The columns one load of df reads, or None if it is not a plain column selection."""
+    parent = parents.get(node)
+    if isinstance(parent, ast.Subscript) and parent.value is node and _loaded(parent):
+        # df['a'], df[['a', 'b']]
+        return _strings(parent.slice)
+    if isinstance(parent, ast.Attribute) and parent.value is node and _loaded(parent):
+        if parent.attr not in FRAME_ATTRIBUTES:
+            return [parent.attr]  # df.a
+        outer = parents.get(parent)
+        if parent.attr == 'loc' and isinstance(outer, ast.Subscript) and _loaded(outer):
+            # df.loc[rows, 'a'] (rows may select by other columns of df)
+            if isinstance(outer.slice, ast.Tuple) and len(outer.slice.elts) == 2:
+                return _strings(outer.slice.elts[1])
+            return None
+        if parent.attr == 'groupby' and isinstance(outer, ast.Call) and outer.func is parent:
+            # df.groupby('a')['b']...
+            selection = parents.get(outer)
+            if not (outer.args and not outer.keywords and isinstance(selection, ast.Subscript)
+                    and selection.value is outer):
+                return None
+            by, selected = _strings(outer.args[0]), _strings(selection.slice)
+            return by + selected if by is not None and selected is not None else None
+        return None
+    if isinstance(parent, ast.Call) and parent.args[:1] == [node]:
+        return _plot_columns(parent)
+    if isinstance(parent, ast.keyword) and parent.arg == 'data':
+        return _plot_columns(parents.get(parent))
+    return None
+
+
+def df_columns(tree):
+    """
+    The df columns the code reads, or None when it may read others: any use
+    of df other than selecting named columns (whole-frame methods, passing
+    df on, writes, sql()) means the whole frame.
+    """
+    parents = {}
+    for node in ast.walk(tree):
+        for child in ast.iter_child_nodes(node):
+            parents[child] = node
+    columns = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Name):
+            continue
+        if node.id == 'sql':
+            return None
+        if node.id != 'df':
+            continue
+        if not isinstance(node.ctx, ast.Load):
+            return None
+        used = _use_columns(node, parents)
+        if used is None:
+            return None
+        columns.update(used)
+    return frozenset(columns)
+
+
+def _prepare(code):
+    tree = ast.parse(code)
+    imports = _Imports()
+    tree = ast.fix_missing_locations(imports.visit(tree))
+    expression = None
+    last = tree.body[-1] if tree.body else None
+    if isinstance(last, ast.Expr) and _root(last.value) not in EFFECT_ROOTS:
+        tree.body.pop()
+        expression = compile(ast.Expression(last.value), '<code>', 'eval')
+    body = compile(tree, '<code>', 'exec')
+    if expression is not None:
+        tree.body.append(last)
+    return PreparedCode(ast.unparse(tree), body, expression, frozenset(imports.imported), df_columns(tree))
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def prepare(code):
+    """PreparedCode for code, compiled once per distinct text. Raises SyntaxError."""
+    key = hashlib.sha256(code.encode()).hexdigest()
+    with _cache_lock:
+        prepared = _cache.get(key)
+        if prepared is not None:
+            _cache.move_to_end(key)
+            return prepared
+    prepared = _prepare(code)
+    with _cache_lock:
+        _cache[key] = prepared
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return prepared
@@ -0,0 +1,378 @@
+# interpreter_app/downsampling.py
+#
+# Opt-in point budget for plots of large frames, so that render time and
+# payload size follow the output resolution rather than the row count.
+# Lines are decimated (min-max per bucket or LTTB), scatter plots keep one
+# point per cell of a grid about the size of the image, and histograms are
+# binned with numpy before matplotlib or plotly sees the data. seaborn line
+# plots are aggregated or thinned before seaborn sees the frame.
+# Django-free, like the executor.
+
+import contextlib
+import threading
+
+import matplotlib
+import numpy as np
+import pandas as pd
+from matplotlib.axes import Axes
+
+# Cells per axis of the grid scatter points are thinned on; about the
+# resolution of a rendered image, so dropped points are ones that would
+# have landed on an already drawn pixel.
+SCATTER_GRID = 2000
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+
+
+def minmax_indices(y, n_out):
+    """
+    Indices keeping the first, last, minimum and maximum point of each of
+    n_out // 4 equal buckets, which preserves a line's envelope. NaN gaps
+    are kept (one per bucket) so breaks in the line survive.
+    """
+    n = len(y)
+    buckets = max(1, n_out // 4)
+    size = -(-n // buckets)
+    padded = buckets * size
+    y = np.asarray(y, dtype=np.float64)
+    nan = np.isnan(y)
+    low = np.full(padded, np.inf)
+    low[:n] = np.where(nan, np.inf, y)
+    high = np.full(padded, -np.inf)
+    high[:n] = np.where(nan, -np.inf, y)
+    offsets = np.arange(buckets) * size
+    keep = [
+        offsets,
+        np.minimum(offsets + size - 1, n - 1),
+        offsets + low.reshape(buckets, size).argmin(axis=1),
+        offsets + high.reshape(buckets, size).argmax(axis=1),
+    ]
+    if nan.any():
+        padded_nan = np.zeros(padded, dtype=bool)
+        padded_nan[:n] = nan
+        has_nan = padded_nan.reshape(buckets, size)
+        keep.append((offsets + has_nan.argmax(axis=1))[has_nan.any(axis=1)])
+    keep = np.unique(np.concatenate(keep))
+    return keep[keep < n]
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: n_out points chosen to keep the line's shape."""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_start, next_stop = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = np.nanmean(x[next_start:next_stop]) if next_stop > next_start else x[-1]
+        avg_y = np.nanmean(y[next_start:next_stop]) if next_stop > next_start else y[-1]
+        area = np.abs((x[previous] - avg_x) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (avg_y - y[previous]))
+        previous = start + int(np.nanargmax(area)) if np.isfinite(area).any() else start
+        keep[i + 1] = previous
+    return keep
+
+
+def line_indices(x, y, n_out, method='minmax'):
+    if method == 'lttb':
+        return lttb_indices(x, y, n_out)
+    return minmax_indices(y, n_out)
+
+
+def line_rows(data_frame, x, y, groups, budget, method='minmax', sort=False):
+    """
+    Sorted positions of the rows of data_frame to keep when y is drawn
+    against x with about budget points in all, shared between the groups
+    (integer codes per row, or None for one line). Lines are drawn in row
+    order, or in x order within each group with sort. Groups whose x does
+    not increase in drawing order are kept whole. None if x or y is not
+    numeric (or datetime for x).
+    """
+    try:
+        xs = data_frame[x].to_numpy()
+        xs = xs if xs.dtype.kind in 'iuf' else xs.astype('datetime64[ns]').astype(np.int64)
+        ys = data_frame[y].to_numpy(dtype=np.float64)
+    except (TypeError, ValueError):
+        return None
+    if groups is None:
+        groups = np.zeros(len(data_frame), dtype=np.int64)
+    keep = []
+    group_count = groups.max() + 1
+    for positions in pd.Series(np.arange(len(groups))).groupby(groups, sort=False).indices.values():
+        if sort:
+            # The group's first row stays, so groups keep their order of appearance.
+            keep.append(positions[:1])
+            positions = positions[np.argsort(xs[positions], kind='stable')]
+        if not np.all(np.diff(xs[positions]) >= 0):
+            keep.append(positions)
+            continue
+        share = max(4, budget // group_count)
+        keep.append(positions[line_indices(xs[positions], ys[positions], share, method)])
+    return np.unique(np.concatenate(keep))
+
+
+def grid_indices(x, y, n_out, groups=None, grid=SCATTER_GRID):
+    """
+    Indices of the first point in each occupied grid cell (per group), then
+    an even sample of those if there are still more than n_out.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    finite = np.isfinite(x) & np.isfinite(y)
+    cells = np.full(len(x), -1, dtype=np.int64)
+    if finite.any():
+        cells[finite] = (_grid_coordinate(x[finite], grid) * grid + _grid_coordinate(y[finite], grid))
+    if groups is not None:
+        cells = np.asarray(groups, dtype=np.int64) * (grid * grid + 1) + cells + 1
+    keep = np.flatnonzero(~pd.Index(cells).duplicated())
+    keep = keep[finite[keep]]
+    if len(keep) > n_out:
+        keep = keep[np.linspace(0, len(keep) - 1, n_out).astype(np.int64)]
+    return keep
+
+
+def _grid_coordinate(values, grid):
+    low, high = values.min(), values.max()
+    if high <= low:
+        return np.zeros(len(values), dtype=np.int64)
+    return np.minimum(((values - low) / (high - low) * grid).astype(np.int64), grid - 1)
+
+
+@contextlib.contextmanager
+def point_budget(budget, line_method='minmax'):
+    """Applies the point budget to matplotlib calls made by this thread in the block."""
+    _install()
+    previous = getattr(_local, 'budget', None)
+    _local.budget = (budget, line_method)
+    try:
+        yield
+    finally:
+        _local.budget = previous
+
+
+def _install():
+    # The Axes methods are wrapped once for the whole process; the wrappers
+    # only act in threads inside a point_budget block.
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        original_plot, original_scatter, original_hist = Axes.plot, Axes.scatter, Axes.hist
+
+        def plot(self, *args, **kwargs):
+            lines = original_plot(self, *args, **kwargs)
+            budget = getattr(_local, 'budget', None)
+            if budget is not None:
+                for line in lines:
+                    _decimate_line(line, *budget)
+            return lines
+
+        def scatter(self, *args, **kwargs):
+            collection = original_scatter(self, *args, **kwargs)
+            budget = getattr(_local, 'budget', None)
+            if budget is not None:
+                _thin_scatter(self, collection, budget[0])
+            return collection
+
+        def hist(self, x, bins=None, range=None, *args, **kwargs):
+            budget = getattr(_local, 'budget', None)
+            if budget is not None and not args and 'weights' not in kwargs:
+                values = _histogram_values(x, budget[0])
+                if values is not None:
+                    counts, edges = np.histogram(
+                        values, bins=matplotlib.rcParams['hist.bins'] if bins is None else bins, range=range)
+                    # One weighted sample per bin draws the same bars.
+                    return original_hist(self, edges[:-1], bins=edges, weights=counts, **kwargs)
+            return original_hist(self, x, bins, range, *args, **kwargs)
+
+        for name, wrapper, original in (('plot', plot, original_plot), ('scatter', scatter, original_scatter),
+                                        ('hist', hist, original_hist)):
+            wrapper.__doc__ = original.__doc__
+            wrapper.__wrapped__ = original
+            setattr(Axes, name, wrapper)
+        _installed = True
+
+
+def _decimate_line(line, budget, method):
+    x, y = line.get_xdata(orig=True), line.get_ydata(orig=True)
+    if len(y) <= budget:
+        return
+    try:
+        x = np.asarray(x)
+        y = np.asarray(y, dtype=np.float64)
+        numeric_x = x if x.dtype.kind in 'iuf' else x.astype('datetime64[ns]').astype(np.int64)
+    except (TypeError, ValueError):
+        return
+    # Decimating by position only keeps the shape of lines drawn left to right.
+    if len(numeric_x) != len(y) or not np.all(np.diff(numeric_x) >= 0):
+        return
+    keep = line_indices(numeric_x, y, budget, method)
+    line.set_data(x[keep], y[keep])
+
+
+def _thin_scatter(ax, collection, budget):
+    offsets = np.asarray(collection.get_offsets())
+    n = len(offsets)
+    if n <= budget:
+        return
+    # Thin in the axes' scaled space so log axes get an even grid.
+    scaled = ax.transScale.transform(offsets)
+    keep = grid_indices(scaled[:, 0], scaled[:, 1], budget)
+    collection.set_offsets(offsets[keep])
+    array = collection.get_array()
+    if array is not None and len(array) == n:
+        collection.set_array(array[keep])
+    for getter, setter in (('get_sizes', 'set_sizes'), ('get_facecolors', 'set_facecolors'),
+                           ('get_edgecolors', 'set_edgecolors'), ('get_linewidths', 'set_linewidths')):
+        values = getattr(collection, getter)()
+        if values is not None and len(values) == n:
+            getattr(collection, setter)(np.asarray(values)[keep])
+
+
+def _histogram_values(x, budget):
+    if isinstance(x, (pd.Series, pd.Index)):
+        x = x.to_numpy()
+    if not isinstance(x, np.ndarray) or x.ndim != 1 or len(x) <= budget or x.dtype.kind not in 'iuf':
+        return None
+    return x[~np.isnan(x)] if x.dtype.kind == 'f' else x
+
+
+class PlotlyExpress:
+    """
+    Stand-in for plotly.express that thins the rows handed to scatter and
+    line and bins histograms of large columns before the figure embeds the
+    data. Every other attribute is the real module's.
+    """
+
+    SCATTER_GROUPS = ('color', 'symbol', 'facet_row', 'facet_col', 'animation_frame')
+    LINE_GROUPS = ('color', 'line_group', 'line_dash', 'symbol', 'facet_row', 'facet_col', 'animation_frame')
+    HISTOGRAM_KWARGS = {'nbins', 'title', 'labels', 'range_x', 'log_y', 'template', 'width', 'height', 'opacity'}
+
+    def __init__(self, px, budget, line_method='minmax'):
+        self._px = px
+        self._budget = budget
+        self._line_method = line_method
+
+    def __getattr__(self, name):
+        return getattr(self._px, name)
+
+    def _frame_args(self, args, kwargs):
+        data_frame = args[0] if args else kwargs.get('data_frame')
+        x, y = kwargs.get('x'), kwargs.get('y')
+        if (not isinstance(data_frame, pd.DataFrame) or len(data_frame) <= self._budget
+                or not isinstance(x, str) or x not in data_frame):
+            return None
+        return data_frame, x, y
+
+    def _group_codes(self, data_frame, kwargs, names):
+        columns = [kwargs[name] for name in names if isinstance(kwargs.get(name), str) and kwargs[name] in data_frame]
+        if not columns:
+            return None
+        return data_frame.groupby(columns, sort=False, dropna=False).ngroup().to_numpy()
+
+    def _with_frame(self, args, kwargs, data_frame):
+        if args:
+            return (data_frame,) + tuple(args[1:]), kwargs
+        return args, dict(kwargs, data_frame=data_frame)
+
+    def scatter(self, *args, **kwargs):
+        frame_args = self._frame_args(args, kwargs)
+        if frame_args is not None and isinstance(frame_args[2], str) and frame_args[2] in frame_args[0]:
+            data_frame, x, y = frame_args
+            try:
+                xs = data_frame[x].to_numpy(dtype=np.float64)
+                ys = data_frame[y].to_numpy(dtype=np.float64)
+            except (TypeError, ValueError):
+                return self._px.scatter(*args, **kwargs)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                xs = np.log10(xs) if kwargs.get('log_x') else xs
+                ys = np.log10(ys) if kwargs.get('log_y') else ys
+            keep = grid_indices(xs, ys, self._budget, self._group_codes(data_frame, kwargs, self.SCATTER_GROUPS))
+            args, kwargs = self._with_frame(args, kwargs, data_frame.iloc[keep])
+        return self._px.scatter(*args, **kwargs)
+
+    def line(self, *args, **kwargs):
+        frame_args = self._frame_args(args, kwargs)
+        if frame_args is not None and isinstance(frame_args[2], str) and frame_args[2] in frame_args[0]:
+            data_frame, x, y = frame_args
+            keep = line_rows(data_frame, x, y, self._group_codes(data_frame, kwargs, self.LINE_GROUPS),
+                             self._budget, self._line_method)
+            if keep is not None:
+                args, kwargs = self._with_frame(args, kwargs, data_frame.iloc[keep])
+        return self._px.line(*args, **kwargs)
+
+    def histogram(self, *args, **kwargs):
+        frame_args = self._frame_args(args, kwargs)
+        if frame_args is None or frame_args[2] is not None or not set(kwargs) - {'data_frame', 'x'} <= self.HISTOGRAM_KWARGS:
+            return self._px.histogram(*args, **kwargs)
+        data_frame, x, _ = frame_args
+        values = _histogram_values(data_frame[x], self._budget)
+        if values is None or not len(values):
+            return self._px.histogram(*args, **kwargs)
+        counts, edges = np.histogram(values, bins=kwargs.get('nbins') or 'auto', range=kwargs.get('range_x'))
+        binned = pd.DataFrame({x: (edges[:-1] + edges[1:]) / 2, 'count': counts})
+        options = {k: v for k, v in kwargs.items() if k not in ('data_frame', 'x', 'nbins')}
+        fig = self._px.histogram(binned, x=x, y='count', histfunc='sum', **options)
+        fig.update_traces(xbins={'start': edges[0], 'end': edges[-1], 'size': edges[1] - edges[0]})
+        fig.update_layout(yaxis_title_text='count')
+        return fig
+
+
+class Seaborn:
+    """
+    Stand-in for seaborn whose lineplot reduces a large frame before seaborn
+    sees it. seaborn aggregates the rows at each x with one estimator call
+    per x value and bootstraps its error band over all of them, so its cost
+    follows the row count however few points are drawn. Rows sharing an x
+    (per hue, size and style) are aggregated here with the estimator, and
+    the error band is dropped; lines with one row per x are thinned like
+    plotted lines. Every other attribute is the real module's.
+    """
+
+    GROUPS = ('hue', 'size', 'style', 'units')
+
+    def __init__(self, sns, budget, line_method='minmax'):
+        self._sns = sns
+        self._budget = budget
+        self._line_method = line_method
+
+    def __getattr__(self, name):
+        return getattr(self._sns, name)
+
+    def lineplot(self, data=None, **kwargs):
+        x, y = kwargs.get('x'), kwargs.get('y')
+        if (isinstance(data, pd.DataFrame) and len(data) > self._budget and isinstance(x, str) and x in data
+                and isinstance(y, str) and y in data and kwargs.get('orient', 'x') == 'x'
+                and kwargs.get('weights') is None):
+            reduced = self._line_data(data, x, y, kwargs)
+            if reduced is not None:
+                data, kwargs = reduced
+        return self._sns.lineplot(data=data, **kwargs)
+
+    def _line_data(self, data, x, y, kwargs):
+        named = [kwargs[name] for name in self.GROUPS if kwargs.get(name) is not None]
+        # Groups given as vectors rather than column names are left alone.
+        if not all(isinstance(name, str) and name in data for name in named):
+            return None
+        groups = list(dict.fromkeys(named))
+        data = data[list(dict.fromkeys(groups + [x, y]))]
+        estimator = kwargs.get('estimator', 'mean')
+        if estimator is not None and data.duplicated(groups + [x]).any():
+            # One row per x and group, in order of first appearance, so hue
+            # and style levels keep their order and colours.
+            data = (data.groupby(groups + [x], sort=False, dropna=False, observed=True)[y]
+                    .agg(estimator).reset_index())
+            kwargs = {**kwargs, 'errorbar': None}
+        codes = data.groupby(groups, sort=False, dropna=False, observed=True).ngroup().to_numpy() if groups else None
+        keep = line_rows(data, x, y, codes, self._budget, self._line_method, sort=kwargs.get('sort', True))
+        if keep is not None:
+            data = data.iloc[keep]
+        return data, kwargs
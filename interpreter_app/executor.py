@@ -0,0 +1,139 @@
+# interpreter_app/executor.py
+#
+# Runs generated code against a DataFrame and converts the results for the
+# frontend. Used in-process by the views and inside sandbox workers, so it
+# must not touch Django settings or models at import time.
+
+import contextlib
+import io
+import time
+import warnings
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import plotly
+import plotly.express as px
+import seaborn as sns
+
+from interpreter_app.code_prep import prepare
+from interpreter_app.downsampling import PlotlyExpress, Seaborn, point_budget
+from interpreter_app.rendering import render_outputs
+from interpreter_app.sql_engine import make_sql
+
+# As in store.py: code gets shallow copies of stored frames, and in sandbox
+# workers frames whose columns are read-only views of a mapped file. Under
+# copy-on-write, chained assignment (df['a'][0] = v, df[mask]['b'] = v)
+# never writes to df; run_code turns its warning into an error.
+pd.set_option('mode.copy_on_write', True)
+
+STANDARD_VARS = {'pd', 'np', 'plt', 'sns', 'px', 'plotly', 'sql', 'df'}
+
+
+def warm_up():
+    # The first savefig of a process builds font caches and loads the Agg
+    # renderer; pay that before serving a request.
+    fig, ax = plt.subplots()
+    ax.plot([0, 1], [0, 1])
+    fig.savefig(io.BytesIO(), format='png')
+    plt.close('all')
+
+
+def clean_code(code):
+    """The code as run (see code_prep.py), normalized; code itself if it does not parse."""
+    try:
+        return prepare(code).source
+    except SyntaxError:
+        return code
+
+
+def run_code(df, code, render_options=None, sql_options=None):
+    """
+    Executes code with df, the plotting libraries and sql() (see
+    sql_engine.py, configured by sql_options) in scope and renders what it
+    produced with render_options (see rendering.DEFAULT_OPTIONS).
+    Returns {'status': 'success', 'output_items': [...], 'df': frame,
+    'timings': {'exec': seconds, 'render': seconds}} where frame is the
+    resulting 'df' (None if the code left no DataFrame there), or
+    {'status': 'error', 'message': ...}.
+    """
+    allowed_locals = {
+        'df': df,
+        'pd': pd,
+        'np': np,
+        'plt': plt,
+        'sns': sns,
+        'px': px,
+        'plotly': plotly
+    }
+    allowed_locals['sql'] = make_sql(
+        lambda: allowed_locals['df'] if isinstance(allowed_locals.get('df'), pd.DataFrame) else None,
+        sql_options)
+    budget = (render_options or {}).get('point_budget')
+    plot_budget = contextlib.nullcontext()
+    if budget:
+        line_method = render_options.get('line_downsampling', 'minmax')
+        allowed_locals['px'] = PlotlyExpress(px, budget, line_method)
+        allowed_locals['sns'] = Seaborn(sns, budget, line_method)
+        plot_budget = point_budget(budget, line_method)
+    exec_globals = {"__builtins__": None}
+    result_value = None
+    imported = frozenset()
+    start = time.perf_counter()
+    try:
+        prepared = prepare(code)
+        imported = prepared.imported
+        with plot_budget, warnings.catch_warnings():
+            # Rather than reporting success with df unchanged.
+            warnings.simplefilter('error', pd.errors.ChainedAssignmentError)
+            exec(prepared.body, exec_globals, allowed_locals)
+            if prepared.expression is not None:
+                result_value = eval(prepared.expression, exec_globals, allowed_locals)
+    except KeyError as e:
+        plt.close('all')
+        return {
+            'status': 'error',
+            'message': f"KeyError: {str(e)}. Check your code logic and variable usage."
+        }
+    except TypeError as e:
+        plt.close('all')
+        return {
+            'status': 'error',
+            'message': f"TypeError: {str(e)}. Ensure your code initializes required variables."
+        }
+    except MemoryError:
+        plt.close('all')
+        return {'status': 'error', 'message': "MemoryError: the code exceeded the memory limit."}
+    except Exception as e:
+        plt.close('all')
+        return {'status': 'error', 'message': f"Error: {str(e)}."}
+
+    exec_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    objects = []
+    if result_value is not None:
+        objects.append(result_value)
+    objects.extend(plt.figure(fignum) for fignum in plt.get_fignums())
+    for var_name, var_value in allowed_locals.items():
+        if var_name in STANDARD_VARS or var_name in imported:
+            continue
+        objects.append(var_value)
+    try:
+        output_items = render_outputs(objects, render_options)
+    finally:
+        plt.close('all')
+    if not output_items:
+        output_items.append({
+            'type': 'text',
+            'data': "Code executed successfully but no notable object found."
+        })
+    new_df = allowed_locals.get('df')
+    return {
+        'status': 'success',
+        'output_items': output_items,
+        'df': new_df if isinstance(new_df, pd.DataFrame) else None,
+        'timings': {'exec': exec_seconds, 'render': time.perf_counter() - start},
+    }
+
@@ -1,30 +1,216 @@
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
 import numpy as np
 import pandas as pd
+from django.conf import settings
+
+from interpreter_app.sketches import HeavyHitters, HyperLogLog, ReservoirSampler, hash_values
+
+SAMPLE_ROWS = 3
+MAX_CATEGORICAL_VALUES = 20
+SKETCH_CHUNK_ROWS = 1_000_000
+
+
+def _root_array(values):
+    while isinstance(values.base, np.ndarray):
+        values = values.base
+    return values
+
+
+def _column_roots(df):
+    roots = []
+    for i in range(df.shape[1]):
+        values = df.iloc[:, i].array
+        if isinstance(values, pd.arrays.NumpyExtensionArray):
+            values = _root_array(values.to_numpy())
+        roots.append(id(values))
+    return roots
 
 
-def update_metadata(df):
-    metadata = {}
-    metadata['columns'] = list(df.columns)
-    metadata['dtypes'] = df.dtypes.apply(lambda x: x.name).to_dict()
-    metadata['sample_rows'] = df.head(3).to_dict(orient='records')
+def shares_all_columns(df, other):
+    """
+    True when df has other's columns and index and every column is backed by
+    the same array, i.e. df is other or a shallow copy that was not written
+    to. Under copy-on-write this detects an unchanged frame without reading
+    its contents.
+    """
+    return (df.shape == other.shape and df.columns.equals(other.columns)
+            and df.index.equals(other.index) and _column_roots(df) == _column_roots(other))
 
-    numerical_cols = df.select_dtypes(include=[np.number]).columns
-    metadata['numerical_ranges'] = {}
-    for col in numerical_cols:
-        min_val = df[col].min()
-        max_val = df[col].max()
-        if pd.api.types.is_integer_dtype(df[col]):
-            min_val, max_val = int(min_val), int(max_val)
+
+def column_fingerprint(series):
+    """
+    Returns (digest, owner). Numeric and categorical columns are hashed by
+    content. Object columns are hashed by the addresses of their elements,
+    which is only meaningful while the array holding them is alive, so owner
+    is a weak reference to that array (None for content hashes).
+    """
+    digest = hashlib.sha256()
+    digest.update(f'{series.dtype.name}:{len(series)}'.encode())
+    owner = None
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        digest.update(np.ascontiguousarray(series.cat.codes.to_numpy()).view(np.uint8))
+        digest.update(pd.util.hash_pandas_object(series.cat.categories, index=False).to_numpy().tobytes())
+    elif isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufcmM':
+        # Plain numpy columns: hash the raw buffer, no per-element work.
+        digest.update(np.ascontiguousarray(series.to_numpy()).view(np.uint8))
+    elif series.dtype == object:
+        values = series.to_numpy()
+        digest.update(memoryview(np.ascontiguousarray(values)).cast('B'))
+        owner = weakref.ref(_root_array(values))
+    else:
+        digest.update(pd.util.hash_pandas_object(series, index=False).to_numpy().tobytes())
+    return digest.hexdigest(), owner
+
+
+class MetadataProfiler:
+    """
+    Builds the metadata sent to /converse. Column statistics are cached by
+    (name, content fingerprint), so re-profiling a frame only recomputes
+    the columns whose contents changed.
+
+    With approximate=True, sample rows come from a reservoir sample and
+    categorical columns are summarized with bounded-memory sketches (top-k
+    heavy hitters and a HyperLogLog distinct count) instead of unique().
+    Such metadata carries 'approximate': True and 'distinct_counts'.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def profile(self, df, approximate=False):
+        metadata = {}
+        metadata['columns'] = list(df.columns)
+        metadata['dtypes'] = df.dtypes.apply(lambda x: x.name).to_dict()
+        if approximate:
+            metadata['sample_rows'] = self._reservoir_rows(df)
         else:
-            min_val, max_val = float(min_val), float(max_val)
-        metadata['numerical_ranges'][col] = {'min': min_val, 'max': max_val}
-
-    categorical_cols = df.select_dtypes(include=['object', 'category']).columns
-    metadata['categorical_values'] = {}
-    for col in categorical_cols:
-        unique_vals = df[col].unique()
-        if len(unique_vals) <= 20:
-            metadata['categorical_values'][col] = unique_vals.tolist()
+            metadata['sample_rows'] = df.head(SAMPLE_ROWS).to_dict(orient='records')
+
+        # Selected from df.dtypes rather than select_dtypes, which copies the
+        # selected columns. Complex and timedelta columns have no usable range.
+        numerical_cols = [c for c, t in df.dtypes.items() if t.kind in 'iuf']
+        categorical_cols = [c for c, t in df.dtypes.items()
+                            if t == object or isinstance(t, pd.CategoricalDtype)]
+        keys = {}
+        owners = {}
+        for col in numerical_cols + categorical_cols:
+            digest, owners[col] = column_fingerprint(df[col])
+            keys[col] = (col, digest, approximate)
+
+        with self._lock:
+            cached = {}
+            for col, key in keys.items():
+                entry = self._cache.get(key)
+                if entry is None:
+                    continue
+                stats, owner = entry
+                # Address-based digests are void once their array is gone.
+                if owner is not None and owner() is None:
+                    del self._cache[key]
+                    continue
+                self._cache.move_to_end(key)
+                cached[col] = stats
+
+        stale_numerical = [c for c in numerical_cols if c not in cached]
+        stale_categorical = [c for c in categorical_cols if c not in cached]
+        computed = {}
+        computed.update(self._numerical_ranges(df, stale_numerical))
+        if approximate:
+            computed.update(self._approximate_categorical_values(df, stale_categorical))
         else:
-            metadata['categorical_values'][col] = unique_vals[:20].tolist() + ['...']
-    return metadata
+            computed.update(self._categorical_values(df, stale_categorical))
+
+        with self._lock:
+            for col, stats in computed.items():
+                self._cache[keys[col]] = (stats, owners[col])
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+        cached.update(computed)
+        metadata['numerical_ranges'] = {col: cached[col] for col in numerical_cols}
+        if approximate:
+            metadata['categorical_values'] = {col: cached[col]['values'] for col in categorical_cols}
+            metadata['distinct_counts'] = {col: cached[col]['distinct'] for col in categorical_cols}
+            metadata['approximate'] = True
+        else:
+            metadata['categorical_values'] = {col: cached[col] for col in categorical_cols}
+        return metadata
+
+    @staticmethod
+    def _reservoir_rows(df):
+        sampler = ReservoirSampler(SAMPLE_ROWS)
+        for start in range(0, len(df), SKETCH_CHUNK_ROWS):
+            sampler.add(np.arange(start, min(start + SKETCH_CHUNK_ROWS, len(df))))
+        return df.iloc[np.sort(sampler.sample)].to_dict(orient='records')
+
+    @staticmethod
+    def _numerical_ranges(df, cols):
+        # One min and one max reduction per dtype kind; mixing ints and floats
+        # in a single reduction would round large integers through float64.
+        ranges = {}
+        by_kind = {}
+        for col in cols:
+            by_kind.setdefault(df[col].dtype.kind, []).append(col)
+        for kind, kind_cols in by_kind.items():
+            frame = df[kind_cols]
+            mins, maxs = frame.min(), frame.max()
+            for col in kind_cols:
+                min_val, max_val = mins[col], maxs[col]
+                cast = int if kind in 'iu' and not (pd.isna(min_val) or pd.isna(max_val)) else float
+                ranges[col] = {'min': cast(min_val), 'max': cast(max_val)}
+        return ranges
+
+    @staticmethod
+    def _categorical_values(df, cols):
+        values = {}
+        for col in cols:
+            unique_vals = df[col].unique()
+            if len(unique_vals) <= MAX_CATEGORICAL_VALUES:
+                values[col] = unique_vals.tolist()
+            else:
+                values[col] = unique_vals[:MAX_CATEGORICAL_VALUES].tolist() + ['...']
+        return values
+
+    @staticmethod
+    def _approximate_categorical_values(df, cols):
+        values = {}
+        for col in cols:
+            series = df[col]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                series = series.cat.codes
+                categories = df[col].cat.categories
+            else:
+                categories = None
+            distinct = HyperLogLog()
+            hitters = HeavyHitters(capacity=4 * MAX_CATEGORICAL_VALUES)
+            for start in range(0, len(series), SKETCH_CHUNK_ROWS):
+                chunk = series.iloc[start:start + SKETCH_CHUNK_ROWS]
+                chunk = chunk[chunk != -1] if categories is not None else chunk.dropna()
+                chunk_values = chunk.to_numpy()
+                hashes = hash_values(chunk_values)
+                distinct.add(hashes)
+                hitters.add(hashes, chunk_values)
+            top = hitters.top(MAX_CATEGORICAL_VALUES)
+            if categories is not None:
+                top = categories.take(top).tolist()
+            n_distinct = max(distinct.count(), len(hitters))
+            if n_distinct > len(top):
+                top = top + ['...']
+            values[col] = {'values': top, 'distinct': n_distinct}
+        return values
+
+
+profiler = MetadataProfiler()
+
+
+def update_metadata(df, approximate=None):
+    if approximate is None:
+        threshold = getattr(settings, 'METADATA_APPROXIMATE_ROWS', None)
+        approximate = threshold is not None and len(df) >= threshold
+    return profiler.profile(df, approximate=approximate)
@@ -0,0 +1,113 @@
+# interpreter_app/history.py
+#
+# Command history and /converse conversation history, stored as rows keyed
+# by session (see models.py) instead of lists inside the session. Writes
+# append the new rows only and reads fetch a bounded slice through the
+# (session_key, id) index, so a request costs the same however long the
+# session has been going.
+
+import json
+
+from django.conf import settings
+from django.db import transaction
+
+from interpreter_app.models import ChatMessage, HistoryEntry
+
+
+def estimate_tokens(message):
+    # About four characters per token for English text and code; close
+    # enough to keep the history under the model's context budget.
+    content = message.get('content', '') if isinstance(message, dict) else message
+    if not isinstance(content, str):
+        content = json.dumps(content, default=str)
+    return len(content) // 4 + 4
+
+
+async def load_chat_history(session_key, token_budget=None, max_messages=None):
+    """
+    The most recent messages of the conversation, oldest first, that fit in
+    token_budget tokens. The history starts at a user message when messages
+    have roles, since a model expects the conversation to open with one.
+    """
+    if token_budget is None:
+        token_budget = getattr(settings, 'CHAT_HISTORY_TOKEN_BUDGET', 4000)
+    if max_messages is None:
+        max_messages = getattr(settings, 'CHAT_HISTORY_MAX_MESSAGES', 100)
+    messages = []
+    total = 0
+    rows = ChatMessage.objects.filter(session_key=session_key).order_by('-id').values_list('message', 'tokens')
+    async for message, tokens in rows[:max_messages]:
+        if total + tokens > token_budget:
+            break
+        total += tokens
+        messages.append(message)
+    messages.reverse()
+    while messages and isinstance(messages[0], dict) and messages[0].get('role', 'user') != 'user':
+        messages.pop(0)
+    return messages
+
+
+async def append_chat_history(session_key, sent, updated, user=None):
+    """
+    Records the conversation after a /converse call: sent is the history
+    that was sent and updated the history the backend returned. Only the
+    messages it appended are written; if it rewrote the history instead,
+    the session's conversation is replaced.
+    """
+    if updated[:len(sent)] != sent:
+        await ChatMessage.objects.filter(session_key=session_key).adelete()
+        new = updated
+    else:
+        new = updated[len(sent):]
+    await ChatMessage.objects.abulk_create([
+        ChatMessage(session_key=session_key, user=user, message=message, tokens=estimate_tokens(message))
+        for message in new
+    ])
+
+
+def clear_chat_history(session_key):
+    ChatMessage.objects.filter(session_key=session_key).delete()
+
+
+def add_entry(session_key, command, code, user=None):
+    with transaction.atomic():
+        last = (HistoryEntry.objects.filter(session_key=session_key)
+                .order_by('-id').values_list('position', flat=True).first())
+        return HistoryEntry.objects.create(
+            session_key=session_key, user=user, position=(last or 0) + 1, command=command, code=code)
+
+
+def entries_page(session_key, before=None, limit=None):
+    """
+    Returns (entries, next_cursor): up to limit entries, newest first, older
+    than the entry with id before. next_cursor is the before value of the
+    following page, or None on the last page.
+    """
+    if limit is None:
+        limit = getattr(settings, 'HISTORY_PAGE_SIZE', 50)
+    entries = HistoryEntry.objects.filter(session_key=session_key)
+    if before is not None:
+        entries = entries.filter(id__lt=before)
+    page = list(entries.order_by('-id').values('id', 'position', 'command', 'code', 'created')[:limit + 1])
+    next_cursor = page[limit - 1]['id'] if len(page) > limit else None
+    return page[:limit], next_cursor
+
+
+async def replay_entries(session_key, ids=None):
+    """
+    (command, code) of the session's entries with the given ids, in that
+    order, or of all its entries oldest first when ids is None. Raises
+    KeyError for an id that is not one of the session's entries.
+    """
+    entries = HistoryEntry.objects.filter(session_key=session_key)
+    if ids is None:
+        return [row async for row in entries.order_by('id').values_list('command', 'code')]
+    found = {row[0]: row[1:] async for row in entries.filter(id__in=ids).values_list('id', 'command', 'code')}
+    for entry_id in ids:
+        if entry_id not in found:
+            raise KeyError(entry_id)
+    return [found[entry_id] for entry_id in ids]
+
+
+def clear_entries(session_key):
+    HistoryEntry.objects.filter(session_key=session_key).delete()
@@ -0,0 +1,127 @@
+# interpreter_app/ingest.py
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+CHUNK_ROWS = 100_000
+# A string column becomes categorical when at most this share of a chunk's
+# values are distinct.
+CATEGORY_MAX_RATIO = 0.5
+
+DELIMITERS = {'.csv': ',', '.txt': '\t', '.tsv': '\t'}
+SUPPORTED_EXTENSIONS = tuple(DELIMITERS) + ('.xlsx',)
+
+
+def is_supported(filename):
+    return filename.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def downcast_chunk(chunk, kinds):
+    for col in chunk.columns:
+        series = chunk[col]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_integer_dtype(series):
+            if 'integer' in kinds:
+                chunk[col] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series):
+            if 'float' not in kinds:
+                continue
+            narrow = series.astype('float32')
+            # Only keep float32 when it represents every value exactly.
+            if ((narrow.astype('float64') == series) | series.isna()).all():
+                chunk[col] = narrow
+        elif series.dtype == object and 'category' in kinds:
+            n_unique = series.nunique(dropna=True)
+            if len(series) and n_unique <= len(series) * CATEGORY_MAX_RATIO:
+                chunk[col] = series.astype('category')
+    return chunk
+
+
+def _concat_chunks(chunks):
+    if len(chunks) == 1:
+        return chunks[0]
+    # Categorical columns only survive concat if every chunk shares the same
+    # categories, so align them on the union first.
+    for col in chunks[0].columns:
+        if all(isinstance(c[col].dtype, pd.CategoricalDtype) for c in chunks):
+            categories = union_categoricals([c[col] for c in chunks]).categories
+            for c in chunks:
+                c[col] = c[col].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def _iter_csv(path_or_file, delimiter, chunk_rows):
+    return pd.read_csv(path_or_file, delimiter=delimiter, chunksize=chunk_rows)
+
+
+def _iter_xlsx(path_or_file, chunk_rows):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path_or_file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(h) if h is not None else f'Unnamed: {i}' for i, h in enumerate(header)]
+        batch = []
+        emitted = False
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunk_rows:
+                yield pd.DataFrame.from_records(batch, columns=columns).infer_objects()
+                batch = []
+                emitted = True
+        if batch or not emitted:
+            yield pd.DataFrame.from_records(batch, columns=columns).infer_objects()
+    finally:
+        workbook.close()
+
+
+def read_upload(uploaded_file, row_budget=None, chunk_rows=CHUNK_ROWS, downcast=(), progress=None):
+    """
+    Reads an uploaded CSV/TSV/XLSX file chunk by chunk, so memory stays close
+    to the size of the result. Each chunk is downcast as it arrives for the
+    kinds listed in downcast: 'integer' (smallest integer width), 'float'
+    (float32 where lossless) and 'category' (low-cardinality strings).
+    Stops after row_budget rows when given. progress(rows, bytes_read, total_bytes)
+    is called after every chunk.
+    Returns the DataFrame and a dict with 'rows' and 'truncated'.
+    """
+    name = uploaded_file.name.lower()
+    total_bytes = uploaded_file.size
+    # Large uploads are already spooled to a temporary file by Django; read
+    # from it directly instead of through the UploadedFile wrapper.
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        handle = open(uploaded_file.temporary_file_path(), 'rb')
+    else:
+        uploaded_file.seek(0)
+        handle = uploaded_file.file
+
+    chunks = []
+    rows = 0
+    truncated = False
+    try:
+        if name.endswith('.xlsx'):
+            reader = _iter_xlsx(handle, chunk_rows)
+        else:
+            reader = _iter_csv(handle, DELIMITERS[name[name.rfind('.'):]], chunk_rows)
+        for chunk in reader:
+            if row_budget is not None and rows + len(chunk) > row_budget:
+                chunk = chunk.iloc[:row_budget - rows].copy()
+                truncated = True
+            chunks.append(downcast_chunk(chunk, downcast))
+            rows += len(chunk)
+            if progress is not None:
+                bytes_read = total_bytes if truncated else min(handle.tell(), total_bytes)
+                progress(rows, bytes_read, total_bytes)
+            if row_budget is not None and rows >= row_budget:
+                break
+    finally:
+        if handle is not uploaded_file.file:
+            handle.close()
+
+    if not chunks:
+        raise ValueError('The uploaded file contains no data.')
+    return _concat_chunks(chunks), {'rows': rows, 'truncated': truncated}
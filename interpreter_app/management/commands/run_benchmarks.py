@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from interpreter_app.benchmarks import DEFAULT_ROWS, SHAPES, STAGES, compare, run_suite
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks upload, metadata profiling, execution, rendering and the backend round trips '
+            'on synthetic datasets, optionally failing on regressions against a baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=list(DEFAULT_ROWS),
+                            help='Dataset sizes, e.g. --rows 1000 1000000 10000000.')
+        parser.add_argument('--shapes', nargs='+', choices=list(SHAPES), default=list(SHAPES))
+        parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+        parser.add_argument('--repeats', type=int, default=5, help='Timed runs per benchmark (after one warm-up).')
+        parser.add_argument('--sandbox', action='store_true', help='Execute code in a sandbox worker (its memory is not in peak RSS).')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--baseline', help='Compare against results previously written with --output.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed slowdown / memory growth over the baseline, as a fraction.')
+
+    def handle(self, *args, **options):
+        def log(name, metrics):
+            self.stdout.write(f"{name:<48} p50 {metrics['p50_ms']:9.1f} ms  p90 {metrics['p90_ms']:9.1f} ms  "
+                              f"p99 {metrics['p99_ms']:9.1f} ms  peak RSS {metrics['peak_rss_mb']:7.0f} MB")
+
+        results = run_suite(rows=options['rows'], shapes=options['shapes'], stages=options['stages'],
+                            repeats=options['repeats'], sandbox=options['sandbox'], log=log)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = compare(results, baseline, options['threshold'])
+            for name, metric, before, after in regressions:
+                self.stderr.write(f'{name} {metric}: {before:.1f} -> {after:.1f}')
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) beyond {options["threshold"]:.0%}.')
+            self.stdout.write(f'No regressions against {options["baseline"]}.')
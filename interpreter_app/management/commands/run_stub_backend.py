@@ -0,0 +1,27 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from interpreter_app.stub_backend import StubBackend
+
+
+class Command(BaseCommand):
+    help = 'Runs a local stub of the /transcribe and /converse backend for offline testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=6000)
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help='Seconds to wait before answering each request.')
+        parser.add_argument('--token-latency', type=float, default=0.02,
+                            help='Seconds between events of a streamed /converse reply.')
+        parser.add_argument('--verbose', action='store_true', help='Log every request.')
+
+    def handle(self, *args, **options):
+        stub = StubBackend(options['host'], options['port'], latency=options['latency'],
+                           token_latency=options['token_latency'], verbose=options['verbose'])
+        self.stdout.write(f"Stub backend listening on http://{options['host']}:{options['port']}/")
+        try:
+            asyncio.run(stub.serve_forever())
+        except KeyboardInterrupt:
+            pass
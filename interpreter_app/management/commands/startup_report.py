@@ -0,0 +1,37 @@
+import importlib
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from interpreter_app.startup import preload, process_age
+
+
+class Command(BaseCommand):
+    # The checks would import the URLconf before it is timed.
+    requires_system_checks = []
+    help = ('Loads the URLconf and preloads the data libraries as a server process does at startup, '
+            'and reports how long each phase took (run it in a fresh process to measure a cold start).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-preload', action='store_true',
+                            help='Stop after the URLconf, as with STARTUP_PRELOAD = False.')
+        parser.add_argument('--no-warm-up', action='store_true',
+                            help='Import the libraries without running the warm-up or starting the sandbox workers.')
+        parser.add_argument('--json', action='store_true', help='Print the phases as JSON (seconds).')
+
+    def handle(self, *args, **options):
+        # Interpreter start-up, Django setup and this command's imports.
+        report = {'setup': process_age()}
+        start = time.perf_counter()
+        importlib.import_module(settings.ROOT_URLCONF)
+        report['urlconf'] = time.perf_counter() - start
+        if not options['no_preload']:
+            report.update(preload(warm=not options['no_warm_up']))
+        report = {phase: seconds for phase, seconds in report.items() if seconds is not None}
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for phase, seconds in report.items():
+            self.stdout.write(f'{phase:<24} {seconds * 1000:9.1f} ms')
@@ -0,0 +1,167 @@
+# interpreter_app/metadata_sync.py
+#
+# Dataset metadata on its way to /converse. The metadata is sent in full
+# once with its version (a content hash); later calls send only the version
+# when nothing changed, or a column-level delta against the version the
+# backend already has. The backend acknowledges metadata by returning its
+# version in the METADATA_VERSION_HEADER response header; until it has,
+# every call sends the metadata in full, so a backend that knows nothing of
+# versions still gets it. A backend that does not know the base version
+# answers 409 with 'metadata_required' and the call is repeated with the
+# full metadata. Django-free, so the stub backend applies deltas with the
+# same code.
+
+import hashlib
+import json
+
+# Sections holding one entry per column; deltas are per column within them.
+COLUMN_SECTIONS = ('dtypes', 'numerical_ranges', 'categorical_values', 'distinct_counts')
+# Response header in which the backend returns the version it resolved.
+METADATA_VERSION_HEADER = 'X-Metadata-Version'
+
+
+class UnknownMetadataVersion(Exception):
+    pass
+
+
+def _truncate_values(values, max_values):
+    if not isinstance(values, list) or len(values) <= max_values:
+        return values
+    return values[:max_values] + (['...'] if values[-1] != '...' else [])
+
+
+def compact_metadata(metadata, max_columns=None, sample_rows=3, max_values=20):
+    """
+    The metadata sent to /converse: all column names, but dtypes, ranges,
+    values and sample cells for the first max_columns columns only (all if
+    None), at most sample_rows sample rows and max_values values per
+    categorical column. Returned as plain JSON types, the form the backend
+    sees, so its version hash matches on both sides.
+    """
+    columns = metadata.get('columns', [])
+    profiled = columns if max_columns is None else columns[:max_columns]
+    keep = {str(col) for col in profiled}
+    compact = {}
+    for key, value in metadata.items():
+        if key in COLUMN_SECTIONS:
+            value = {col: v for col, v in value.items() if str(col) in keep}
+            if key == 'categorical_values':
+                value = {col: _truncate_values(v, max_values) for col, v in value.items()}
+        elif key == 'sample_rows':
+            value = [{col: v for col, v in row.items() if str(col) in keep} for row in value[:sample_rows]]
+        compact[key] = value
+    if len(profiled) < len(columns):
+        compact['profiled_columns'] = len(profiled)
+    return json.loads(json.dumps(compact, default=str))
+
+
+def metadata_version(metadata):
+    return hashlib.sha256(json.dumps(metadata, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+
+def _same(a, b):
+    # NaN ranges and sample cells are unequal to themselves.
+    return a == b or json.dumps(a, sort_keys=True) == json.dumps(b, sort_keys=True)
+
+
+def _sample_columns(rows):
+    return list(rows[0]) if rows else []
+
+
+def metadata_delta(old, new):
+    """
+    Column-level changes from old to new: {'set': {section: {column: value}},
+    'drop': {section: [column]}} for the per-column sections,
+    {'sample_set': {column: [value per row]}, 'sample_drop': [column]} for
+    sample rows (when the number of rows is unchanged) and {'replace':
+    {key: value}, 'remove': [key]} for the other keys.
+    """
+    delta = {'set': {}, 'drop': {}, 'sample_set': {}, 'sample_drop': [], 'replace': {}, 'remove': []}
+    for key in new.keys() | old.keys():
+        if key not in new:
+            delta['remove'].append(key)
+        elif key in COLUMN_SECTIONS and isinstance(old.get(key), dict):
+            before, after = old[key], new[key]
+            changed = {col: v for col, v in after.items() if col not in before or not _same(before[col], v)}
+            dropped = [col for col in before if col not in after]
+            if changed:
+                delta['set'][key] = changed
+            if dropped:
+                delta['drop'][key] = dropped
+        elif key == 'sample_rows' and isinstance(old.get(key), list) and len(old[key]) == len(new[key]):
+            before, after = old[key], new[key]
+            for col in _sample_columns(after):
+                if any(col not in b or not _same(b[col], a[col]) for b, a in zip(before, after)):
+                    delta['sample_set'][col] = [row[col] for row in after]
+            kept = set(_sample_columns(after))
+            delta['sample_drop'] = [col for col in _sample_columns(before) if col not in kept]
+        elif key not in old or not _same(old[key], new[key]):
+            delta['replace'][key] = new[key]
+    return {k: v for k, v in delta.items() if v}
+
+
+def apply_metadata_delta(old, delta):
+    new = {k: dict(v) if k in COLUMN_SECTIONS else v for k, v in old.items()}
+    for key in delta.get('remove', []):
+        new.pop(key, None)
+    for key, value in delta.get('replace', {}).items():
+        new[key] = value
+    for key, columns in delta.get('drop', {}).items():
+        for col in columns:
+            new[key].pop(col, None)
+    for key, changed in delta.get('set', {}).items():
+        new.setdefault(key, {}).update(changed)
+    if 'sample_set' in delta or 'sample_drop' in delta:
+        rows = [dict(row) for row in new['sample_rows']]
+        for col in delta.get('sample_drop', []):
+            for row in rows:
+                row.pop(col, None)
+        for col, values in delta.get('sample_set', {}).items():
+            for row, value in zip(rows, values):
+                row[col] = value
+        new['sample_rows'] = rows
+    return new
+
+
+def metadata_fields(metadata, sent=None):
+    """
+    The metadata keys of a /converse payload, given the {'version',
+    'metadata'} the backend was last sent (None to send it in full).
+    """
+    if not metadata:
+        return {'metadata': metadata}
+    version = metadata_version(metadata)
+    if sent is not None and sent['version'] == version:
+        return {'metadata_version': version}
+    if sent is not None:
+        delta = metadata_delta(sent['metadata'], metadata)
+        if len(json.dumps(delta)) < len(json.dumps(metadata)):
+            return {'metadata_version': version, 'metadata_base': sent['version'], 'metadata_delta': delta}
+    return {'metadata_version': version, 'metadata': metadata}
+
+
+def resolve_metadata(payload, known):
+    """
+    Backend side: the metadata a /converse payload refers to. known maps
+    versions to metadata already received and is updated. Raises
+    UnknownMetadataVersion when the payload refers to a version not in
+    known or the result does not match its version.
+    """
+    version = payload.get('metadata_version')
+    if version is None:
+        return payload.get('metadata')
+    if 'metadata' in payload:
+        metadata = payload['metadata']
+    elif 'metadata_delta' in payload:
+        base = known.get(payload.get('metadata_base'))
+        if base is None:
+            raise UnknownMetadataVersion(payload.get('metadata_base'))
+        metadata = apply_metadata_delta(base, payload['metadata_delta'])
+    else:
+        metadata = known.get(version)
+        if metadata is None:
+            raise UnknownMetadataVersion(version)
+    if metadata_version(metadata) != version:
+        raise UnknownMetadataVersion(version)
+    known[version] = metadata
+    return metadata
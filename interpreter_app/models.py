@@ -1,3 +1,40 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class HistoryEntry(models.Model):
+    """An executed command and its code, as listed in the history panel."""
+
+    session_key = models.CharField(max_length=40)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE)
+    # 1-based number of the entry within its session.
+    position = models.PositiveIntegerField()
+    command = models.TextField()
+    code = models.TextField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Rows are only appended, so id order is creation order: these
+        # indexes serve both "latest first" reads and id cursors.
+        indexes = [
+            models.Index(fields=['session_key', 'id']),
+            models.Index(fields=['user', 'id']),
+        ]
+
+
+class ChatMessage(models.Model):
+    """One message of the conversation sent to /converse as conversation_history."""
+
+    session_key = models.CharField(max_length=40)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE)
+    # The message as the backend returned it (usually {'role', 'content'}).
+    message = models.JSONField()
+    # Estimated once on write, so trimming to a token budget reads no text.
+    tokens = models.PositiveIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['session_key', 'id']),
+            models.Index(fields=['user', 'id']),
+        ]
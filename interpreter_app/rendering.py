@@ -0,0 +1,187 @@
+# interpreter_app/rendering.py
+#
+# Converts the objects left by generated code into output items for the
+# frontend. With an output_dir, images are written there under their content
+# hash and referenced by file name, so they reach the browser as binary
+# files instead of base64 inside the JSON, and table results are stored
+# there for paging (see tables.py). Django-free, like the executor.
+
+import base64
+import hashlib
+import io
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import plotly.io as pio
+from matplotlib.axes import Axes
+from matplotlib.collections import Collection
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+
+from interpreter_app.tables import page_payload, table_schema, write_table
+
+IMAGE_TYPES = {'png': 'image/png', 'webp': 'image/webp', 'svg': 'image/svg+xml'}
+
+DEFAULT_OPTIONS = {
+    'image_format': 'png',
+    'dpi': 100,
+    # Longest side of a rendered image in pixels; larger figures get a lower DPI.
+    'max_pixels': 2000,
+    # In SVG output, artists with more points than this are embedded as a
+    # bitmap instead of one vector element per point. None disables it.
+    'rasterize_points': 5000,
+    # 'json' sends the figure spec for the page's plotly.js to draw; 'html'
+    # sends a div and script without the plotly.js bundle.
+    'plotly_format': 'json',
+    # Rows of a table result sent with the response; the rest is paged.
+    'table_page_rows': 100,
+    # Points per plotted series above which plots are downsampled while the
+    # code runs (see downsampling.py), and the method for lines: 'minmax' or
+    # 'lttb'. None plots every row.
+    'point_budget': None,
+    'line_downsampling': 'minmax',
+    'workers': 1,
+    'output_dir': None,
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._max_workers != workers:
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='render')
+        return _pool
+
+
+def _figure_of(obj):
+    if isinstance(obj, Axes):
+        return obj.get_figure()
+    return obj
+
+
+def _rasterize_dense_artists(fig, threshold):
+    for ax in fig.get_axes():
+        for artist in ax.get_children():
+            if isinstance(artist, Collection):
+                points = len(artist.get_offsets())
+            elif isinstance(artist, Line2D):
+                points = len(artist.get_xdata())
+            else:
+                continue
+            if points > threshold:
+                artist.set_rasterized(True)
+
+
+def _store_image(data, image_format, output_dir):
+    name = f'{hashlib.sha256(data).hexdigest()}.{image_format}'
+    path = os.path.join(output_dir, name)
+    if not os.path.exists(path):
+        os.makedirs(output_dir, exist_ok=True)
+        tmp_path = os.path.join(output_dir, f'.{uuid.uuid4().hex}.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return name
+
+
+def render_figure(fig, options):
+    image_format = options['image_format']
+    width, height = fig.get_size_inches()
+    dpi = min(options['dpi'], options['max_pixels'] / max(width, height, 1e-9))
+    if image_format == 'svg' and options['rasterize_points'] is not None:
+        _rasterize_dense_artists(fig, options['rasterize_points'])
+    buf = io.BytesIO()
+    fig.savefig(buf, format=image_format, dpi=dpi)
+    data = buf.getvalue()
+    item = {'type': 'plot', 'format': image_format}
+    if options['output_dir']:
+        item['file'] = _store_image(data, image_format, options['output_dir'])
+    else:
+        item['data'] = base64.b64encode(data).decode('utf-8')
+    return item
+
+
+def convert_object(obj, options):
+    if isinstance(obj, pd.DataFrame):
+        if options['output_dir']:
+            name, table = write_table(obj, options['output_dir'])
+            return {
+                'type': 'table',
+                'file': name,
+                'rows': table.num_rows,
+                'schema': table_schema(table),
+                'page': page_payload(table.slice(0, options['table_page_rows']), 0, table.num_rows),
+            }
+        return {
+            'type': 'table',
+            'data': obj.to_json(orient="split")
+        }
+    if isinstance(obj, (Figure, Axes)):
+        return render_figure(_figure_of(obj), options)
+    if hasattr(obj, '__class__') and 'plotly' in str(type(obj)):
+        if options['plotly_format'] == 'json' and hasattr(obj, 'to_json'):
+            return {'type': 'plotly', 'format': 'json', 'data': obj.to_json()}
+        return {'type': 'plotly', 'format': 'html', 'data': pio.to_html(obj, full_html=False, include_plotlyjs=False)}
+    if isinstance(obj, (str, int, float, bool)):
+        return {
+            'type': 'text',
+            'data': str(obj)
+        }
+    text_repr = str(obj)
+    if len(text_repr) > 2000:
+        text_repr = text_repr[:2000] + " ... [truncated]"
+    return {
+        'type': 'text',
+        'data': text_repr
+    }
+
+
+def render_outputs(objects, options=None):
+    """
+    Converts objects to output items in order, skipping repeats (an Axes
+    counts as its Figure). Figures are rendered on a thread pool when
+    options['workers'] > 1.
+    """
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    unique = []
+    seen = set()
+    for obj in objects:
+        key = id(_figure_of(obj))
+        if key not in seen:
+            seen.add(key)
+            unique.append(obj)
+    figures = [i for i, obj in enumerate(unique) if isinstance(obj, (Figure, Axes))]
+    items = [None] * len(unique)
+    if options['workers'] > 1 and len(figures) > 1:
+        pool = _get_pool(options['workers'])
+        futures = {i: pool.submit(convert_object, unique[i], options) for i in figures}
+        for i, future in futures.items():
+            items[i] = future.result()
+    for i, obj in enumerate(unique):
+        if items[i] is None:
+            items[i] = convert_object(obj, options)
+    return items
+
+
+def prune_output_dir(output_dir, budget):
+    """Removes the least recently written files until output_dir fits in budget bytes."""
+    try:
+        entries = [e for e in os.scandir(output_dir) if e.is_file()]
+    except FileNotFoundError:
+        return
+    files = sorted((e.stat().st_mtime, e.stat().st_size, e.path) for e in entries)
+    total = sum(size for _, size, _ in files)
+    for _, size, path in files:
+        if total <= budget:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
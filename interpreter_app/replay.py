@@ -0,0 +1,192 @@
+# interpreter_app/replay.py
+#
+# Re-running a list of commands against a dataset as one pipeline (the
+# replay view). The code of each step is analysed for writes to df: every
+# step depends only on the last step before it that writes df, so the
+# writers run one after another while the read-only steps after each writer
+# run concurrently on its frame. Results come out in step order. The
+# analysis errs towards "writes"; a step it took for read-only that changed
+# df after all is caught at run time and the steps after it are run again
+# on the new frame.
+
+import ast
+import asyncio
+
+from interpreter_app.executor import clean_code
+
+# DataFrame methods that modify the frame they are called on.
+IN_PLACE_METHODS = {'insert', 'pop', 'update', '__setitem__', '__delitem__'}
+# Attributes through which item assignment writes to the frame itself.
+INDEXERS = {'loc', 'iloc', 'at', 'iat'}
+
+
+def _root(node):
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Call, ast.Starred)):
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _names(target):
+    if isinstance(target, ast.Name):
+        return [target.id]
+    if isinstance(target, (ast.Tuple, ast.List)):
+        return [name for elt in target.elts for name in _names(elt)]
+    return []
+
+
+def _targets(node):
+    if isinstance(node, ast.Assign):
+        return node.targets
+    if isinstance(node, (ast.AugAssign, ast.AnnAssign, ast.NamedExpr, ast.For)):
+        return [node.target]
+    if isinstance(node, ast.Delete):
+        return node.targets
+    return []
+
+
+def _aliases(tree):
+    # Names that may refer to df or one of its indexers, so that writes
+    # through them reach df. Function parameters count, as df may be
+    # passed in. (Under copy-on-write, other derived objects never write
+    # back to df.)
+    aliases = {'df'}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            aliases.update(arg.arg for arg in ast.walk(node.args) if isinstance(arg, ast.arg))
+    while True:
+        found = set()
+        for node in ast.walk(tree):
+            value = getattr(node, 'iter', None) if isinstance(node, ast.For) else getattr(node, 'value', None)
+            if value is None or not _targets(node) or isinstance(node, ast.Delete):
+                continue
+            if isinstance(node, ast.For):
+                refers = any(isinstance(n, ast.Name) and n.id in aliases for n in ast.walk(value))
+            else:
+                refers = (isinstance(value, ast.Name) and value.id in aliases) or (
+                    isinstance(value, ast.Attribute) and value.attr in INDEXERS and _root(value) in aliases)
+            if refers:
+                found.update(name for target in _targets(node) for name in _names(target))
+        if found <= aliases:
+            return aliases
+        aliases |= found
+
+
+def writes_df(code):
+    """Whether code may modify or rebind df (True when it cannot be parsed)."""
+    try:
+        tree = ast.parse(clean_code(code))
+    except SyntaxError:
+        return True
+    aliases = _aliases(tree)
+    for node in ast.walk(tree):
+        for target in _targets(node):
+            if isinstance(node, ast.For):
+                continue
+            if 'df' in _names(target):
+                return True
+            for part in ast.walk(target):
+                if isinstance(part, (ast.Subscript, ast.Attribute)) and _root(part) in aliases:
+                    return True
+        if isinstance(node, (ast.Global, ast.Nonlocal)) and 'df' in node.names:
+            return True
+        if isinstance(node, ast.Call) and _root(node.func) in aliases:
+            if isinstance(node.func, ast.Attribute) and node.func.attr in IN_PLACE_METHODS:
+                return True
+            for keyword in node.keywords:
+                if keyword.arg == 'inplace' and not (
+                        isinstance(keyword.value, ast.Constant) and not keyword.value.value):
+                    return True
+    return False
+
+
+class Pipeline:
+    """
+    Runs codes in order against frame. run_step(frame, code) is blocking
+    and returns (result, new_frame) with new_frame None when df was left
+    unchanged; it runs in threads, at most concurrency at a time.
+    discard(frame) releases a frame a step produced that is not kept.
+    After results() is exhausted, frame is the frame after the last step;
+    close() then discards every other produced frame.
+    """
+
+    def __init__(self, codes, frame, run_step, concurrency=1, discard=None):
+        self.codes = list(codes)
+        self.frame = frame
+        self.writes = [writes_df(code) for code in self.codes]
+        self._run_step = run_step
+        self._discard = discard
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._produced = []
+        self._launched = asyncio.Event()
+        self._generation = 0
+        self._closed = False
+
+    async def _run(self, index, frame):
+        async with self._semaphore:
+            if self._closed:
+                return {'status': 'error', 'message': 'Replay cancelled.'}, None
+            try:
+                result, new_frame = await asyncio.to_thread(self._run_step, frame, self.codes[index])
+            except Exception as e:
+                return {'status': 'error', 'message': f'Error: {e}.'}, None
+        if new_frame is not None:
+            if self._closed and self._discard is not None:
+                self._discard(new_frame)
+                new_frame = None
+            else:
+                self._produced.append(new_frame)
+        return result, new_frame
+
+    async def _chain(self, start, frame, slots, generation):
+        # Launches the steps from start on; a writer's followers wait for
+        # its frame, the other steps are launched right away.
+        for index in range(start, len(self.codes)):
+            if generation != self._generation:
+                return
+            task = asyncio.ensure_future(self._run(index, frame))
+            slots[index] = task
+            self._launched.set()
+            if self.writes[index]:
+                result, new_frame = await asyncio.shield(task)
+                if new_frame is not None:
+                    frame = new_frame
+
+    async def results(self):
+        """Yields (index, result) in step order."""
+        slots = {}
+        launcher = asyncio.ensure_future(self._chain(0, self.frame, slots, self._generation))
+        try:
+            index = 0
+            while index < len(self.codes):
+                while index not in slots:
+                    self._launched.clear()
+                    await self._launched.wait()
+                result, new_frame = await asyncio.shield(slots[index])
+                if new_frame is not None and not self.writes[index]:
+                    # Taken for read-only but changed df: the steps after it
+                    # ran on a stale frame. Let them finish and start over.
+                    self.writes[index] = True
+                    self._generation += 1
+                    await launcher
+                    await asyncio.gather(*(t for i, t in slots.items() if i > index))
+                    slots = {i: t for i, t in slots.items() if i <= index}
+                    launcher = asyncio.ensure_future(
+                        self._chain(index + 1, new_frame, slots, self._generation))
+                if new_frame is not None:
+                    self.frame = new_frame
+                yield index, result
+                index += 1
+        finally:
+            self._generation += 1
+            launcher.cancel()
+
+    def close(self):
+        """Discards the produced frames other than frame, also those of steps still running."""
+        self._closed = True
+        self._generation += 1
+        if self._discard is None:
+            return
+        for frame in self._produced:
+            if frame is not self.frame:
+                self._discard(frame)
+        self._produced = []
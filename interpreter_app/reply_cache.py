@@ -0,0 +1,186 @@
+# interpreter_app/reply_cache.py
+
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+
+_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+
+
+def normalize_command(command):
+    # Transcripts of the same request differ in case, spacing and final
+    # punctuation.
+    return ' '.join(command.lower().split()).strip(' .!?')
+
+
+def schema_hash(metadata):
+    schema = [[str(col), metadata.get('dtypes', {}).get(col)] for col in metadata.get('columns', [])]
+    return hashlib.sha256(json.dumps(schema, default=str).encode()).hexdigest()
+
+
+def _trigrams(text):
+    padded = f'  {text} '
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class _ReplyEntry:
+    __slots__ = ('command', 'bucket', 'reply', 'nbytes', 'trigrams', 'norm', 'numbers',
+                 'hits', 'fuzzy_hits', 'created', 'last_hit')
+
+    def __init__(self, command, bucket, reply, nbytes):
+        self.command = command
+        self.bucket = bucket
+        self.reply = reply
+        self.nbytes = nbytes
+        self.trigrams = _trigrams(command)
+        self.norm = math.sqrt(sum(n * n for n in self.trigrams.values()))
+        self.numbers = _NUMBER.findall(command)
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.created = time.time()
+        self.last_hit = None
+
+
+class ReplyCache:
+    """
+    /converse replies keyed by the normalized command, the dataset schema
+    (column names and dtypes) and the last history_messages messages of the
+    conversation, least recently used first out beyond memory_budget bytes.
+
+    With a fuzzy_threshold, a miss falls back to the most similar cached
+    command with the same schema and history (cosine similarity of character
+    trigrams), provided both mention the same numbers.
+    """
+
+    def __init__(self, memory_budget, history_messages=2, fuzzy_threshold=None):
+        self.memory_budget = memory_budget
+        self.history_messages = history_messages
+        self.fuzzy_threshold = fuzzy_threshold
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+    def _bucket(self, metadata, history):
+        suffix = history[-self.history_messages:] if self.history_messages else []
+        return hashlib.sha256(
+            f'{schema_hash(metadata)}\0{json.dumps(suffix, default=str)}'.encode()).hexdigest()
+
+    @staticmethod
+    def _key(bucket, command):
+        return hashlib.sha256(f'{bucket}\0{command}'.encode()).hexdigest()
+
+    def lookup(self, command, metadata, history):
+        """
+        Returns the cached reply ({'code', 'message', 'audio', 'history_delta'})
+        or None. history_delta holds the messages the backend appended to the
+        conversation history.
+        """
+        if not self.memory_budget:
+            return None
+        command = normalize_command(command)
+        bucket = self._bucket(metadata, history)
+        with self._lock:
+            entry = self._entries.get(self._key(bucket, command))
+            if entry is not None:
+                entry.hits += 1
+                self.hits += 1
+            elif self.fuzzy_threshold is not None:
+                entry = self._most_similar(command, bucket)
+                if entry is not None:
+                    entry.fuzzy_hits += 1
+                    self.fuzzy_hits += 1
+            if entry is None:
+                self.misses += 1
+                return None
+            entry.last_hit = time.time()
+            self._entries.move_to_end(self._key(entry.bucket, entry.command))
+            return entry.reply
+
+    def store(self, command, metadata, history, reply, updated_history):
+        # Only replies that extend the history we sent can be replayed on top
+        # of another conversation.
+        if not self.memory_budget or updated_history[:len(history)] != history:
+            return
+        command = normalize_command(command)
+        bucket = self._bucket(metadata, history)
+        reply = {
+            'code': reply.get('code', ''),
+            'message': reply.get('message', ''),
+            'audio': reply.get('audio', ''),
+            'history_delta': updated_history[len(history):],
+        }
+        nbytes = len(json.dumps(reply, default=str))
+        if nbytes > self.memory_budget:
+            return
+        key = self._key(bucket, command)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _ReplyEntry(command, bucket, reply, nbytes)
+            self._buckets.setdefault(bucket, set()).add(key)
+            self._bytes += nbytes
+            while self._bytes > self.memory_budget:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self, top=100):
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda e: e.hits + e.fuzzy_hits, reverse=True)
+            return {
+                'hits': self.hits,
+                'fuzzy_hits': self.fuzzy_hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'memory_budget': self.memory_budget,
+                'top_entries': [
+                    {
+                        'command': e.command,
+                        'hits': e.hits,
+                        'fuzzy_hits': e.fuzzy_hits,
+                        'created': e.created,
+                        'last_hit': e.last_hit,
+                    }
+                    for e in entries[:top]
+                ],
+            }
+
+    def _most_similar(self, command, bucket):
+        trigrams = _trigrams(command)
+        norm = math.sqrt(sum(n * n for n in trigrams.values()))
+        numbers = _NUMBER.findall(command)
+        best, best_score = None, self.fuzzy_threshold
+        for key in self._buckets.get(bucket, ()):
+            entry = self._entries[key]
+            if entry.numbers != numbers:
+                continue
+            dot = sum(n * entry.trigrams.get(gram, 0) for gram, n in trigrams.items())
+            score = dot / (norm * entry.norm) if norm and entry.norm else 0.0
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.nbytes
+        keys = self._buckets[entry.bucket]
+        keys.discard(key)
+        if not keys:
+            del self._buckets[entry.bucket]
+
+
+reply_cache = ReplyCache(
+    memory_budget=getattr(settings, 'REPLY_CACHE_BUDGET', 32 * 1024 ** 2),
+    history_messages=getattr(settings, 'REPLY_CACHE_HISTORY_MESSAGES', 2),
+    fuzzy_threshold=getattr(settings, 'REPLY_CACHE_FUZZY_THRESHOLD', None),
+)
@@ -0,0 +1,154 @@
+# interpreter_app/result_cache.py
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class ResultCache:
+    """
+    Serialized execute_code results keyed by (dataset version, cleaned code,
+    rendering options), least recently used first out once memory_budget
+    bytes are exceeded.
+    With a disk_dir, results are also written there (up to disk_budget bytes)
+    so they survive eviction and restarts and are shared between processes.
+    """
+
+    def __init__(self, memory_budget, disk_dir=None, disk_budget=0):
+        self.memory_budget = memory_budget
+        self.disk_dir = disk_dir
+        self.disk_budget = disk_budget
+        self._entries = OrderedDict()
+        self._resident_bytes = 0
+        self._disk_entries = None
+        self._disk_bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(version, code, options=None):
+        options = json.dumps(options, sort_keys=True, default=str)
+        return hashlib.sha256(f'{version}\0{code}\0{options}'.encode()).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(data)
+            data = self._read_disk(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, data)
+            return json.loads(data)
+
+    def put(self, key, value):
+        # Same encoding as JsonResponse, which the cached values came from.
+        data = json.dumps(value, cls=DjangoJSONEncoder).encode()
+        with self._lock:
+            self._remember(key, data)
+            self._write_disk(key, data)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._resident_bytes = 0
+            for key in list(self._load_disk_index()):
+                self._remove_disk(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'resident_bytes': self._resident_bytes,
+                'memory_budget': self.memory_budget,
+                'disk_entries': len(self._load_disk_index()) if self.disk_dir else 0,
+                'disk_bytes': self._disk_bytes,
+            }
+
+    def _remember(self, key, data):
+        if len(data) > self.memory_budget:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._resident_bytes -= len(previous)
+        self._entries[key] = data
+        self._resident_bytes += len(data)
+        while self._resident_bytes > self.memory_budget:
+            _, evicted = self._entries.popitem(last=False)
+            self._resident_bytes -= len(evicted)
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key + '.json')
+
+    def _load_disk_index(self):
+        # Oldest first, so the index doubles as the disk tier's LRU order.
+        if self._disk_entries is None:
+            self._disk_entries = OrderedDict()
+            if self.disk_dir and os.path.isdir(self.disk_dir):
+                files = []
+                for entry in os.scandir(self.disk_dir):
+                    if entry.name.endswith('.json'):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, entry.name[:-5], stat.st_size))
+                for _, key, size in sorted(files):
+                    self._disk_entries[key] = size
+                    self._disk_bytes += size
+        return self._disk_entries
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        index = self._load_disk_index()
+        if key in index:
+            index.move_to_end(key)
+        return data
+
+    def _write_disk(self, key, data):
+        if not self.disk_dir or len(data) > self.disk_budget:
+            return
+        index = self._load_disk_index()
+        os.makedirs(self.disk_dir, exist_ok=True)
+        tmp_path = os.path.join(self.disk_dir, f'.{key}.{uuid.uuid4().hex}.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        self._disk_bytes += len(data) - index.pop(key, 0)
+        index[key] = len(data)
+        while self._disk_bytes > self.disk_budget:
+            self._remove_disk(next(iter(index)))
+
+    def _remove_disk(self, key):
+        size = self._load_disk_index().pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+
+result_cache = ResultCache(
+    memory_budget=getattr(settings, 'EXECUTE_RESULT_CACHE_BUDGET', 64 * 1024 ** 2),
+    disk_dir=getattr(settings, 'EXECUTE_RESULT_CACHE_DIR', None),
+    disk_budget=getattr(settings, 'EXECUTE_RESULT_CACHE_DISK_BUDGET', 1024 ** 3),
+)
@@ -0,0 +1,316 @@
+# interpreter_app/sandbox.py
+
+import multiprocessing
+import multiprocessing.forkserver
+import os
+import pickle
+import queue
+import signal
+import threading
+import time
+import uuid
+import weakref
+
+try:
+    import resource
+except ImportError:  # Windows: limits other than wall-clock are not enforced
+    resource = None
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+EXECUTOR_MODULE = 'interpreter_app.executor'
+
+# Started pools, which a forked process has to replace (see _after_fork).
+_pools = weakref.WeakSet()
+
+
+def write_frame(df, path_base):
+    """
+    Writes df as an uncompressed Arrow IPC (Feather v2) file, which readers
+    can memory-map, or as a pickle when Arrow cannot represent it.
+    Returns the path written.
+    """
+    try:
+        # One chunk per column, so that readers can use numeric columns
+        # in place instead of concatenating chunks into a copy.
+        feather.write_feather(df, path_base + '.arrow', compression='uncompressed', chunksize=max(1, len(df)))
+        return path_base + '.arrow'
+    except Exception:
+        if os.path.exists(path_base + '.arrow'):
+            os.remove(path_base + '.arrow')
+        with open(path_base + '.pkl', 'wb') as f:
+            pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return path_base + '.pkl'
+
+
+def _read_frame(path, columns):
+    # (frame, start and end address of the mapped file, if any).
+    if not path.endswith('.arrow'):
+        with open(path, 'rb') as f:
+            df = pickle.load(f)
+        if columns is not None:
+            df = df[[name for name in df.columns if name in columns]]
+        return df, 0, 0
+    mapped = pa.memory_map(path).read_buffer()
+    table = pa.ipc.open_file(mapped).read_all()
+    if columns is not None:
+        # Columns left out are never read.
+        index = [c for c in (table.schema.pandas_metadata or {}).get('index_columns', []) if isinstance(c, str)]
+        table = table.select([name for name in table.column_names if name in columns or name in index])
+    return table.to_pandas(split_blocks=True), mapped.address, mapped.address + mapped.size
+
+
+def read_frame(path, columns=None):
+    """
+    Reads a frame written by write_frame, only the given columns (those it
+    has) if columns is set. Arrow files are memory-mapped: their numeric
+    and datetime columns without nulls stay in the mapping, read-only and
+    shared through the OS page cache with every process that maps the
+    file; the other columns are converted into private memory. Under
+    copy-on-write, writes to a shallow copy of the frame copy the columns
+    they touch.
+    """
+    return _read_frame(path, columns)[0]
+
+
+def open_frame(path, columns=None):
+    """read_frame, also returning the bytes of the frame held in private memory."""
+    df, start, end = _read_frame(path, columns)
+    usage = df.memory_usage(index=True, deep=True).to_numpy()
+    private = int(usage[0])
+    for i in range(df.shape[1]):
+        values = getattr(df.iloc[:, i].array, '_ndarray', None)
+        if values is None or not start <= values.__array_interface__['data'][0] < end:
+            private += int(usage[i + 1])
+    return df, private
+
+
+def _vm_size():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def _reset_limits():
+    if resource is None:
+        return
+    for limit in (resource.RLIMIT_CPU, resource.RLIMIT_AS):
+        _, hard = resource.getrlimit(limit)
+        resource.setrlimit(limit, (hard, hard))
+
+
+def _apply_limits(cpu_time_limit, memory_limit):
+    if resource is None:
+        return
+    # Both limits are cumulative for the process, so they are set relative to
+    # what the worker has already used.
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(usage.ru_utime + usage.ru_stime + cpu_time_limit) + 1
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+    vm_size = _vm_size()
+    if vm_size is not None:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        soft = vm_size + memory_limit
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+
+def _worker_main(conn):
+    import importlib
+
+    from interpreter_app.helpers import shares_all_columns
+
+    executor = importlib.import_module(EXECUTOR_MODULE)
+    executor.warm_up()
+    conn.send('ready')
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        try:
+            _reset_limits()
+            start = time.perf_counter()
+            mapped = read_frame(job['frame_path'], job.get('columns'))
+            frame_read = time.perf_counter() - start
+            _apply_limits(job['cpu_time_limit'], job['memory_limit'])
+            # The mapped columns are read-only (see read_frame): the code
+            # gets a shallow copy, and mapped stays referenced until it is
+            # done so that copy-on-write copies a column before writing to
+            # it rather than writing into the mapping.
+            df = mapped.copy(deep=False)
+            result = executor.run_code(df, job['code'], job.get('render_options'), job.get('sql_options'))
+            _reset_limits()
+
+            new_df = result.pop('df', None)
+            result['df_path'] = None
+            if 'timings' in result:
+                result['timings']['frame_read'] = frame_read
+            # Columns the code wrote to no longer share mapped's arrays, so
+            # nothing is read or hashed to find out whether df changed.
+            if new_df is not None and not shares_all_columns(new_df, mapped):
+                start = time.perf_counter()
+                result['df_path'] = write_frame(new_df, os.path.join(job['exchange_dir'], uuid.uuid4().hex))
+                result['timings']['frame_write'] = time.perf_counter() - start
+        except Exception as e:
+            _reset_limits()
+            result = {'status': 'error', 'message': f"Error: {str(e)}."}
+        conn.send(result)
+
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class SandboxPool:
+    """
+    Pre-warmed worker processes that run generated code with a CPU-time limit,
+    a wall-clock limit and an address-space cap per run. A worker that breaks
+    a limit is killed and replaced. DataFrames travel as memory-mapped Arrow
+    files rather than through the pipe.
+    """
+
+    def __init__(self, size, cpu_time_limit, wall_time_limit, memory_limit, exchange_dir):
+        self.size = size
+        self.cpu_time_limit = cpu_time_limit
+        self.wall_time_limit = wall_time_limit
+        self.memory_limit = memory_limit
+        self.exchange_dir = exchange_dir
+        methods = multiprocessing.get_all_start_methods()
+        self._context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        if self._context.get_start_method() == 'forkserver':
+            # Workers fork from a server that has already imported the heavy
+            # libraries, so replacing a killed worker is cheap.
+            self._context.set_forkserver_preload([EXECUTOR_MODULE])
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            os.makedirs(self.exchange_dir, exist_ok=True)
+            workers = []
+            try:
+                for _ in range(self.size):
+                    workers.append(self._spawn())
+                for worker in workers:
+                    worker.conn.recv()  # wait for 'ready'
+            except Exception:
+                for worker in workers:
+                    worker.kill()
+                raise
+            for worker in workers:
+                self._idle.put(worker)
+            self._started = True
+            _pools.add(self)
+
+    def _spawn(self):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        return _Worker(process, parent_conn)
+
+    def _replace(self, worker):
+        worker.kill()
+        replacement = self._spawn()
+        replacement.conn.recv()
+        self._idle.put(replacement)
+
+    def run(self, frame_path, code, render_options=None, sql_options=None, columns=None):
+        """
+        Runs code against the frame stored at frame_path, loading only the
+        given columns if columns is set. Returns the executor result with
+        'df_path' pointing at the modified frame (None when df was left
+        unchanged); the caller owns and removes that file.
+        """
+        self.start()
+        worker = self._idle.get()
+        try:
+            worker.conn.send({
+                'frame_path': frame_path,
+                'code': code,
+                'render_options': render_options,
+                'sql_options': sql_options,
+                'columns': columns,
+                'cpu_time_limit': self.cpu_time_limit,
+                'memory_limit': self.memory_limit,
+                'exchange_dir': self.exchange_dir,
+            })
+            if not worker.conn.poll(self.wall_time_limit):
+                self._replace(worker)
+                return {'status': 'error', 'message': f"Execution timed out after {self.wall_time_limit} seconds."}
+            result = worker.conn.recv()
+        except (EOFError, OSError):
+            worker.process.join(1)
+            exitcode = worker.process.exitcode
+            self._replace(worker)
+            cpu_signal = getattr(signal, 'SIGXCPU', None)
+            if cpu_signal is not None and exitcode == -cpu_signal:
+                message = f"Execution exceeded the CPU time limit of {self.cpu_time_limit} seconds."
+            else:
+                message = f"Execution worker stopped unexpectedly (exit code {exitcode})."
+            return {'status': 'error', 'message': message}
+        self._idle.put(worker)
+        return result
+
+    def _forget_workers(self):
+        # In a forked process: the workers' pipes are shared with the
+        # parent, which keeps using them. The copies are closed and new
+        # workers are started in the background.
+        while not self._idle.empty():
+            self._idle.get().conn.close()
+        self._lock = threading.Lock()
+        self._started = False
+        threading.Thread(target=self.start, name='sandbox-start', daemon=True).start()
+
+    def shutdown(self):
+        with self._lock:
+            while not self._idle.empty():
+                worker = self._idle.get()
+                try:
+                    worker.conn.send(None)
+                except OSError:
+                    pass
+                worker.kill()
+            self._started = False
+            _pools.discard(self)
+
+
+def _after_fork():
+    # A process forked after a pool was started (a gunicorn worker with
+    # --preload, where preload() started the pool in the master) can use
+    # neither the parent's fork server, which is not its child, nor the
+    # parent's workers. It drops its copies of both and starts its own.
+    server = multiprocessing.forkserver._forkserver
+    if server._forkserver_alive_fd is not None:
+        os.close(server._forkserver_alive_fd)
+    server._forkserver_pid = server._forkserver_address = server._forkserver_alive_fd = None
+    server._lock = threading.Lock()
+    for pool in list(_pools):
+        _pools.discard(pool)
+        pool._forget_workers()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
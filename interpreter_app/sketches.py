@@ -0,0 +1,116 @@
+# interpreter_app/sketches.py
+
+import numpy as np
+import pandas as pd
+
+
+def hash_values(values):
+    # categorize=True factorizes first, which only pays off for very
+    # low-cardinality input and is several times slower on unique strings.
+    return pd.util.hash_array(np.asarray(values), categorize=False)
+
+
+class HyperLogLog:
+    """Distinct count estimate in 2**p one-byte registers (~1.04/sqrt(2**p) error)."""
+
+    def __init__(self, p=12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, hashes):
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.intp)
+        rest = hashes << np.uint64(self.p)
+        # frexp's exponent is the bit length (0 for 0); rounding to float64
+        # only matters within 2**-53 of a power of two.
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = np.minimum(65 - bit_length, 64 - self.p + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m ** 2 / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * np.log(self.m / zeros)
+        return int(round(estimate))
+
+
+class HeavyHitters:
+    """
+    Misra-Gries summary keeping at most `capacity` counters, keyed by value
+    hash. Any value that occurs in more than n / (capacity + 1) of the n rows
+    seen is retained.
+    """
+
+    def __init__(self, capacity=80):
+        self.capacity = capacity
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.labels = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, hashes, values):
+        chunk_counts = pd.Series(hashes).value_counts(sort=False)
+        keys = chunk_counts.index.to_numpy(dtype=np.uint64)
+        # A copy: with copy-on-write on (see executor.py) to_numpy returns a
+        # read-only view, and the counts are added to in place below.
+        counts = chunk_counts.to_numpy(dtype=np.int64, copy=True)
+        # Look the chunk up in the small counter set, not the other way round.
+        position = pd.Index(self.keys).get_indexer(keys)
+        matched = position >= 0
+        counts[matched] += self.counts[position[matched]]
+        carried = np.ones(len(self.keys), dtype=bool)
+        carried[position[matched]] = False
+        keys = np.concatenate([keys, self.keys[carried]])
+        counts = np.concatenate([counts, self.counts[carried]])
+
+        if len(keys) > self.capacity:
+            threshold = np.partition(counts, len(counts) - self.capacity - 1)[len(counts) - self.capacity - 1]
+            counts = counts - threshold
+            keep = counts > 0
+            keys, counts = keys[keep], counts[keep]
+        self.keys, self.counts = keys, counts
+
+        unlabeled = [k for k in keys.tolist() if k not in self.labels]
+        if unlabeled:
+            positions = np.flatnonzero(np.isin(hashes, np.array(unlabeled, dtype=np.uint64)))
+            _, first = np.unique(hashes[positions], return_index=True)
+            for position in positions[first]:
+                self.labels[int(hashes[position])] = values[position]
+        live = set(keys.tolist())
+        self.labels = {k: v for k, v in self.labels.items() if k in live}
+
+    def top(self, k):
+        order = np.argsort(-self.counts, kind='stable')[:k]
+        return [self.labels[key] for key in self.keys[order].tolist()]
+
+
+class ReservoirSampler:
+    """Uniform sample of k positions from a stream (Algorithm R, vectorized per batch)."""
+
+    def __init__(self, k, seed=0):
+        self.k = k
+        self.seen = 0
+        self.sample = np.empty(0, dtype=np.int64)
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, positions):
+        positions = np.asarray(positions, dtype=np.int64)
+        fill = min(self.k - len(self.sample), len(positions))
+        if fill > 0:
+            self.sample = np.concatenate([self.sample, positions[:fill]])
+        rest = positions[fill:]
+        if len(rest):
+            seen = self.seen + fill + np.arange(len(rest))
+            slots = self._rng.integers(0, seen + 1)
+            replace = slots < self.k
+            slots, rest = slots[replace], rest[replace]
+            # When several positions land on one slot the last one wins, as it
+            # would if they were processed one at a time.
+            _, last = np.unique(slots[::-1], return_index=True)
+            last = len(slots) - 1 - last
+            self.sample[slots[last]] = rest[last]
+        self.seen += len(positions)
@@ -0,0 +1,91 @@
+# interpreter_app/sql_engine.py
+#
+# DuckDB over the frame generated code runs against, exposed to it as sql().
+# DuckDB scans the pandas columns in place rather than copying them into the
+# engine, runs aggregations and joins on several threads, and spills their
+# intermediate state to temp_directory once it outgrows memory_limit.
+# Django-free, like the executor.
+
+import os
+import threading
+
+import duckdb
+
+# Added to the metadata sent to /converse so generated code knows sql() exists.
+SQL_DESCRIPTION = (
+    "sql(query, **frames) runs DuckDB SQL and returns a pandas DataFrame. The dataset is "
+    "the table df; other DataFrames can be passed by keyword and queried by that name. "
+    "Prefer it over pandas for group-bys, joins, filters and sorts on large data."
+)
+
+DEFAULT_OPTIONS = {
+    'threads': None,
+    # e.g. '4GB'; None leaves DuckDB's default of 80% of RAM.
+    'memory_limit': None,
+    'temp_directory': None,
+}
+
+_lock = threading.Lock()
+_database = None
+_database_config = None
+
+
+# Generated code must not reach files through SQL: read_csv('/etc/...'),
+# COPY ... TO over a stored frame, ATTACH or INSTALL. The registered frames
+# and spilling to temp_directory are unaffected. Set after connecting, as
+# connect() would apply them before temp_directory, which is then refused;
+# once locked, queries cannot SET them back.
+LOCKDOWN = ("SET enable_external_access = false", "SET lock_configuration = true")
+
+
+def _connect(config):
+    database = duckdb.connect(':memory:', config=config)
+    for statement in LOCKDOWN:
+        database.execute(statement)
+    return database
+
+
+def _cursor(options):
+    # One database per process; each call gets its own cursor, which is what
+    # DuckDB requires for use from several threads.
+    global _database, _database_config
+    config = {key: value for key, value in {**DEFAULT_OPTIONS, **(options or {})}.items() if value is not None}
+    with _lock:
+        if _database is None or config != _database_config:
+            _database = _connect(config)
+            _database_config = config
+        return _database.cursor()
+
+
+def _after_fork():
+    # A DuckDB database is not safe to use across fork (the warm-up in a
+    # gunicorn master started with --preload opens one): a forked process
+    # opens its own.
+    global _lock, _database, _database_config
+    _lock = threading.Lock()
+    _database = None
+    _database_config = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def make_sql(get_df, options=None):
+    """
+    Returns the sql() function for generated code. get_df returns the frame
+    to expose as the table df at the time of the call, so queries see
+    changes the code made to df before calling sql().
+    """
+    def sql(query, **frames):
+        cursor = _cursor(options)
+        try:
+            df = get_df()
+            if df is not None:
+                cursor.register('df', df)
+            for name, frame in frames.items():
+                cursor.register(name, frame)
+            return cursor.execute(query).df()
+        finally:
+            cursor.close()
+    return sql
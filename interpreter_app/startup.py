@@ -0,0 +1,133 @@
+# interpreter_app/startup.py
+#
+# Cold start. The views import the data libraries (pandas, numpy,
+# matplotlib, seaborn, plotly, pyarrow, duckdb, PyAV) only when an endpoint
+# needs them, so management commands, the autoreloader and light endpoints
+# start without them. preload() imports them and runs a throwaway piece of
+# generated code (a matplotlib and a Plotly figure, a table, a sql() query,
+# a metadata profile) and starts the sandbox workers before the server
+# takes traffic; wsgi.py and asgi.py call it through preload_on_startup().
+# How long each phase took is kept in startup_report, logged, and exported
+# by the metrics view. Under gunicorn --preload this runs in the master:
+# the workers it forks start sandbox workers and a DuckDB database of their
+# own (see sandbox.py and sql_engine.py).
+
+import importlib
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# In import order; each import is timed for what it adds to the ones before.
+PRELOAD_MODULES = (
+    'interpreter_app.executor',  # pandas, numpy, matplotlib, seaborn, plotly, duckdb
+    'interpreter_app.helpers',
+    'interpreter_app.store',
+    'interpreter_app.tables',  # pyarrow
+    'interpreter_app.ingest',
+    'interpreter_app.code_prep',
+    'interpreter_app.replay',
+    'interpreter_app.audio',  # PyAV
+)
+WARM_UP_CODE = (
+    "plt.plot(df['x'], df['y'])\n"
+    "fig = px.scatter(df, x='x', y='y')\n"
+    "counts = sql('select y, count(*) as n from df group by y')\n"
+    "df.describe()"
+)
+
+# Seconds per phase: 'import:<module>', 'warm_up', 'sandbox' (starting
+# the sandbox workers), 'preload' (all of them together), 'ready' (process start to the end of preload, Linux only) and
+# 'first_request' (the first response's latency).
+startup_report = {}
+_lock = threading.Lock()
+_preloaded = False
+
+
+def process_age():
+    """Seconds since this process started, None where /proc is not available."""
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _warm_up():
+    import pandas as pd
+
+    from interpreter_app import executor
+    from interpreter_app.helpers import update_metadata
+
+    # The first savefig of a process builds font caches and loads the Agg
+    # renderer; the first to_json, describe() and duckdb query have their
+    # own one-off costs.
+    executor.warm_up()
+    frame = pd.DataFrame({'x': [1.0, 2.0, 3.0], 'y': ['a', 'b', 'a']})
+    update_metadata(frame)
+    result = executor.run_code(frame, WARM_UP_CODE, {'output_dir': None})
+    if result['status'] != 'success':
+        logger.warning('Warm-up code failed: %s', result['message'])
+
+
+def _start_sandbox():
+    from interpreter_app.views import _get_sandbox_pool
+
+    _get_sandbox_pool().start()
+
+
+def preload(warm=True):
+    """
+    Imports PRELOAD_MODULES and, with warm, runs the warm-up code and starts
+    the sandbox workers (with EXECUTE_SANDBOX_WORKERS set); records the time
+    each took in startup_report. Runs once per process.
+    """
+    global _preloaded
+    with _lock:
+        if _preloaded:
+            return startup_report
+        start = time.perf_counter()
+        for name in PRELOAD_MODULES:
+            module_start = time.perf_counter()
+            importlib.import_module(name)
+            startup_report[f'import:{name.rsplit(".", 1)[-1]}'] = time.perf_counter() - module_start
+        if warm:
+            warm_start = time.perf_counter()
+            _warm_up()
+            startup_report['warm_up'] = time.perf_counter() - warm_start
+            if getattr(settings, 'EXECUTE_SANDBOX_WORKERS', 0):
+                sandbox_start = time.perf_counter()
+                _start_sandbox()
+                startup_report['sandbox'] = time.perf_counter() - sandbox_start
+        startup_report['preload'] = time.perf_counter() - start
+        age = process_age()
+        if age is not None:
+            startup_report['ready'] = age
+        _preloaded = True
+    logger.info('Startup: %s', ', '.join(f'{phase} {seconds * 1000:.0f} ms'
+                                         for phase, seconds in startup_report.items()))
+    return startup_report
+
+
+def preload_on_startup():
+    """
+    Preloads as STARTUP_PRELOAD says: True before returning, 'background'
+    on a thread (requests that need a library meanwhile wait for its
+    import), False not at all.
+    """
+    mode = getattr(settings, 'STARTUP_PRELOAD', True)
+    if mode == 'background':
+        threading.Thread(target=preload, name='preload', daemon=True).start()
+    elif mode:
+        preload()
+
+
+def record_first_request(seconds):
+    startup_report.setdefault('first_request', seconds)
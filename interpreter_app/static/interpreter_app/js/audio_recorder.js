@@ -1,5 +1,12 @@
 // interpreter_app\static\interpreter_app\js\audio_recorder.js
 
+// Speech compresses well with Opus; the server decodes, trims and resamples it.
+const RECORDING_TYPES = ['audio/webm;codecs=opus', 'audio/ogg;codecs=opus'];
+const RECORDING_BITRATE = 24000;
+// The recording is uploaded in slices of this many milliseconds while the
+// button is held, so little is left to send when it is released.
+const RECORDING_SLICE_MS = 250;
+
 document.addEventListener('DOMContentLoaded', function() {
     let mediaRecorder;
     let audioChunks = [];
@@ -7,29 +14,44 @@ document.addEventListener('DOMContentLoaded', function() {
     const audioPlayback = document.getElementById('audio-playback');
     let currentStream;
 
+    function recorderOptions() {
+        const mimeType = RECORDING_TYPES.find(type => MediaRecorder.isTypeSupported(type));
+        return mimeType ? { mimeType: mimeType, audioBitsPerSecond: RECORDING_BITRATE } : {};
+    }
+
+    function newUploadId() {
+        const bytes = crypto.getRandomValues(new Uint8Array(16));
+        return Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+    }
+
     // Start recording when the button is pressed down
     recordBtn.addEventListener('mousedown', () => {
         navigator.mediaDevices.getUserMedia({ audio: true })
             .then(stream => {
                 currentStream = stream;
-                mediaRecorder = new MediaRecorder(stream);
+                mediaRecorder = new MediaRecorder(stream, recorderOptions());
                 audioChunks = [];
-                mediaRecorder.start();
+                const uploadId = newUploadId();
+                // Slices are sent one after another; if any fails, the whole
+                // recording is posted once recording stops instead.
+                let uploads = Promise.resolve(true);
+                mediaRecorder.start(RECORDING_SLICE_MS);
                 toastr.info('Recording started...', { timeOut: 2000 });
 
                 mediaRecorder.addEventListener("dataavailable", event => {
                     audioChunks.push(event.data);
+                    uploads = uploads.then(ok => ok && uploadChunk(uploadId, event.data));
                 });
 
                 mediaRecorder.addEventListener("stop", () => {
-                    const audioBlob = new Blob(audioChunks, { type: 'audio/wav;' });
+                    const audioBlob = new Blob(audioChunks, { type: mediaRecorder.mimeType || 'audio/webm' });
                     const audioUrl = URL.createObjectURL(audioBlob);
                     audioPlayback.src = audioUrl;
                     audioPlayback.classList.remove('d-none');
                     toastr.success('Recording stopped.');
 
                     // Automatically trigger transcription
-                    transcribeAudio(audioBlob);
+                    uploads.then(ok => transcribeAudio(ok ? uploadId : null, audioBlob));
 
                     // Stop all tracks to release the microphone
                     currentStream.getTracks().forEach(track => track.stop());
@@ -47,17 +69,40 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
-    function transcribeAudio(audioBlob) {
-        const formData = new FormData();
-        formData.append('file', audioBlob, 'recorded_audio.wav');
+    function uploadChunk(uploadId, chunk) {
+        if (!chunk.size) {
+            return Promise.resolve(true);
+        }
+        return fetch(`/transcribe/chunk/?upload=${uploadId}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/octet-stream',
+                'X-CSRFToken': getCookie('csrftoken')
+            },
+            body: chunk
+        })
+        .then(response => response.ok)
+        .catch(() => false);
+    }
+
+    function transcribeAudio(uploadId, audioBlob) {
         toastr.info('Transcribing...', { timeOut: 2000 });
+        let url = '/transcribe/';
+        let body;
+        if (uploadId) {
+            url += `?upload=${uploadId}`;
+        } else {
+            body = new FormData();
+            const extension = audioBlob.type.includes('ogg') ? 'ogg' : 'webm';
+            body.append('file', audioBlob, `recorded_audio.${extension}`);
+        }
 
-        fetch('/transcribe/', {
+        fetch(url, {
             method: 'POST',
             headers: {
                 'X-CSRFToken': getCookie('csrftoken')
             },
-            body: formData
+            body: body
         })
         .then(response => response.json())
         .then(data => {
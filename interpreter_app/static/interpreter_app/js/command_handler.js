@@ -52,45 +52,156 @@ document.addEventListener('DOMContentLoaded', function() {
 
     function generateCode(command) {
         console.log(`Generating code for command: ${command}`);
-        fetch('/generate_code/', {
+        generatedCodeTextarea.value = '';
+        responseMessageSection.textContent = '';
+        let audioStream = null;
+        // The reply is streamed as server-sent events: the code arrives first
+        // and runs as soon as it is complete, while the answer text and audio
+        // keep coming in.
+        const handlers = {
+            code: data => {
+                generatedCodeTextarea.value += data.delta;
+                generatedCodeSection.classList.remove('d-none');
+            },
+            code_end: () => {
+                if (generatedCodeTextarea.value.trim()) {
+                    executeCodeBtn.click();
+                }
+            },
+            answer: data => {
+                responseMessageSection.textContent += data.delta;
+                responseMessageSection.classList.remove('d-none');
+            },
+            audio: data => {
+                if (!audioStream) {
+                    audioStream = createAudioStream('audio/mpeg');
+                }
+                audioStream.push(data.data);
+            },
+            done: () => {
+                if (audioStream) {
+                    audioStream.end();
+                }
+            },
+            error: data => toastr.error(`Code Generation Error: ${data.message}`)
+        };
+
+        fetch('/generate_code_stream/', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'Accept': 'text/event-stream',
                 'X-CSRFToken': getCookie('csrftoken')
             },
             body: JSON.stringify({ command: command })
         })
-        .then(response => response.json())
-        .then(data => {
-            if (data.status === 'success') {
-                console.log('Response received:', data);
-                if (data.code) {
-                    generatedCodeTextarea.value = data.code;
-                    generatedCodeSection.classList.remove('d-none');
-                    
-                    executeCodeBtn.click();
-                }
-                if (data.message) {
-                    responseMessageSection.textContent = data.message;
-                    responseMessageSection.classList.remove('d-none');
-                }
-                // Play the audio automatically if available
-                if (data.audio) {
-                    const audioSrc = "data:audio/mpeg;base64," + data.audio;
-                    const audio = new Audio(audioSrc);
-                    audio.playbackRate = 1.3;
-                    audio.play().catch(error => console.error("Audio playback failed:", error));
-                }
-                
-            } else {
-                toastr.error(`Code Generation Error: ${data.message}`);
+        .then(response => {
+            if (!response.ok) {
+                return response.json().then(data => handlers.error(data));
             }
+            return readEvents(response, (event, data) => {
+                if (handlers[event]) {
+                    handlers[event](data);
+                }
+            });
         })
         .catch(error => {
             console.error('Error:', error);
             toastr.error(`Error: ${error}`);
         });
     }
+
+    async function readEvents(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message';
+                const dataLines = [];
+                block.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        dataLines.push(line.slice(5).trim());
+                    }
+                });
+                if (dataLines.length) {
+                    onEvent(event, JSON.parse(dataLines.join('\n')));
+                }
+            }
+        }
+    }
+
+    function base64ToBytes(b64) {
+        return Uint8Array.from(atob(b64), c => c.charCodeAt(0));
+    }
+
+    // Plays base64 audio chunks as they arrive through Media Source
+    // Extensions; without MSE support the chunks are played once complete.
+    function createAudioStream(mimeType) {
+        const audio = new Audio();
+        audio.playbackRate = 1.3;
+        const play = () => {
+            audio.playbackRate = 1.3;
+            audio.play().catch(error => console.error("Audio playback failed:", error));
+        };
+
+        if (!(window.MediaSource && MediaSource.isTypeSupported(mimeType))) {
+            const chunks = [];
+            return {
+                push: b64 => chunks.push(base64ToBytes(b64)),
+                end: () => {
+                    audio.src = URL.createObjectURL(new Blob(chunks, { type: mimeType }));
+                    play();
+                }
+            };
+        }
+
+        const mediaSource = new MediaSource();
+        const pending = [];
+        let sourceBuffer = null;
+        let ended = false;
+        let started = false;
+        const pump = () => {
+            if (!sourceBuffer || sourceBuffer.updating) {
+                return;
+            }
+            if (pending.length) {
+                sourceBuffer.appendBuffer(pending.shift());
+                if (!started) {
+                    started = true;
+                    play();
+                }
+            } else if (ended && mediaSource.readyState === 'open') {
+                mediaSource.endOfStream();
+            }
+        };
+        mediaSource.addEventListener('sourceopen', () => {
+            sourceBuffer = mediaSource.addSourceBuffer(mimeType);
+            sourceBuffer.addEventListener('updateend', pump);
+            pump();
+        });
+        audio.src = URL.createObjectURL(mediaSource);
+        return {
+            push: b64 => {
+                pending.push(base64ToBytes(b64));
+                pump();
+            },
+            end: () => {
+                ended = true;
+                pump();
+            }
+        };
+    }
     
     
 
@@ -166,21 +277,80 @@ document.addEventListener('DOMContentLoaded', function() {
         const resultContent = document.getElementById('result-content');
         executionResult.classList.remove('d-none');
         resultContent.innerHTML = "";
-        if (result.type === 'multi' && Array.isArray(result.data)) {
-            let multiHTML = '';
-            result.data.forEach(item => {
-                multiHTML += renderItem(item);
+        const items = (result.type === 'multi' && Array.isArray(result.data)) ? result.data : [result];
+        let multiHTML = '';
+        items.forEach((item, index) => {
+            multiHTML += renderItem(item, index);
+        });
+        resultContent.innerHTML = multiHTML;
+        activateItems(items, '');
+    }
+
+    // Results of a history replay arrive step by step and are appended.
+    document.addEventListener('replayStarted', () => {
+        document.getElementById('execution-result').classList.remove('d-none');
+        document.getElementById('result-content').innerHTML = '';
+    });
+
+    document.addEventListener('replayStep', function(e) {
+        const step = e.detail;
+        const title = escapeHtml(step.command || `Step ${step.index + 1}`);
+        let stepHTML = `<div class="replay-step mb-3"><h4 class="h6">${step.index + 1}. ${title}</h4>`;
+        const items = step.status === 'success' ? step.result.data : [];
+        if (step.status === 'success') {
+            items.forEach((item, index) => {
+                stepHTML += renderItem(item, `${step.index}-${index}`);
             });
-            resultContent.innerHTML = multiHTML;
         } else {
-            resultContent.innerHTML = renderItem(result);
+            stepHTML += `<p class="text-danger">${escapeHtml(step.message)}</p>`;
+        }
+        stepHTML += '</div>';
+        document.getElementById('result-content').insertAdjacentHTML('beforeend', stepHTML);
+        activateItems(items, `${step.index}-`);
+    });
+
+    document.addEventListener('replayDone', function(e) {
+        if (e.detail.metadata) {
+            updateMetadataDisplay(e.detail.metadata);
         }
+    });
+
+    // Plotly output and paged tables need their elements in the page
+    // before they can draw.
+    function activateItems(items, keyPrefix) {
+        items.forEach((item, index) => {
+            if (item.type === 'table' && item.url) {
+                createTableGrid(document.getElementById(`table-output-${keyPrefix}${index}`), item);
+                return;
+            }
+            if (item.type !== 'plotly') {
+                return;
+            }
+            const container = document.getElementById(`plotly-output-${keyPrefix}${index}`);
+            if (item.format === 'json') {
+                const spec = JSON.parse(item.data);
+                Plotly.newPlot(container, spec.data, spec.layout || {}, { responsive: true });
+            } else {
+                // Scripts inserted through innerHTML do not run; re-create them.
+                container.querySelectorAll('script').forEach(oldScript => {
+                    const script = document.createElement('script');
+                    script.textContent = oldScript.textContent;
+                    oldScript.replaceWith(script);
+                });
+            }
+        });
     }
 
-    function renderItem(item) {
+    const imageTypes = { png: 'image/png', webp: 'image/webp', svg: 'image/svg+xml' };
+
+    function renderItem(item, index) {
         let content = '';
         switch (item.type) {
             case 'table':
+                if (item.url) {
+                    content += `<div id="table-output-${index}"></div>`;
+                    break;
+                }
                 const df = JSON.parse(item.data);
                 content += '<table class="table table-bordered table-hover"><thead><tr>';
                 df.columns.forEach(col => {
@@ -197,10 +367,12 @@ document.addEventListener('DOMContentLoaded', function() {
                 content += '</tbody></table>';
                 break;
             case 'plot':
-                content += `<img src="data:image/png;base64,${item.data}" class="img-fluid" alt="Plot">`;
+                // Rendered images are served by URL; inline base64 is still accepted.
+                const src = item.url || `data:${imageTypes[item.format || 'png']};base64,${item.data}`;
+                content += `<img src="${src}" class="img-fluid" alt="Plot">`;
                 break;
             case 'plotly':
-                content += `<div>${item.data}</div>`;
+                content += `<div id="plotly-output-${index}">${item.format === 'json' ? '' : item.data}</div>`;
                 break;
             case 'text':
                 content += `<p>${item.data}</p>`;
@@ -211,6 +383,143 @@ document.addEventListener('DOMContentLoaded', function() {
         return content;
     }
 
+    const GRID_ROW_HEIGHT = 33;
+    const GRID_PAGE_ROWS = 200;
+    const GRID_VISIBLE_ROWS = 15;
+    // Browsers cap element heights (around 17M px in Firefox); beyond this
+    // the scroll position is mapped proportionally onto the rows.
+    const GRID_MAX_HEIGHT = 10000000;
+
+    function escapeHtml(value) {
+        if (value === null || value === undefined) {
+            return '';
+        }
+        return String(value).replace(/[&<>"']/g, ch => ({
+            '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+        })[ch]);
+    }
+
+    // Virtualized view of a table result kept on the server: only the rows
+    // scrolled into view are in the DOM, and their pages are fetched from
+    // item.url on demand. Clicking a header sorts by that column.
+    function createTableGrid(container, item) {
+        const columns = item.schema.map(field => field.name);
+        const seedRows = item.page.data.length ? item.page.data[0].length : 0;
+        const state = { sort: null, descending: false, pages: new Map(), loading: new Set(), generation: 0 };
+        const height = (Math.min(item.rows, GRID_VISIBLE_ROWS) + 1) * GRID_ROW_HEIGHT + 2;
+        container.innerHTML = `
+            <div class="small text-muted mb-1">${item.rows.toLocaleString()} rows &times; ${columns.length} columns</div>
+            <div class="table-grid" style="height: ${height}px">
+                <table class="table table-bordered table-hover table-sm mb-0">
+                    <thead><tr>${columns.map(col => `<th title="Sort by ${escapeHtml(col)}">${escapeHtml(col)}</th>`).join('')}</tr></thead>
+                    <tbody></tbody>
+                </table>
+            </div>`;
+        const viewport = container.querySelector('.table-grid');
+        const tbody = container.querySelector('tbody');
+        const headers = container.querySelectorAll('th');
+
+        function rowValues(index) {
+            const page = state.pages.get(Math.floor(index / GRID_PAGE_ROWS));
+            if (page) {
+                return page.data.map(values => values[index - page.offset]);
+            }
+            if (!state.sort && index < seedRows) {
+                return item.page.data.map(values => values[index]);
+            }
+            return null;
+        }
+
+        function fetchPage(pageIndex) {
+            if (state.loading.has(pageIndex)) {
+                return;
+            }
+            state.loading.add(pageIndex);
+            const generation = state.generation;
+            const params = new URLSearchParams({ offset: pageIndex * GRID_PAGE_ROWS, limit: GRID_PAGE_ROWS });
+            if (state.sort) {
+                params.set('sort', state.sort);
+                params.set('descending', state.descending ? '1' : '0');
+            }
+            fetch(`${item.url}?${params}`)
+            .then(response => response.json())
+            .then(data => {
+                if (generation !== state.generation) {
+                    return;
+                }
+                if (data.status !== 'success') {
+                    toastr.error(`Table Error: ${data.message}`);
+                    return;
+                }
+                state.pages.set(pageIndex, data);
+                draw();
+            })
+            .catch(error => console.error('Error:', error));
+        }
+
+        function draw() {
+            const rowsHeight = item.rows * GRID_ROW_HEIGHT;
+            const totalHeight = Math.min(rowsHeight, GRID_MAX_HEIGHT);
+            const visible = Math.ceil(viewport.clientHeight / GRID_ROW_HEIGHT) + 1;
+            let first;
+            let top;
+            if (rowsHeight <= GRID_MAX_HEIGHT) {
+                first = Math.floor(viewport.scrollTop / GRID_ROW_HEIGHT);
+                top = first * GRID_ROW_HEIGHT;
+            } else {
+                const fraction = viewport.scrollTop / Math.max(1, totalHeight - viewport.clientHeight);
+                first = Math.floor(Math.min(1, fraction) * Math.max(0, item.rows - visible));
+                top = viewport.scrollTop;
+            }
+            const last = Math.min(item.rows, first + visible);
+            const bottom = Math.max(0, totalHeight - top - (last - first) * GRID_ROW_HEIGHT);
+            const spacer = px => `<tr class="table-grid-spacer" style="height: ${px}px"><td colspan="${columns.length}"></td></tr>`;
+            let html = spacer(top);
+            for (let i = first; i < last; i++) {
+                const values = rowValues(i);
+                if (!values) {
+                    fetchPage(Math.floor(i / GRID_PAGE_ROWS));
+                }
+                html += '<tr>' + columns.map((_, c) => `<td>${values ? escapeHtml(values[c]) : '&hellip;'}</td>`).join('') + '</tr>';
+            }
+            tbody.innerHTML = html + spacer(bottom);
+        }
+
+        headers.forEach((header, c) => {
+            header.addEventListener('click', () => {
+                // Ascending, then descending, then back to the original order.
+                if (state.sort !== columns[c]) {
+                    state.sort = columns[c];
+                    state.descending = false;
+                } else if (!state.descending) {
+                    state.descending = true;
+                } else {
+                    state.sort = null;
+                }
+                headers.forEach((h, i) => {
+                    const arrow = state.sort === columns[i] ? (state.descending ? ' \u25BC' : ' \u25B2') : '';
+                    h.textContent = columns[i] + arrow;
+                });
+                state.generation += 1;
+                state.pages.clear();
+                state.loading.clear();
+                draw();
+            });
+        });
+
+        let scheduled = false;
+        viewport.addEventListener('scroll', () => {
+            if (!scheduled) {
+                scheduled = true;
+                requestAnimationFrame(() => {
+                    scheduled = false;
+                    draw();
+                });
+            }
+        });
+        draw();
+    }
+
     // Utility function to get CSRF token
     function getCookie(name) {
         let cookieValue = null;
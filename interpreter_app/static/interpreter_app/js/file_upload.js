@@ -22,6 +22,20 @@ document.addEventListener('DOMContentLoaded', function() {
 
         toastr.info('Uploading...', { timeOut: 2000 });
 
+        // Poll ingestion progress while the server parses the file
+        const progressTimer = setInterval(() => {
+            fetch('/upload_progress/')
+                .then(response => response.json())
+                .then(data => {
+                    if (data.status === 'success' && data.progress) {
+                        const { rows, bytes_read, total_bytes } = data.progress;
+                        const percent = total_bytes ? Math.round(100 * bytes_read / total_bytes) : 0;
+                        toastr.info(`Parsed ${rows.toLocaleString()} rows (${percent}%)`, { timeOut: 1000 });
+                    }
+                })
+                .catch(() => {});
+        }, 1000);
+
         fetch('/upload_data/', {
             method: 'POST',
             headers: {
@@ -31,8 +45,12 @@ document.addEventListener('DOMContentLoaded', function() {
         })
         .then(response => response.json())
         .then(data => {
+            clearInterval(progressTimer);
             if (data.status === 'success') {
                 toastr.success('File uploaded successfully.');
+                if (data.truncated) {
+                    toastr.warning(`Only the first ${data.rows.toLocaleString()} rows were loaded.`);
+                }
                 const metadata = data.metadata;
                 dtypesKeysRow.innerHTML = '';
                 dtypesValuesRow.innerHTML = '';
@@ -71,6 +89,7 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         })
         .catch(error => {
+            clearInterval(progressTimer);
             console.error("Error:", error);
             toastr.error(`Error: ${error}`);
         });
@@ -4,6 +4,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const historySection = document.getElementById('history-section');
     const historyList = document.getElementById('history-list');
     const deleteHistoryBtn = document.getElementById('delete-history-btn');
+    const replayHistoryBtn = document.getElementById('replay-history-btn');
 
     document.addEventListener('codeExecuted', function(e) {
         const { command, code } = e.detail;
@@ -32,22 +33,35 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
-    function loadHistory() {
-        fetch('/get_history/')
+    // Pages come newest first; older pages are appended below on demand.
+    function loadHistory(before) {
+        const url = before ? `/get_history/?before=${before}` : '/get_history/';
+        fetch(url)
             .then(response => response.json())
             .then(data => {
                 if (data.status === 'success') {
                     const history = data.history;
-                    if (history.length > 0) {
-                        historySection.classList.remove('d-none');
+                    if (!before) {
                         historyList.innerHTML = '';
-                        for (let i = history.length - 1; i >= 0; i--) {
-                            const item = history[i];
+                    }
+                    const moreBtn = historyList.querySelector('.history-more');
+                    if (moreBtn) {
+                        moreBtn.remove();
+                    }
+                    if (history.length > 0 || before) {
+                        historySection.classList.remove('d-none');
+                        history.forEach(item => {
                             historyList.innerHTML += `<div class="history-item">
-                                <h4>Command ${i + 1}:</h4>
+                                <h4>Command ${item.position}:</h4>
                                 <p>${item.command}</p>
                                 <pre>${item.code}</pre>
                             </div>`;
+                        });
+                        if (data.next) {
+                            historyList.insertAdjacentHTML('beforeend',
+                                '<button class="btn btn-sm btn-outline-secondary history-more">Load older</button>');
+                            historyList.querySelector('.history-more')
+                                .addEventListener('click', () => loadHistory(data.next));
                         }
                     } else {
                         historySection.classList.add('d-none');
@@ -88,6 +102,75 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
+    // Re-runs the whole history on the current dataset; the results stream
+    // in step by step and are shown by command_handler.js.
+    replayHistoryBtn.addEventListener('click', () => {
+        replayHistoryBtn.disabled = true;
+        fetch('/replay/', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCookie('csrftoken')
+            },
+            body: JSON.stringify({})
+        })
+        .then(async response => {
+            if (!response.ok) {
+                const data = await response.json();
+                toastr.error(`Replay Error: ${data.message}`);
+                return;
+            }
+            document.dispatchEvent(new CustomEvent('replayStarted'));
+            await readEvents(response, (event, data) => {
+                if (event === 'step') {
+                    document.dispatchEvent(new CustomEvent('replayStep', { detail: data }));
+                } else if (event === 'done') {
+                    document.dispatchEvent(new CustomEvent('replayDone', { detail: data }));
+                    toastr.success('Replay finished.');
+                } else if (event === 'error') {
+                    toastr.error(`Replay Error: ${data.message}`);
+                }
+            });
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            toastr.error('Error replaying history.');
+        })
+        .finally(() => {
+            replayHistoryBtn.disabled = false;
+        });
+    });
+
+    async function readEvents(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message';
+                const dataLines = [];
+                block.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        dataLines.push(line.slice(5).trim());
+                    }
+                });
+                if (dataLines.length) {
+                    onEvent(event, JSON.parse(dataLines.join('\n')));
+                }
+            }
+        }
+    }
+
     // Utility function to get CSRF token
     function getCookie(name) {
         let cookieValue = null;
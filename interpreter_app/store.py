@@ -0,0 +1,782 @@
+# interpreter_app/store.py
+
+import contextlib
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from interpreter_app.helpers import _column_roots, _root_array
+from interpreter_app.sandbox import open_frame, read_frame, write_frame
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the threads of one process are kept apart
+    fcntl = None
+
+# Versions share the column buffers they did not change. Copy-on-write makes
+# that safe: writing to a column shared with another version copies it
+# first, so a shallow copy of a version can be handed to generated code.
+pd.set_option('mode.copy_on_write', True)
+
+
+class _Version:
+    __slots__ = ('df', 'metadata', 'nbytes', 'buffers', 'version', 'parent', 'label', 'created',
+                 'rows', 'columns', 'path', 'frame_path')
+
+    def __init__(self, df, metadata, parent=None, label=None):
+        self.df = df
+        self.metadata = metadata
+        # Identifies the frame's contents, e.g. for the result cache.
+        self.version = uuid.uuid4().hex
+        self.parent = parent
+        self.label = label
+        self.created = time.time()
+        self.rows, self.columns = df.shape
+        self.buffers = _frame_buffers(df)
+        self.nbytes = sum(nbytes for nbytes, _ in self.buffers.values())
+        self.path = None
+        self.frame_path = None
+
+
+class _Dataset:
+    __slots__ = ('versions', 'head')
+
+    def __init__(self):
+        # Oldest first.
+        self.versions = OrderedDict()
+        self.head = None
+
+
+def _frame_buffers(df):
+    """
+    {id: (nbytes, array)} of the arrays holding df's data. Versions sharing
+    a column share its array, so summing over the union of their buffers
+    counts it once. The arrays are kept so their ids stay unique.
+    """
+    buffers = {}
+    usage = df.memory_usage(index=True, deep=True).to_numpy()
+    index = df.index
+    if not isinstance(index, pd.RangeIndex) and isinstance(index.dtype, np.dtype):
+        index = _root_array(index.to_numpy())
+    buffers[id(index)] = (int(usage[0]), index)
+    for i in range(df.shape[1]):
+        values = df.iloc[:, i].array
+        if isinstance(values, pd.arrays.NumpyExtensionArray):
+            values = _root_array(values.to_numpy())
+            # Object columns also own the Python objects they point at.
+            extra = int(usage[i + 1]) - df.iloc[:, i].to_numpy().nbytes
+            nbytes, _ = buffers.get(id(values), (values.nbytes, values))
+            buffers[id(values)] = (nbytes + extra, values)
+        else:
+            buffers[id(values)] = (int(usage[i + 1]), values)
+    return buffers
+
+
+def share_unchanged_columns(df, parent):
+    """
+    Makes the columns of df that equal parent's column of the same name use
+    parent's arrays, for frames that were built from a copy (e.g. read back
+    from a sandbox worker). Returns df.
+    """
+    if len(df) != len(parent) or not df.index.equals(parent.index) or not parent.columns.is_unique:
+        return df
+    for i, name in enumerate(df.columns):
+        if name not in parent.columns:
+            continue
+        column, parent_column = df.iloc[:, i], parent[name]
+        if column.dtype == parent_column.dtype and column.array.equals(parent_column.array):
+            df.isetitem(i, parent_column)
+    df.index = parent.index
+    return df
+
+
+def _diff(old_df, new_df, old, new):
+    if old_df is None or new_df is None:
+        return None
+    old_names, new_names = [str(c) for c in old_df.columns], [str(c) for c in new_df.columns]
+    changed, dtypes = [], {}
+    if old_df.columns.is_unique and new_df.columns.is_unique:
+        old_roots = dict(zip(old_df.columns, _column_roots(old_df)))
+        new_roots = dict(zip(new_df.columns, _column_roots(new_df)))
+        for name in new_df.columns:
+            if name not in old_df.columns or old_roots[name] == new_roots[name]:
+                continue
+            old_column, new_column = old_df[name], new_df[name]
+            if old_column.dtype != new_column.dtype:
+                dtypes[str(name)] = [old_column.dtype.name, new_column.dtype.name]
+                changed.append(str(name))
+            elif len(old_column) != len(new_column) or not old_column.array.equals(new_column.array):
+                changed.append(str(name))
+    return {
+        'from': old,
+        'to': new,
+        'rows': [len(old_df), len(new_df)],
+        'added': [c for c in new_names if c not in old_names],
+        'removed': [c for c in old_names if c not in new_names],
+        'changed': changed,
+        'dtype_changes': dtypes,
+        'index_changed': not old_df.index.equals(new_df.index),
+    }
+
+
+class DataFrameStore:
+    """
+    DataFrames keyed by dataset ID (one per session) with a memory budget.
+
+    Each dataset is a tree of versions: commit() adds a child of the current
+    head, checkout()/undo()/redo() move the head without copying or
+    re-profiling, and versions share the column buffers they have in
+    common. Memory is counted per distinct buffer. Over the budget, the
+    least recently used datasets first lose their oldest non-head versions
+    (squashed: their children are re-parented), then have their head frame
+    written to a Parquet file in spill_dir and read back on next access. A
+    dataset never keeps more than max_versions versions.
+    Metadata is small and always stays in memory.
+    """
+
+    def __init__(self, memory_budget, spill_dir, max_versions=20):
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.max_versions = max_versions
+        self._entries = OrderedDict()
+        self._buffers = {}
+        self._resident_bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.squashed = 0
+
+    def put(self, key, df, metadata=None):
+        """Stores df as the first version of a new history for key, replacing any other."""
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = _Dataset()
+            return self._add(key, df, metadata, None, None)
+
+    def commit(self, key, df, metadata=None, label=None, path=None):
+        """
+        Stores df as a new version on top of key's head and makes it the
+        head. path, a file write_frame wrote df to, is not used: the frame
+        is kept in memory.
+        """
+        with self._lock:
+            dataset = self._entries.get(key)
+            if dataset is None:
+                return self.put(key, df, metadata)
+            self._entries.move_to_end(key)
+            head = dataset.versions[dataset.head]
+            if head.df is not None and df is not head.df:
+                share_unchanged_columns(df, head.df)
+            return self._add(key, df, metadata, head.version, label)
+
+    def _add(self, key, df, metadata, parent, label):
+        dataset = self._entries[key]
+        entry = _Version(df, metadata or {}, parent, label)
+        dataset.versions[entry.version] = entry
+        dataset.head = entry.version
+        self._retain(entry)
+        while len(dataset.versions) > self.max_versions:
+            self._squash(key, self._oldest_history(dataset))
+        self._enforce_budget()
+        return entry.version
+
+    def get(self, key, version=None, columns=None):
+        """
+        The frame of a version (the head by default). With columns set, a
+        frame spilled to Parquet is not loaded back: only the given columns
+        (those it has) are read, for one use.
+        """
+        with self._lock:
+            dataset = self._entries.get(key)
+            if dataset is None:
+                return None
+            entry = dataset.versions.get(version or dataset.head)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            if entry.df is not None:
+                self.hits += 1
+                return entry.df
+            self.misses += 1
+            if columns is not None and entry.path.endswith('.parquet'):
+                present = pq.read_schema(entry.path).names
+                return pd.read_parquet(entry.path, columns=[c for c in present if c in columns])
+            entry.df = self._load(entry.path)
+            # The file is only needed while the frame is out of memory.
+            self._remove_file(entry.path)
+            entry.path = None
+            entry.buffers = _frame_buffers(entry.df)
+            self._retain(entry)
+            self._enforce_budget()
+            return entry.df
+
+    def _head(self, key):
+        dataset = self._entries.get(key)
+        return dataset.versions[dataset.head] if dataset is not None else None
+
+    def get_metadata(self, key):
+        with self._lock:
+            entry = self._head(key)
+            return entry.metadata if entry is not None else {}
+
+    def get_version(self, key):
+        with self._lock:
+            entry = self._head(key)
+            return entry.version if entry is not None else None
+
+    def set_metadata(self, key, metadata):
+        with self._lock:
+            entry = self._head(key)
+            if entry is not None:
+                entry.metadata = metadata
+
+    def checkout(self, key, version):
+        """Makes version the head of key. Returns False if there is no such version."""
+        with self._lock:
+            dataset = self._entries.get(key)
+            if dataset is None or version not in dataset.versions:
+                return False
+            dataset.head = version
+            self._entries.move_to_end(key)
+            return True
+
+    def undo(self, key):
+        """Checks out the head's parent. Returns its version, or None at the root."""
+        with self._lock:
+            entry = self._head(key)
+            if entry is None or entry.parent is None:
+                return None
+            self.checkout(key, entry.parent)
+            return entry.parent
+
+    def redo(self, key):
+        """Checks out the head's most recent child. Returns its version, or None."""
+        with self._lock:
+            dataset = self._entries.get(key)
+            if dataset is None:
+                return None
+            children = [v for v, e in dataset.versions.items() if e.parent == dataset.head]
+            if not children:
+                return None
+            self.checkout(key, children[-1])
+            return children[-1]
+
+    def versions(self, key):
+        """The versions of key, oldest first."""
+        with self._lock:
+            dataset = self._entries.get(key)
+            if dataset is None:
+                return []
+            return [
+                {
+                    'version': e.version,
+                    'parent': e.parent,
+                    'label': e.label,
+                    'created': e.created,
+                    'rows': e.rows,
+                    'columns': e.columns,
+                    'head': e.version == dataset.head,
+                    'resident': e.df is not None,
+                }
+                for e in dataset.versions.values()
+            ]
+
+    def diff(self, key, old, new):
+        """
+        Column-level differences between two versions of key, or None if
+        either does not exist. Columns backed by the same array are
+        unchanged without being compared.
+        """
+        with self._lock:
+            old_df, new_df = self.get(key, old), self.get(key, new)
+        return _diff(old_df, new_df, old, new)
+
+    def frame_file(self, key):
+        """
+        Path of an Arrow IPC copy of the head frame for other processes to
+        memory-map. Written on first request and kept until the version is
+        discarded.
+        """
+        with self._lock:
+            entry = self._head(key)
+            if entry is None:
+                return None
+            if entry.frame_path is None:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                base = os.path.join(self.spill_dir, f'{key}.{entry.version}.{uuid.uuid4().hex}')
+                entry.frame_path = write_frame(self.get(key), base)
+            return entry.frame_path
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def discard(self, key):
+        with self._lock:
+            self._drop(key)
+
+    def stats(self):
+        with self._lock:
+            entries = [e for d in self._entries.values() for e in d.versions.values()]
+            resident = sum(1 for d in self._entries.values() if d.versions[d.head].df is not None)
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'squashed': self.squashed,
+                'entries': len(self._entries),
+                'resident_entries': resident,
+                'spilled_entries': len(self._entries) - resident,
+                'versions': len(entries),
+                'unshared_bytes': sum(e.nbytes for e in entries if e.df is not None),
+                'resident_bytes': self._resident_bytes,
+                'memory_budget': self.memory_budget,
+            }
+
+    def _retain(self, entry):
+        for buffer_id, (nbytes, array) in entry.buffers.items():
+            counted = self._buffers.get(buffer_id)
+            if counted is None:
+                self._buffers[buffer_id] = [1, nbytes, array]
+                self._resident_bytes += nbytes
+            else:
+                counted[0] += 1
+
+    def _release(self, entry):
+        for buffer_id in entry.buffers:
+            counted = self._buffers[buffer_id]
+            counted[0] -= 1
+            if not counted[0]:
+                del self._buffers[buffer_id]
+                self._resident_bytes -= counted[1]
+        entry.buffers = {}
+
+    @staticmethod
+    def _oldest_history(dataset):
+        return next(v for v in dataset.versions if v != dataset.head)
+
+    def _squash(self, key, version):
+        dataset = self._entries[key]
+        entry = dataset.versions.pop(version)
+        for child in dataset.versions.values():
+            if child.parent == version:
+                child.parent = entry.parent
+        self._forget(entry)
+        self.squashed += 1
+
+    def _forget(self, entry):
+        if entry.df is not None:
+            self._release(entry)
+            entry.df = None
+        self._remove_file(entry.path)
+        self._remove_file(entry.frame_path)
+
+    def _drop(self, key):
+        dataset = self._entries.pop(key, None)
+        if dataset is None:
+            return
+        for entry in dataset.versions.values():
+            self._forget(entry)
+
+    def _enforce_budget(self):
+        # Least recently used datasets first: their history is squashed, then
+        # their head spilled. The most recently used head is never evicted,
+        # even if it alone is larger than the budget.
+        keys = list(self._entries)
+        for key in keys:
+            dataset = self._entries[key]
+            while self._resident_bytes > self.memory_budget and len(dataset.versions) > 1:
+                self._squash(key, self._oldest_history(dataset))
+            if self._resident_bytes <= self.memory_budget:
+                return
+            head = dataset.versions[dataset.head]
+            if key == keys[-1] or head.df is None:
+                continue
+            head.path = self._spill(f'{key}.{head.version}', head.df)
+            self._release(head)
+            head.df = None
+            self.evictions += 1
+
+    def _spill(self, name, df):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        base = os.path.join(self.spill_dir, name)
+        try:
+            df.to_parquet(base + '.parquet')
+            return base + '.parquet'
+        except Exception:
+            # Parquet needs string column names and homogeneous column types;
+            # anything else still has to survive eviction.
+            self._remove_file(base + '.parquet')
+            with open(base + '.pkl', 'wb') as f:
+                pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+            return base + '.pkl'
+
+    @staticmethod
+    def _load(path):
+        if path.endswith('.parquet'):
+            return pd.read_parquet(path)
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    @staticmethod
+    def _remove_file(path):
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+class SharedDataFrameStore:
+    """
+    The DataFrameStore interface over files under root, for several server
+    processes (e.g. gunicorn workers): a dataset uploaded through one is
+    found by all of them.
+
+    Each version of a dataset is written once, by write_frame, to
+    <root>/<key>/<version>.arrow; <root>/<key>/registry.json lists the
+    versions (parent, label, shape, metadata) and the head. Processes map
+    the files they read (see read_frame), so the numeric and datetime
+    columns of a dataset sit once in the OS page cache however many
+    processes use it; the other columns are converted in each process. A
+    process keeps the frames it opened while their private bytes stay
+    within memory_budget, least recently used first out.
+
+    Registry updates hold an exclusive lock on <root>/<key>/lock across
+    processes and replace the file atomically, so readers never lock; a
+    process parses the registry again only when the file changed. A
+    dataset keeps at most max_versions versions, and datasets not used for
+    max_age seconds (None for no limit) are removed.
+    """
+
+    # Seconds between looks for datasets past max_age, and between records
+    # of a dataset's use.
+    PRUNE_INTERVAL = 600
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, root, memory_budget, max_versions=20, max_age=None):
+        self.root = root
+        self.memory_budget = memory_budget
+        self.max_versions = max_versions
+        self.max_age = max_age
+        # version: [key, frame, private bytes], least recently used first.
+        self._frames = OrderedDict()
+        self._private_bytes = 0
+        # key: (stat signature, registry)
+        self._registries = {}
+        self._touched = {}
+        self._pruned = 0.0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.squashed = 0
+
+    def _path(self, key, name=''):
+        return os.path.join(self.root, key, name)
+
+    @contextlib.contextmanager
+    def _locked(self, key):
+        os.makedirs(self._path(key), exist_ok=True)
+        with self._lock, open(self._path(key, 'lock'), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield  # the lock goes with the file
+
+    def _registry(self, key):
+        """{'head', 'versions': {version: entry}} of key, or None."""
+        path = self._path(key, 'registry.json')
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._registries.pop(key, None)
+            self._uncache(key, ())
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        cached = self._registries.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        try:
+            with open(path) as f:
+                registry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        registry['versions'] = {e['version']: e for e in registry['versions']}
+        self._registries[key] = (signature, registry)
+        # Versions squashed or replaced by another process.
+        self._uncache(key, registry['versions'])
+        return registry
+
+    def _save(self, key, registry):
+        temporary = self._path(key, f'registry.{uuid.uuid4().hex}.tmp')
+        with open(temporary, 'w') as f:
+            json.dump({'head': registry['head'], 'versions': list(registry['versions'].values())},
+                      f, cls=DjangoJSONEncoder)
+        os.replace(temporary, self._path(key, 'registry.json'))
+
+    def _uncache(self, key, keep):
+        for version in [v for v, (k, _, _) in self._frames.items() if k == key and v not in keep]:
+            self._private_bytes -= self._frames.pop(version)[2]
+
+    def _write(self, key, version, df, path):
+        os.makedirs(self._path(key), exist_ok=True)
+        base = self._path(key, version)
+        if path is not None:
+            target = base + os.path.splitext(path)[1]
+            try:
+                os.replace(path, target)
+                return os.path.basename(target)
+            except OSError:  # e.g. on another file system
+                pass
+        return os.path.basename(write_frame(df, base))
+
+    def _add(self, key, df, metadata, label, path, replace):
+        self._prune()
+        # Written before taking the lock: nothing refers to the file yet.
+        version = uuid.uuid4().hex
+        file = self._write(key, version, df, path)
+        with self._locked(key):
+            registry = self._registry(key)
+            if replace or registry is None:
+                for entry in (registry or {'versions': {}})['versions'].values():
+                    self._remove_file(self._path(key, entry['file']))
+                registry = {'head': None, 'versions': {}}
+            registry['versions'][version] = {
+                'version': version,
+                'parent': registry['head'],
+                'label': label,
+                'created': time.time(),
+                'rows': df.shape[0],
+                'columns': df.shape[1],
+                'file': file,
+                'metadata': metadata or {},
+            }
+            registry['head'] = version
+            while len(registry['versions']) > self.max_versions:
+                self._squash(key, registry)
+            self._save(key, registry)
+        return version
+
+    def _squash(self, key, registry):
+        # The oldest version other than the head; its children are re-parented.
+        version = next(v for v in registry['versions'] if v != registry['head'])
+        entry = registry['versions'].pop(version)
+        for child in registry['versions'].values():
+            if child['parent'] == version:
+                child['parent'] = entry['parent']
+        self._remove_file(self._path(key, entry['file']))
+        self.squashed += 1
+
+    def put(self, key, df, metadata=None):
+        """Stores df as the first version of a new history for key, replacing any other."""
+        return self._add(key, df, metadata, None, None, replace=True)
+
+    def commit(self, key, df, metadata=None, label=None, path=None):
+        """
+        Stores df as a new version on top of key's head and makes it the
+        head. path, a file write_frame wrote df to, is moved into the store
+        instead of writing df again.
+        """
+        return self._add(key, df, metadata, label, path, replace=False)
+
+    def get(self, key, version=None, columns=None):
+        """
+        The frame of a version (the head by default). With columns set and
+        the frame not open in this process, only the given columns (those
+        it has) are read, for one use.
+        """
+        with self._lock:
+            registry = self._registry(key)
+            entry = registry['versions'].get(version or registry['head']) if registry else None
+            if entry is None:
+                return None
+            self._touch(key)
+            cached = self._frames.get(entry['version'])
+            if cached is not None:
+                self._frames.move_to_end(entry['version'])
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+            try:
+                if columns is not None:
+                    return read_frame(self._path(key, entry['file']), columns)
+                df, private = open_frame(self._path(key, entry['file']))
+            except FileNotFoundError:  # replaced by another process meanwhile
+                return None
+            self._frames[entry['version']] = [key, df, private]
+            self._private_bytes += private
+            self._enforce_budget()
+            return df
+
+    def _head(self, key):
+        registry = self._registry(key)
+        return registry['versions'][registry['head']] if registry is not None else None
+
+    def get_metadata(self, key):
+        with self._lock:
+            entry = self._head(key)
+            return entry['metadata'] if entry is not None else {}
+
+    def get_version(self, key):
+        with self._lock:
+            entry = self._head(key)
+            return entry['version'] if entry is not None else None
+
+    def set_metadata(self, key, metadata):
+        if key not in self:
+            return
+        with self._locked(key):
+            registry = self._registry(key)
+            if registry is not None:
+                registry['versions'][registry['head']]['metadata'] = metadata
+                self._save(key, registry)
+
+    def _move_head(self, key, choose):
+        # choose(registry) gives the version to check out, or None.
+        if key not in self:
+            return None
+        with self._locked(key):
+            registry = self._registry(key)
+            version = choose(registry) if registry is not None else None
+            if version is not None:
+                registry['head'] = version
+                self._save(key, registry)
+            return version
+
+    def checkout(self, key, version):
+        """Makes version the head of key. Returns False if there is no such version."""
+        return self._move_head(key, lambda r: version if version in r['versions'] else None) is not None
+
+    def undo(self, key):
+        """Checks out the head's parent. Returns its version, or None at the root."""
+        return self._move_head(key, lambda r: r['versions'][r['head']]['parent'])
+
+    def redo(self, key):
+        """Checks out the head's most recent child. Returns its version, or None."""
+        def child(registry):
+            children = [v for v, e in registry['versions'].items() if e['parent'] == registry['head']]
+            return children[-1] if children else None
+        return self._move_head(key, child)
+
+    def versions(self, key):
+        """The versions of key, oldest first; resident ones are open in this process."""
+        with self._lock:
+            registry = self._registry(key)
+            if registry is None:
+                return []
+            return [
+                {
+                    'version': e['version'],
+                    'parent': e['parent'],
+                    'label': e['label'],
+                    'created': e['created'],
+                    'rows': e['rows'],
+                    'columns': e['columns'],
+                    'head': e['version'] == registry['head'],
+                    'resident': e['version'] in self._frames,
+                }
+                for e in registry['versions'].values()
+            ]
+
+    def diff(self, key, old, new):
+        """As DataFrameStore.diff."""
+        with self._lock:
+            old_df, new_df = self.get(key, old), self.get(key, new)
+        return _diff(old_df, new_df, old, new)
+
+    def frame_file(self, key):
+        """Path of the head frame's file, for other processes to memory-map."""
+        with self._lock:
+            entry = self._head(key)
+            return self._path(key, entry['file']) if entry is not None else None
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._registry(key) is not None
+
+    def discard(self, key):
+        with self._locked(key):
+            shutil.rmtree(self._path(key), ignore_errors=True)
+            self._registries.pop(key, None)
+            self._uncache(key, ())
+
+    def stats(self):
+        with self._lock:
+            try:
+                entries = sum(1 for e in os.scandir(self.root) if e.is_dir())
+            except OSError:
+                entries = 0
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'squashed': self.squashed,
+                'entries': entries,
+                'open_versions': len(self._frames),
+                'private_bytes': self._private_bytes,
+                'memory_budget': self.memory_budget,
+            }
+
+    def _enforce_budget(self):
+        # The most recently used frame stays open, even if it alone is
+        # larger than the budget.
+        while self._private_bytes > self.memory_budget and len(self._frames) > 1:
+            self._private_bytes -= self._frames.popitem(last=False)[1][2]
+            self.evictions += 1
+
+    def _touch(self, key):
+        # The lock file's modification time records the dataset's last use.
+        now = time.time()
+        if now - self._touched.get(key, 0) < self.TOUCH_INTERVAL:
+            return
+        self._touched[key] = now
+        with contextlib.suppress(OSError):
+            os.utime(self._path(key, 'lock'))
+
+    def _prune(self):
+        now = time.time()
+        if self.max_age is None or now - self._pruned < self.PRUNE_INTERVAL:
+            return
+        self._pruned = now
+        try:
+            keys = [e.name for e in os.scandir(self.root) if e.is_dir()]
+        except OSError:
+            return
+        for key in keys:
+            try:
+                idle = now - os.stat(self._path(key, 'lock')).st_mtime > self.max_age
+            except OSError:
+                continue
+            if idle:
+                self.discard(key)
+                self._touched.pop(key, None)
+
+    @staticmethod
+    def _remove_file(path):
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+if getattr(settings, 'DATAFRAME_STORE_SHARED_DIR', None):
+    df_store = SharedDataFrameStore(
+        root=settings.DATAFRAME_STORE_SHARED_DIR,
+        memory_budget=getattr(settings, 'DATAFRAME_STORE_MEMORY_BUDGET', 1024 ** 3),
+        max_versions=getattr(settings, 'DATAFRAME_STORE_MAX_VERSIONS', 20),
+        max_age=getattr(settings, 'DATAFRAME_STORE_MAX_AGE', settings.SESSION_COOKIE_AGE),
+    )
+else:
+    df_store = DataFrameStore(
+        memory_budget=getattr(settings, 'DATAFRAME_STORE_MEMORY_BUDGET', 1024 ** 3),
+        spill_dir=getattr(settings, 'DATAFRAME_STORE_SPILL_DIR',
+                          os.path.join(settings.MEDIA_ROOT, 'df_store')),
+        max_versions=getattr(settings, 'DATAFRAME_STORE_MAX_VERSIONS', 20),
+    )
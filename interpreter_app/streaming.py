@@ -0,0 +1,54 @@
+# interpreter_app/streaming.py
+#
+# Server-sent events used between the backend, the app and the browser.
+# A /converse stream is a sequence of:
+#   code      {"delta": "..."}        piece of the generated code
+#   code_end  {}                      the code is complete and can be run
+#   answer    {"delta": "..."}        piece of the chat message
+#   audio     {"data": "<base64>"}    piece of the spoken answer; every chunk
+#                                     decodes on its own
+#   done      {"updated_history": []} end of the reply
+#   error     {"message": "..."}
+
+import json
+
+# Multiple of 4 so each chunk of a base64 string is valid base64 by itself.
+AUDIO_CHUNK_CHARS = 32 * 1024
+
+
+def format_event(event, data, encoder=None):
+    return f'event: {event}\ndata: {json.dumps(data, cls=encoder)}\n\n'.encode()
+
+
+async def aiter_events(lines):
+    """Parses an async iterator of SSE lines into (event, data) pairs."""
+    event, data = 'message', []
+    async for line in lines:
+        if not line:
+            if data:
+                yield event, json.loads('\n'.join(data))
+            event, data = 'message', []
+        elif line.startswith(':'):
+            continue
+        else:
+            field, _, value = line.partition(':')
+            value = value[1:] if value.startswith(' ') else value
+            if field == 'event':
+                event = value
+            elif field == 'data':
+                data.append(value)
+    if data:
+        yield event, json.loads('\n'.join(data))
+
+
+def reply_events(reply):
+    """Splits a complete (non-streamed) /converse reply into stream events."""
+    if reply.get('code'):
+        yield 'code', {'delta': reply['code']}
+    yield 'code_end', {}
+    if reply.get('message'):
+        yield 'answer', {'delta': reply['message']}
+    audio = reply.get('audio') or ''
+    for start in range(0, len(audio), AUDIO_CHUNK_CHARS):
+        yield 'audio', {'data': audio[start:start + AUDIO_CHUNK_CHARS]}
+    yield 'done', {'updated_history': reply.get('updated_history', [])}
@@ -0,0 +1,157 @@
+# interpreter_app/stub_backend.py
+#
+# Minimal stand-in for the speech/LLM backend (/transcribe and /converse) so
+# the app can be run and load-tested offline. It is a small asyncio HTTP/1.1
+# server with keep-alive, so hundreds of concurrent slow requests cost no
+# threads.
+
+import asyncio
+import json
+import re
+import threading
+from collections import OrderedDict
+
+from interpreter_app.metadata_sync import METADATA_VERSION_HEADER, UnknownMetadataVersion, resolve_metadata
+from interpreter_app.streaming import format_event
+
+STUB_TRANSCRIPT = 'show the first rows'
+STUB_CODE = 'df.head()'
+
+
+def converse_reply(payload):
+    command = payload.get('user_input', '')
+    message = f'Here are the first rows of the data for "{command}".'
+    history = list(payload.get('conversation_history', []))
+    history.append({'role': 'user', 'content': command})
+    history.append({'role': 'assistant', 'content': message})
+    return {'code': STUB_CODE, 'message': message, 'audio': '', 'updated_history': history}
+
+
+class StubBackend:
+    def __init__(self, host='127.0.0.1', port=6000, latency=0.0, token_latency=0.02, verbose=False):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.token_latency = token_latency
+        self.verbose = verbose
+        self.requests = 0
+        # Metadata received by version, for payloads that send only the
+        # version or a delta (see metadata_sync.py).
+        self.metadata = OrderedDict()
+        self.max_metadata_versions = 1024
+
+    async def handle(self, method, path, headers, body):
+        """Returns (status, JSON data or async iterator of SSE chunks, extra response headers)."""
+        await asyncio.sleep(self.latency)
+        if method != 'POST':
+            return 405, {'detail': 'Method Not Allowed'}, {}
+        if path == '/transcribe':
+            return 200, {'text': STUB_TRANSCRIPT}, {}
+        if path == '/converse':
+            payload = json.loads(body or b'{}')
+            try:
+                resolve_metadata(payload, self.metadata)
+            except UnknownMetadataVersion:
+                return 409, {'detail': 'Unknown metadata version', 'metadata_required': True}, {}
+            version = payload.get('metadata_version')
+            reply_headers = {}
+            if version in self.metadata:
+                self.metadata.move_to_end(version)
+                reply_headers[METADATA_VERSION_HEADER] = version
+            while len(self.metadata) > self.max_metadata_versions:
+                self.metadata.popitem(last=False)
+            if payload.get('stream'):
+                return 200, self.stream_reply(converse_reply(payload)), reply_headers
+            return 200, converse_reply(payload), reply_headers
+        return 404, {'detail': 'Not Found'}, {}
+
+    async def stream_reply(self, reply):
+        # Word by word, the way a model emits tokens.
+        for token in re.findall(r'\w+|\W', reply['code']):
+            yield format_event('code', {'delta': token})
+            await asyncio.sleep(self.token_latency)
+        yield format_event('code_end', {})
+        for word in reply['message'].split(' '):
+            yield format_event('answer', {'delta': word + ' '})
+            await asyncio.sleep(self.token_latency)
+        yield format_event('done', {'updated_history': reply['updated_history']})
+
+    @staticmethod
+    async def _read_chunked(reader):
+        # Streamed uploads, e.g. the audio transcribe forwards as it decodes.
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if not size:
+                await reader.readline()
+                return bytes(body)
+            body += await reader.readexactly(size)
+            await reader.readline()
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                if headers.get('transfer-encoding', '').lower() == 'chunked':
+                    body = await self._read_chunked(reader)
+                else:
+                    body = await reader.readexactly(int(headers.get('content-length', 0)))
+                self.requests += 1
+                status, data, reply_headers = await self.handle(method, path, headers, body)
+                if self.verbose:
+                    print(f'{method} {path} {status}', flush=True)
+                reason = 'OK' if status == 200 else 'Error'
+                extra = ''.join(f'{name}: {value}\r\n' for name, value in reply_headers.items())
+                if hasattr(data, '__aiter__'):
+                    writer.write(f'HTTP/1.1 {status} {reason}\r\n'
+                                 f'Content-Type: text/event-stream\r\n{extra}'
+                                 f'Transfer-Encoding: chunked\r\n\r\n'.encode('latin-1'))
+                    async for chunk in data:
+                        writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                        await writer.drain()
+                    writer.write(b'0\r\n\r\n')
+                else:
+                    payload = json.dumps(data).encode()
+                    writer.write(
+                        f'HTTP/1.1 {status} {reason}\r\n'
+                        f'Content-Type: application/json\r\n{extra}'
+                        f'Content-Length: {len(payload)}\r\n\r\n'.encode('latin-1') + payload
+                    )
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self):
+        server = await asyncio.start_server(self._serve_connection, self.host, self.port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+    def start_in_thread(self):
+        """Runs the server on its own event loop in a daemon thread (for tests and benchmarks)."""
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            server = loop.run_until_complete(
+                asyncio.start_server(self._serve_connection, self.host, self.port, backlog=4096))
+            self.port = server.sockets[0].getsockname()[1]
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait()
+        return self
@@ -0,0 +1,147 @@
+# interpreter_app/tables.py
+#
+# Table results are kept server-side as Arrow IPC files and read a page at a
+# time, so a large DataFrame never travels to the browser as one JSON blob.
+# Django-free: tables are written by the executor, possibly in a sandbox
+# worker, and paged by the views.
+
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+
+TABLE_EXTENSION = '.arrow'
+MAX_PAGE_ROWS = 5000
+
+
+def _unique_names(names):
+    seen = {}
+    unique = []
+    for name in names:
+        name = str(name) if not isinstance(name, tuple) else ' / '.join(str(n) for n in name)
+        candidate = name
+        while candidate in seen:
+            seen[name] += 1
+            candidate = f'{name}.{seen[name]}'
+        seen[candidate] = 0
+        unique.append(candidate)
+    return unique
+
+
+def to_arrow(df):
+    """
+    Arrow table for display: a meaningful index becomes leading columns,
+    column names become unique strings, and object columns Arrow cannot
+    type are shown as strings.
+    """
+    if not (isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1):
+        index_names = [name if name is not None else 'index' for name in df.index.names]
+        df = df.copy(deep=False)
+        df.index.names = [f'__index_{i}' for i in range(df.index.nlevels)]
+        df = df.reset_index()
+        df.columns = index_names + list(df.columns[len(index_names):])
+    df = df.copy(deep=False)
+    df.columns = _unique_names(df.columns)
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        for col in df.columns:
+            if df[col].dtype == object:
+                df[col] = df[col].astype(str).where(df[col].notna(), None)
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def write_table(df, output_dir):
+    """Writes df for paging and returns (file name, Arrow table)."""
+    table = to_arrow(df)
+    os.makedirs(output_dir, exist_ok=True)
+    name = uuid.uuid4().hex + TABLE_EXTENSION
+    tmp_path = os.path.join(output_dir, f'.{name}.tmp')
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, os.path.join(output_dir, name))
+    return name, table
+
+
+def page_payload(page, offset, total_rows):
+    """Columnar JSON for a page: one list of values per column."""
+    frame = page.to_pandas()
+    columns = ','.join(frame[col].to_json(orient='values', date_format='iso', default_handler=str)
+                       for col in frame.columns)
+    return {
+        'rows': total_rows,
+        'offset': offset,
+        'columns': list(page.column_names),
+        'data': json.loads(f'[{columns}]'),
+    }
+
+
+def table_schema(table):
+    return [{'name': field.name, 'type': str(field.type)} for field in table.schema]
+
+
+def arrow_stream(table):
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+class TablePager:
+    """
+    Reads pages of stored tables, optionally sorted by one column and
+    projected to some columns. Files are memory-mapped, and sort orders are
+    cached so paging through a sorted table sorts it once.
+    """
+
+    def __init__(self, max_sort_orders=16):
+        self.max_sort_orders = max_sort_orders
+        self._sort_orders = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sort_order(self, path, table, sort, descending):
+        key = (path, os.path.getmtime(path), sort, descending)
+        with self._lock:
+            order = self._sort_orders.get(key)
+            if order is not None:
+                self._sort_orders.move_to_end(key)
+                return order
+        order = pc.array_sort_indices(table.column(sort), order='descending' if descending else 'ascending')
+        if isinstance(order, pa.ChunkedArray):
+            order = order.combine_chunks()
+        with self._lock:
+            self._sort_orders[key] = order
+            while len(self._sort_orders) > self.max_sort_orders:
+                self._sort_orders.popitem(last=False)
+        return order
+
+    def page(self, path, offset=0, limit=100, sort=None, descending=False, columns=None):
+        """
+        Returns the Arrow table for rows [offset, offset + limit) and the
+        total row count. Raises KeyError for unknown columns.
+        """
+        limit = max(0, min(limit, MAX_PAGE_ROWS))
+        offset = max(0, offset)
+        # Uncompressed IPC files map without copying, so reading the whole
+        # table only touches the pages of the rows taken.
+        table = feather.read_table(path, memory_map=True)
+        for col in (columns or []) + ([sort] if sort else []):
+            if col not in table.column_names:
+                raise KeyError(col)
+        total = table.num_rows
+        if sort:
+            indices = self._sort_order(path, table, sort, descending).slice(offset, limit)
+            page = table.take(indices)
+        else:
+            page = table.slice(offset, limit)
+        if columns:
+            page = page.select(columns)
+        return page, total
+
+
+pager = TablePager()
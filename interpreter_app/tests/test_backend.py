@@ -0,0 +1,133 @@
+import asyncio
+import functools
+from unittest import mock
+
+import httpx
+from django.test import SimpleTestCase
+
+from interpreter_app.backend import BackendClient
+
+
+def _run(handler, call, **options):
+    """Runs call(client) against a client whose requests go to handler."""
+    async def main():
+        client = BackendClient('http://backend', backoff=0, **options)
+        try:
+            return await call(client)
+        finally:
+            await client.aclose()
+
+    transport = httpx.MockTransport(handler)
+    with mock.patch('interpreter_app.backend.httpx.AsyncClient',
+                    functools.partial(httpx.AsyncClient, transport=transport)):
+        return asyncio.run(main())
+
+
+class BackendClientTests(SimpleTestCase):
+    def test_unavailable_backend_is_retried(self):
+        statuses = iter([503, 502, 200])
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(next(statuses))
+
+        response = _run(handler, lambda client: client.post('converse', json={}), retries=2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(requests), 3)
+        self.assertEqual(requests[0].url.path, '/converse')
+
+    def test_last_response_is_returned_when_retries_run_out(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(503)
+
+        response = _run(handler, lambda client: client.post('converse', json={}), retries=1)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(requests), 2)
+
+    def test_other_errors_are_not_retried(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(500)
+
+        response = _run(handler, lambda client: client.post('converse', json={}))
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(len(requests), 1)
+
+    def test_connect_errors_are_retried(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            if len(requests) == 1:
+                raise httpx.ConnectError('refused', request=request)
+            return httpx.Response(200)
+
+        response = _run(handler, lambda client: client.post('transcribe', content=b'x'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(requests), 2)
+
+        def failing(request):
+            raise httpx.ConnectError('refused', request=request)
+
+        with self.assertRaises(httpx.ConnectError):
+            _run(failing, lambda client: client.post('transcribe', content=b'x'), retries=1)
+
+    def test_read_timeouts_are_not_retried(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            raise httpx.ReadTimeout('slow', request=request)
+
+        with self.assertRaises(httpx.ReadTimeout):
+            _run(handler, lambda client: client.post('converse', json={}))
+        self.assertEqual(len(requests), 1)
+
+    def test_per_endpoint_timeouts(self):
+        timeouts = {}
+
+        def handler(request):
+            timeouts[request.url.path] = request.extensions['timeout']['read']
+            return httpx.Response(200)
+
+        async def call(client):
+            await client.post('transcribe', content=b'x')
+            await client.post('converse', json={})
+
+        _run(handler, call, timeouts={'transcribe': 30}, default_timeout=90)
+        self.assertEqual(timeouts, {'/transcribe': 30, '/converse': 90})
+
+    def test_concurrency_is_capped(self):
+        state = {'active': 0, 'peak': 0}
+
+        async def handler(request):
+            state['active'] += 1
+            state['peak'] = max(state['peak'], state['active'])
+            await asyncio.sleep(0.01)
+            state['active'] -= 1
+            return httpx.Response(200)
+
+        async def call(client):
+            return await asyncio.gather(*(client.post('converse', json={}) for _ in range(10)))
+
+        responses = _run(handler, call, max_concurrency=3)
+        self.assertEqual(len(responses), 10)
+        self.assertEqual(state['peak'], 3)
+
+    def test_stream_retries_opening_the_response(self):
+        statuses = iter([503, 200])
+
+        def handler(request):
+            return httpx.Response(next(statuses), content=b'event: done\n\n')
+
+        async def call(client):
+            async with client.stream('converse', json={}) as response:
+                return response.status_code, await response.aread()
+
+        self.assertEqual(_run(handler, call), (200, b'event: done\n\n'))
@@ -0,0 +1,33 @@
+from django.test import SimpleTestCase
+
+from interpreter_app.code_prep import prepare
+
+
+class CodePrepTests(SimpleTestCase):
+    def test_column_projection(self):
+        cases = {
+            "df['a'].mean()": {'a'},
+            "df[['a', 'b']].describe()": {'a', 'b'},
+            'df.a + df.b': {'a', 'b'},
+            "df.loc[df.x > 0, 'y']": {'x', 'y'},
+            "df.groupby('g')['v'].sum()": {'g', 'v'},
+            "px.scatter(df, x='a', y='b', color='c')": {'a', 'b', 'c'},
+            "sns.histplot(data=df, x='a')": {'a'},
+        }
+        for code, columns in cases.items():
+            self.assertEqual(prepare(code).columns, columns, code)
+
+    def test_whole_frame_uses(self):
+        for code in ('df.describe()', "df['c'] = 1", 'px.scatter(df)', "col = 'a'\npx.scatter(df, x=col)",
+                     "sql('select a from df')", 'f(df)', 'df = df.dropna()'):
+            self.assertIsNone(prepare(code).columns, code)
+
+    def test_imports_and_trailing_expression(self):
+        prepared = prepare("import numpy as numeric\nfrom pandas import DataFrame\nimport os\nnumeric.mean(df['a'])")
+        self.assertEqual(prepared.imported, {'numeric', 'DataFrame'})
+        self.assertNotIn('import os', prepared.source)
+        self.assertIsNotNone(prepared.expression)
+        self.assertIsNone(prepare("plt.plot(df['a'])").expression)
+        self.assertIs(prepare('x = 1'), prepare('x = 1'))
+        with self.assertRaises(SyntaxError):
+            prepare('df[')
@@ -0,0 +1,145 @@
+from unittest import mock
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import seaborn as sns
+from django.test import SimpleTestCase
+
+from interpreter_app.downsampling import (PlotlyExpress, Seaborn, grid_indices, lttb_indices, minmax_indices,
+                                          point_budget)
+from interpreter_app.executor import run_code
+
+
+class IndexTests(SimpleTestCase):
+    def test_minmax_keeps_the_envelope(self):
+        y = np.sin(np.linspace(0, 20, 10_000))
+        y[1234], y[5678] = 5, -5
+        y[4000:4010] = np.nan
+        keep = minmax_indices(y, 400)
+        self.assertLessEqual(len(keep), 400 + 100)
+        self.assertTrue({0, 9999, 1234, 5678} <= set(keep.tolist()))
+        self.assertTrue(np.isnan(y[keep]).any())
+        self.assertTrue(np.all(np.diff(keep) > 0))
+
+    def test_lttb(self):
+        x = np.arange(1000)
+        y = np.zeros(1000)
+        y[500] = 10
+        keep = lttb_indices(x, y, 50)
+        self.assertEqual(len(keep), 50)
+        self.assertEqual((keep[0], keep[-1]), (0, 999))
+        self.assertIn(500, keep)
+        self.assertEqual(len(lttb_indices(x[:10], y[:10], 50)), 10)
+
+    def test_grid_keeps_one_point_per_cell(self):
+        x = np.repeat([0.0, 1.0], 500)
+        y = np.tile([0.0, 1.0], 500)
+        self.assertEqual(sorted(grid_indices(x, y, 100).tolist()), [0, 1, 500, 501])
+        # Per group, and never more than asked for.
+        self.assertEqual(len(grid_indices(x, y, 100, groups=np.arange(1000) % 3)), 12)
+        self.assertEqual(len(grid_indices(np.arange(1000.0), np.arange(1000.0), 10)), 10)
+
+
+class PointBudgetTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(plt.close, 'all')
+
+    def test_matplotlib_calls_in_the_block(self):
+        fig, ax = plt.subplots()
+        with point_budget(100):
+            line, = ax.plot(np.arange(10_000), np.random.default_rng(0).normal(size=10_000))
+            scatter = ax.scatter(np.arange(10_000), np.arange(10_000) % 7, c=np.arange(10_000))
+            bars = ax.hist(np.arange(10_000), bins=10)
+        self.assertLessEqual(len(line.get_xdata()), 100)
+        self.assertLessEqual(len(scatter.get_offsets()), 100)
+        self.assertEqual(len(scatter.get_array()), len(scatter.get_offsets()))
+        self.assertEqual(bars[0].tolist(), [1000] * 10)
+        # Outside the block every point is plotted.
+        line, = ax.plot(np.arange(10_000))
+        self.assertEqual(len(line.get_xdata()), 10_000)
+
+    def test_unordered_lines_are_left_alone(self):
+        fig, ax = plt.subplots()
+        with point_budget(100):
+            line, = ax.plot(np.cos(np.linspace(0, 10, 1000)), np.sin(np.linspace(0, 10, 1000)))
+        self.assertEqual(len(line.get_xdata()), 1000)
+
+
+class PlotlyExpressTests(SimpleTestCase):
+    def setUp(self):
+        self.frame = pd.DataFrame({'x': np.arange(20_000), 'y': np.random.default_rng(0).normal(size=20_000),
+                                   'g': ['a', 'b'] * 10_000})
+        self.px = PlotlyExpress(px, 400)
+
+    def test_line(self):
+        fig = self.px.line(self.frame, x='x', y='y', color='g')
+        self.assertEqual([trace.name for trace in fig.data], ['a', 'b'])
+        self.assertLessEqual(sum(len(trace.x) for trace in fig.data), 400 + 8)
+
+    def test_scatter(self):
+        fig = self.px.scatter(self.frame, x='x', y='y')
+        self.assertLessEqual(len(fig.data[0].x), 400)
+
+    def test_histogram(self):
+        fig = self.px.histogram(self.frame, x='y', nbins=20)
+        self.assertLessEqual(len(fig.data[0].x), 20)
+        self.assertEqual(sum(fig.data[0].y), 20_000)
+
+    def test_small_frames_and_other_functions_pass_through(self):
+        small = self.frame.head(100)
+        self.assertEqual(len(self.px.line(small, x='x', y='y').data[0].x), 100)
+        self.assertIs(self.px.bar, px.bar)
+
+
+class SeabornTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(plt.close, 'all')
+        rng = np.random.default_rng(0)
+        self.frame = pd.DataFrame({'t': np.repeat(np.arange(500), 40), 'v': rng.normal(size=20_000),
+                                   'g': rng.choice(['b', 'a'], 20_000)})
+        self.sns = Seaborn(sns, 400)
+
+    def test_repeated_x_is_aggregated(self):
+        ax = self.sns.lineplot(data=self.frame, x='t', y='v', hue='g')
+        expected = self.frame.groupby(['g', 't'])['v'].mean()
+        lines = [line for line in ax.get_lines() if len(line.get_xdata()) > 1]
+        self.assertEqual(len(lines), 2)
+        # Hue levels keep their order of appearance, and so their colours.
+        levels = pd.unique(self.frame['g']).tolist()
+        self.assertEqual([text.get_text() for text in ax.get_legend().get_texts()], levels)
+        for line, level in zip(lines, levels):
+            x, y = line.get_xdata(), line.get_ydata()
+            self.assertLessEqual(len(x), 200 + 4)
+            np.testing.assert_allclose(y, expected[level].loc[x].to_numpy())
+        # No bootstrapped band.
+        self.assertEqual(len(ax.collections), 0)
+
+    def test_one_row_per_x_is_thinned(self):
+        frame = pd.DataFrame({'t': np.arange(20_000)[::-1], 'v': np.arange(20_000.0)})
+        ax = self.sns.lineplot(data=frame, x='t', y='v')
+        line, = ax.get_lines()
+        self.assertLessEqual(len(line.get_xdata()), 400)
+        self.assertEqual((line.get_xdata()[0], line.get_xdata()[-1]), (0, 19_999))
+
+    def test_other_calls_pass_through(self):
+        small = self.frame.head(100)
+        ax = self.sns.lineplot(data=small, x='t', y='v')
+        self.assertEqual(len(ax.collections), 1)
+        plt.close('all')
+        frame = self.frame.head(1000)
+        ax = self.sns.lineplot(data=frame, x='t', y='v', hue=frame['g'].to_numpy())
+        self.assertGreater(len(ax.collections), 0)
+        self.assertIs(self.sns.histplot, sns.histplot)
+
+    def test_run_code_uses_the_budget(self):
+        with mock.patch.object(Seaborn, '_line_data', autospec=True, side_effect=Seaborn._line_data) as line_data:
+            result = run_code(self.frame, "sns.lineplot(data=df, x='t', y='v')", {'point_budget': 400})
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(line_data.call_count, 1)
+        self.assertEqual(result['output_items'][0]['type'], 'plot')
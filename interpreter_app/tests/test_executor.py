@@ -0,0 +1,23 @@
+import pandas as pd
+from django.test import SimpleTestCase
+
+from interpreter_app.executor import run_code
+
+
+class ExecutorTests(SimpleTestCase):
+    def setUp(self):
+        self.frame = pd.DataFrame({'x': [1, -1], 'y': [3, 4]})
+
+    def test_chained_assignment_is_an_error(self):
+        # Under copy-on-write it would leave df unchanged.
+        for code in ("df['y'].iloc[1] = 9", "df[df.x > 0]['y'] = 0"):
+            result = run_code(self.frame.copy(deep=False), code, {'output_dir': None})
+            self.assertEqual(result['status'], 'error', code)
+            self.assertIn('chained assignment', result['message'])
+        self.assertEqual(self.frame['y'].tolist(), [3, 4])
+
+    def test_writes_leave_the_given_frame_unchanged(self):
+        result = run_code(self.frame.copy(deep=False), "df.loc[df.x > 0, 'y'] = 0", {'output_dir': None})
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['df']['y'].tolist(), [0, 4])
+        self.assertEqual(self.frame['y'].tolist(), [3, 4])
@@ -0,0 +1,90 @@
+import json
+
+from django.test import TestCase
+
+from interpreter_app.history import (add_entry, append_chat_history, entries_page, estimate_tokens,
+                                     load_chat_history, replay_entries)
+from interpreter_app.models import ChatMessage
+
+
+def _message(role, length):
+    return {'role': role, 'content': 'x' * length}
+
+
+class ChatHistoryTests(TestCase):
+    async def test_only_new_messages_are_written(self):
+        first = [_message('user', 10), _message('assistant', 10)]
+        await append_chat_history('s', [], first)
+        second = first + [_message('user', 20), _message('assistant', 20)]
+        await append_chat_history('s', first, second)
+        self.assertEqual(await ChatMessage.objects.filter(session_key='s').acount(), 4)
+        self.assertEqual(await load_chat_history('s'), second)
+        self.assertEqual(await load_chat_history('other'), [])
+
+    async def test_rewritten_history_replaces_the_conversation(self):
+        await append_chat_history('s', [], [_message('user', 10), _message('assistant', 10)])
+        summary = [_message('user', 5)]
+        await append_chat_history('s', [_message('user', 10), _message('assistant', 10)], summary)
+        self.assertEqual(await load_chat_history('s'), summary)
+
+    async def test_trimmed_to_the_token_budget(self):
+        messages = [_message('user', 400), _message('assistant', 400), _message('user', 40),
+                    _message('assistant', 40)]
+        await append_chat_history('s', [], messages)
+        self.assertEqual(estimate_tokens(messages[0]), 104)
+        self.assertEqual(await load_chat_history('s', token_budget=10_000), messages)
+        # The assistant message that would open the conversation is dropped too.
+        self.assertEqual(await load_chat_history('s', token_budget=150), messages[2:])
+        self.assertEqual(await load_chat_history('s', token_budget=10_000, max_messages=3), messages[2:])
+        self.assertEqual(await load_chat_history('s', token_budget=10), [])
+
+
+class CommandHistoryTests(TestCase):
+    def setUp(self):
+        self.entries = [add_entry('s', f'command {i}', f'x = {i}') for i in range(5)]
+        add_entry('other', 'command', 'y = 1')
+
+    def test_positions(self):
+        self.assertEqual([entry.position for entry in self.entries], [1, 2, 3, 4, 5])
+        self.assertEqual(add_entry('new', 'c', 'z = 1').position, 1)
+
+    def test_pages(self):
+        page, cursor = entries_page('s', limit=2)
+        self.assertEqual([entry['command'] for entry in page], ['command 4', 'command 3'])
+        page, cursor = entries_page('s', before=cursor, limit=2)
+        self.assertEqual([entry['command'] for entry in page], ['command 2', 'command 1'])
+        page, cursor = entries_page('s', before=cursor, limit=2)
+        self.assertEqual([entry['command'] for entry in page], ['command 0'])
+        self.assertIsNone(cursor)
+
+    async def test_replay_entries(self):
+        ids = [self.entries[3].id, self.entries[1].id]
+        self.assertEqual(await replay_entries('s', ids), [('command 3', 'x = 3'), ('command 1', 'x = 1')])
+        self.assertEqual(len(await replay_entries('s')), 5)
+        other = (await replay_entries('other'))[0]
+        self.assertEqual(other, ('command', 'y = 1'))
+        with self.assertRaises(KeyError):
+            await replay_entries('other', ids)
+
+
+class HistoryViewTests(TestCase):
+    def add(self, command):
+        response = self.client.post('/add_history/', json.dumps({'command': command, 'code': 'df.head()'}),
+                                    content_type='application/json')
+        return response.json()
+
+    def test_add_page_and_delete(self):
+        for i in range(3):
+            self.assertEqual(self.add(f'command {i}')['position'], i + 1)
+        body = self.client.get('/get_history/', {'limit': 2}).json()
+        self.assertEqual([entry['command'] for entry in body['history']], ['command 2', 'command 1'])
+        body = self.client.get('/get_history/', {'limit': 2, 'before': body['next']}).json()
+        self.assertEqual(([entry['command'] for entry in body['history']], body['next']), (['command 0'], None))
+        self.assertEqual(self.client.get('/get_history/', {'limit': 'x'}).status_code, 400)
+        self.client.post('/delete_history/')
+        self.assertEqual(self.client.get('/get_history/').json()['history'], [])
+
+    def test_sessions_are_separate(self):
+        self.add('mine')
+        self.client.logout()
+        self.assertEqual(self.client.get('/get_history/').json()['history'], [])
@@ -0,0 +1,89 @@
+import io
+
+import pandas as pd
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from interpreter_app.ingest import downcast_chunk, is_supported, read_upload
+
+
+def _upload(name, data):
+    return SimpleUploadedFile(name, data)
+
+
+class ReadUploadTests(SimpleTestCase):
+    def setUp(self):
+        self.frame = pd.DataFrame({
+            'n': range(10),
+            'x': [i / 2 for i in range(10)],
+            'g': ['a', 'b'] * 5,
+        })
+
+    def test_chunks_are_concatenated_with_progress(self):
+        calls = []
+        df, info = read_upload(_upload('d.csv', self.frame.to_csv(index=False).encode()), chunk_rows=3,
+                               progress=lambda *args: calls.append(args))
+        pd.testing.assert_frame_equal(df, self.frame)
+        self.assertEqual(info, {'rows': 10, 'truncated': False})
+        self.assertEqual([rows for rows, _, _ in calls], [3, 6, 9, 10])
+        self.assertEqual(calls[-1][1], calls[-1][2])
+
+    def test_row_budget_truncates(self):
+        df, info = read_upload(_upload('d.csv', self.frame.to_csv(index=False).encode()), row_budget=4,
+                               chunk_rows=3)
+        self.assertEqual(len(df), 4)
+        self.assertEqual(info, {'rows': 4, 'truncated': True})
+
+    def test_delimiters_and_xlsx(self):
+        df, _ = read_upload(_upload('d.tsv', self.frame.to_csv(index=False, sep='\t').encode()))
+        pd.testing.assert_frame_equal(df, self.frame)
+        buffer = io.BytesIO()
+        self.frame.to_excel(buffer, index=False)
+        df, info = read_upload(_upload('d.xlsx', buffer.getvalue()), chunk_rows=4)
+        pd.testing.assert_frame_equal(df, self.frame)
+        self.assertEqual(info['rows'], 10)
+
+    def test_downcasting_is_opt_in(self):
+        data = self.frame.to_csv(index=False).encode()
+        df, _ = read_upload(_upload('d.csv', data))
+        self.assertEqual(df.dtypes.tolist(), ['int64', 'float64', 'object'])
+        frame = self.frame.assign(g=['a'] * 5 + ['b'] * 5)
+        df, _ = read_upload(_upload('d.csv', frame.to_csv(index=False).encode()), chunk_rows=5,
+                            downcast=('integer', 'float', 'category'))
+        self.assertEqual(df['n'].dtype, 'int8')
+        self.assertEqual(df['x'].dtype, 'float32')
+        # The chunks' categories are unified.
+        self.assertEqual(df['g'].cat.categories.tolist(), ['a', 'b'])
+        self.assertEqual(df['g'].tolist(), frame['g'].tolist())
+
+    def test_lossy_float_downcast_is_skipped(self):
+        chunk = downcast_chunk(pd.DataFrame({'x': [0.1, 0.2]}), ('float',))
+        self.assertEqual(chunk['x'].dtype, 'float64')
+
+    def test_empty_upload(self):
+        with self.assertRaises(ValueError):
+            read_upload(_upload('d.xlsx', _empty_workbook()))
+
+    def test_supported_types(self):
+        self.assertTrue(is_supported('DATA.CSV'))
+        self.assertFalse(is_supported('data.json'))
+
+
+def _empty_workbook():
+    buffer = io.BytesIO()
+    pd.DataFrame().to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+class UploadViewTests(TestCase):
+    @override_settings(UPLOAD_ROW_BUDGET=2)
+    def test_upload(self):
+        response = self.client.post('/upload_data/', {'file': _upload('d.csv', b'a,b\n1,x\n2,y\n3,z\n')})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['rows'], body['truncated']), (2, True))
+        self.assertEqual(body['metadata']['columns'], ['a', 'b'])
+
+    def test_unsupported_type(self):
+        response = self.client.post('/upload_data/', {'file': _upload('d.json', b'{}')})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,57 @@
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from interpreter_app.helpers import MAX_CATEGORICAL_VALUES, MetadataProfiler, column_fingerprint
+
+
+class MetadataProfilerTests(SimpleTestCase):
+    def setUp(self):
+        self.profiler = MetadataProfiler()
+        self.frame = pd.DataFrame({
+            'n': [3, 1, 2],
+            'big': [2 ** 60 + 1, 0, 1],
+            'x': [0.5, np.nan, 1.5],
+            'g': ['a', 'b', 'a'],
+            'c': pd.Categorical(['u', 'v', 'u']),
+            't': pd.to_datetime(['2020-01-01'] * 3),
+        })
+
+    def test_profile(self):
+        metadata = self.profiler.profile(self.frame)
+        self.assertEqual(metadata['columns'], ['n', 'big', 'x', 'g', 'c', 't'])
+        self.assertEqual(metadata['dtypes']['c'], 'category')
+        self.assertEqual(len(metadata['sample_rows']), 3)
+        self.assertEqual(metadata['numerical_ranges']['n'], {'min': 1, 'max': 3})
+        # Integer ranges are not rounded through float64.
+        self.assertEqual(metadata['numerical_ranges']['big']['max'], 2 ** 60 + 1)
+        self.assertEqual(metadata['numerical_ranges']['x'], {'min': 0.5, 'max': 1.5})
+        self.assertNotIn('t', metadata['numerical_ranges'])
+        self.assertEqual(metadata['categorical_values']['g'], ['a', 'b'])
+        self.assertEqual(metadata['categorical_values']['c'], ['u', 'v'])
+
+    def test_many_values_are_cut(self):
+        frame = pd.DataFrame({'g': [str(i) for i in range(MAX_CATEGORICAL_VALUES + 5)]})
+        values = self.profiler.profile(frame)['categorical_values']['g']
+        self.assertEqual(len(values), MAX_CATEGORICAL_VALUES + 1)
+        self.assertEqual(values[-1], '...')
+
+    def test_only_changed_columns_are_recomputed(self):
+        self.profiler.profile(self.frame)
+        changed = self.frame.assign(n=[7, 8, 9])
+        with mock.patch.object(MetadataProfiler, '_numerical_ranges', wraps=MetadataProfiler._numerical_ranges) as ranges, \
+                mock.patch.object(MetadataProfiler, '_categorical_values',
+                                  wraps=MetadataProfiler._categorical_values) as values:
+            metadata = self.profiler.profile(changed)
+        self.assertEqual(ranges.call_args.args[1], ['n'])
+        self.assertEqual(values.call_args.args[1], [])
+        self.assertEqual(metadata['numerical_ranges']['n'], {'min': 7, 'max': 9})
+        self.assertEqual(metadata['categorical_values']['g'], ['a', 'b'])
+
+    def test_fingerprint_follows_content(self):
+        series = pd.Series([1.0, 2.0])
+        self.assertEqual(column_fingerprint(series)[0], column_fingerprint(series.copy())[0])
+        self.assertNotEqual(column_fingerprint(series)[0], column_fingerprint(series + 1)[0])
+        self.assertNotEqual(column_fingerprint(series)[0], column_fingerprint(series.astype('float32'))[0])
@@ -0,0 +1,105 @@
+import functools
+import json
+from unittest import mock
+
+import httpx
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase
+
+from interpreter_app.backend import backend
+from interpreter_app.metadata_sync import (
+    METADATA_VERSION_HEADER, UnknownMetadataVersion, compact_metadata, metadata_fields, metadata_version,
+    resolve_metadata,
+)
+from interpreter_app.reply_cache import ReplyCache
+
+
+class MetadataHandshakeTests(SimpleTestCase):
+    def setUp(self):
+        self.metadata = compact_metadata({
+            'columns': ['a', 'b'],
+            'dtypes': {'a': 'int64', 'b': 'object'},
+            'numerical_ranges': {'a': {'min': 1, 'max': 3}},
+            'categorical_values': {'b': ['x', 'y']},
+            'sample_rows': [{'a': 1, 'b': 'x'}, {'a': 3, 'b': 'y'}],
+        })
+
+    def test_full_then_version_then_delta(self):
+        known = {}
+        fields = metadata_fields(self.metadata)
+        self.assertEqual(resolve_metadata(fields, known), self.metadata)
+        sent = {'version': metadata_version(self.metadata), 'metadata': self.metadata}
+
+        fields = metadata_fields(self.metadata, sent)
+        self.assertEqual(set(fields), {'metadata_version'})
+        self.assertEqual(resolve_metadata(fields, known), self.metadata)
+
+        changed = compact_metadata({**self.metadata, 'categorical_values': {'b': ['x', 'y', 'z']}})
+        fields = metadata_fields(changed, sent)
+        self.assertIn('metadata_delta', fields)
+        self.assertEqual(fields['metadata_delta']['set'], {'categorical_values': {'b': ['x', 'y', 'z']}})
+        self.assertEqual(resolve_metadata(fields, known), changed)
+
+    def test_unknown_version(self):
+        sent = {'version': metadata_version(self.metadata), 'metadata': self.metadata}
+        with self.assertRaises(UnknownMetadataVersion):
+            resolve_metadata(metadata_fields(self.metadata, sent), {})
+        changed = compact_metadata({**self.metadata, 'columns': ['a', 'b', 'c']})
+        with self.assertRaises(UnknownMetadataVersion):
+            resolve_metadata(metadata_fields(changed, sent), {})
+
+
+class ConverseMetadataTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('interpreter_app.views.reply_cache', ReplyCache(0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.payloads = []
+
+    def backend(self, acknowledge):
+        known = {}
+
+        def handler(request):
+            payload = json.loads(request.content)
+            self.payloads.append(payload)
+            try:
+                resolve_metadata(payload, known)
+            except UnknownMetadataVersion:
+                return httpx.Response(409, json={'metadata_required': True})
+            headers = {METADATA_VERSION_HEADER: payload['metadata_version']} if acknowledge else {}
+            return httpx.Response(200, headers=headers, json={'code': '', 'message': '', 'updated_history': []})
+
+        return mock.patch('interpreter_app.backend.httpx.AsyncClient',
+                          functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)))
+
+    async def converse(self, times):
+        await self.async_client.post('/upload_data/', {'file': SimpleUploadedFile('d.csv', b'a,b\n1,x\n2,y\n')})
+        for i in range(times):
+            response = await self.async_client.post('/generate_code/', json.dumps({'command': f'command {i}'}),
+                                                    content_type='application/json')
+            self.assertEqual(response.json()['status'], 'success')
+
+    async def test_backend_that_acknowledges_gets_the_version(self):
+        with self.backend(acknowledge=True):
+            await self.converse(3)
+        self.assertIn('metadata', self.payloads[0])
+        self.assertEqual([set(p) & {'metadata', 'metadata_version'} for p in self.payloads[1:]],
+                         [{'metadata_version'}] * 2)
+
+    async def test_backend_that_does_not_acknowledge_keeps_getting_metadata(self):
+        with self.backend(acknowledge=False):
+            await self.converse(3)
+        self.assertEqual(len(self.payloads), 3)
+        self.assertTrue(all(p['metadata']['columns'] == ['a', 'b'] for p in self.payloads))
+
+    async def test_unknown_version_is_sent_again_in_full(self):
+        with self.backend(acknowledge=True):
+            await self.converse(1)
+            # The client is kept per event loop; the next one goes to a new
+            # backend process, which lacks the version.
+            await backend.aclose()
+        with self.backend(acknowledge=True):
+            await self.async_client.post('/generate_code/', json.dumps({'command': 'again'}),
+                                         content_type='application/json')
+        self.assertEqual([set(p) & {'metadata', 'metadata_version'} for p in self.payloads[1:]],
+                         [{'metadata_version'}, {'metadata', 'metadata_version'}])
@@ -0,0 +1,123 @@
+import base64
+import io
+import os
+import shutil
+import tempfile
+import time
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import pandas as pd
+import plotly.graph_objects as go
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from interpreter_app.rendering import prune_output_dir, render_outputs
+
+
+class RenderOutputsTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.addCleanup(plt.close, 'all')
+
+    def test_text(self):
+        items = render_outputs([3, 'text', list(range(1000))])
+        self.assertEqual(items[:2], [{'type': 'text', 'data': '3'}, {'type': 'text', 'data': 'text'}])
+        self.assertTrue(items[2]['data'].endswith(' ... [truncated]'))
+
+    def test_figure_and_its_axes_render_once(self):
+        fig, ax = plt.subplots(figsize=(4, 3))
+        ax.plot([1, 2, 3])
+        items = render_outputs([ax, fig])
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]['format'], 'png')
+        image = Image.open(io.BytesIO(base64.b64decode(items[0]['data'])))
+        self.assertEqual(image.size, (400, 300))
+
+    def test_large_figures_get_a_lower_dpi(self):
+        fig, ax = plt.subplots(figsize=(40, 10))
+        image = Image.open(io.BytesIO(base64.b64decode(render_outputs([fig], {'max_pixels': 800})[0]['data'])))
+        self.assertEqual(image.size, (800, 200))
+
+    def test_images_are_written_under_their_hash(self):
+        fig, ax = plt.subplots()
+        ax.plot([1, 2, 3])
+        item, = render_outputs([fig], {'output_dir': self.directory, 'image_format': 'webp'})
+        self.assertNotIn('data', item)
+        self.assertRegex(item['file'], r'^[0-9a-f]{64}\.webp$')
+        self.assertEqual(os.listdir(self.directory), [item['file']])
+        # The same image is written once.
+        self.assertEqual(render_outputs([fig], {'output_dir': self.directory, 'image_format': 'webp'}), [item])
+
+    def test_dense_svg_artists_are_rasterized(self):
+        fig, ax = plt.subplots()
+        ax.scatter(range(200), range(200))
+        ax.plot([0, 1])
+        svg = base64.b64decode(render_outputs([fig], {'image_format': 'svg', 'rasterize_points': 100})[0]['data'])
+        self.assertIn(b'<image', svg)
+        self.assertTrue(ax.collections[0].get_rasterized())
+        self.assertFalse(ax.lines[0].get_rasterized())
+
+    def test_plotly_formats(self):
+        fig = go.Figure(go.Scatter(x=[1, 2], y=[3, 4]))
+        item, = render_outputs([fig])
+        self.assertEqual(item['format'], 'json')
+        self.assertEqual(item['data'], fig.to_json())
+        item, = render_outputs([fig], {'plotly_format': 'html'})
+        self.assertEqual(item['format'], 'html')
+        self.assertIn('<div', item['data'])
+        self.assertNotIn('plotly.js v', item['data'])
+
+    def test_tables(self):
+        frame = pd.DataFrame({'a': range(5)})
+        item, = render_outputs([frame])
+        pd.testing.assert_frame_equal(pd.read_json(io.StringIO(item['data']), orient='split'), frame)
+        item, = render_outputs([frame], {'output_dir': self.directory, 'table_page_rows': 2})
+        self.assertEqual(item['rows'], 5)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, item['file'])))
+
+    def test_worker_pool_keeps_the_order(self):
+        objects = []
+        for n in range(4):
+            fig, ax = plt.subplots()
+            ax.plot(range(n + 2))
+            objects += [fig, f'after {n}']
+        serial = render_outputs(objects, {'workers': 1})
+        self.assertEqual(render_outputs(objects, {'workers': 3}), serial)
+        self.assertEqual([item['type'] for item in serial], ['plot', 'text'] * 4)
+
+    def test_prune_output_dir(self):
+        now = time.time()
+        for age, name in enumerate(['new', 'middle', 'old']):
+            path = os.path.join(self.directory, name)
+            with open(path, 'wb') as f:
+                f.write(b'x' * 100)
+            os.utime(path, (now - age * 10, now - age * 10))
+        prune_output_dir(self.directory, 250)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['middle', 'new'])
+        prune_output_dir(os.path.join(self.directory, 'missing'), 0)
+
+
+class RenderedOutputViewTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.addCleanup(plt.close, 'all')
+        override = override_settings(RENDER_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_rendered_output(self):
+        fig, ax = plt.subplots()
+        item, = render_outputs([fig], {'output_dir': self.directory})
+        response = self.client.get(f'/rendered/{item["file"]}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+        response.close()
+        self.assertEqual(self.client.get('/rendered/' + '0' * 64 + '.png').status_code, 404)
+        self.assertEqual(self.client.get('/rendered/settings.py').status_code, 404)
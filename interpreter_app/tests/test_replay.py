@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from interpreter_app.replay import Pipeline, writes_df
+from interpreter_app.streaming import aiter_events
+
+# Steps for the pipeline tests: frames are numbers, and each code maps to
+# the frame it produces from the current one (None: df is left unchanged).
+STEPS = {
+    'df = df + 1': lambda frame: frame + 1,
+    'df.describe()': lambda frame: None,
+    # Taken for read-only, but changes df.
+    'exec("df = df * 10")': lambda frame: frame * 10,
+}
+
+
+def _run_step(frame, code):
+    new_frame = STEPS[code](frame)
+    return {'status': 'success', 'seen': frame}, new_frame
+
+
+async def _lines(text):
+    for line in text.split('\n'):
+        yield line
+
+
+class ReplayTests(SimpleTestCase):
+    def test_writes_df(self):
+        for code in ("df['c'] = 1", 'df = df.head()', "df.loc[0, 'a'] = 1", 'df.drop(columns=["a"], inplace=True)',
+                     'view = df.loc\nview[0, "a"] = 1', "df.insert(0, 'c', 1)", 'df['):
+            self.assertTrue(writes_df(code), code)
+        for code in ('df.describe()', "top = df.nlargest(5, 'a')\ntop['b'] = 0", "df.drop(columns=['a'])"):
+            self.assertFalse(writes_df(code), code)
+
+
+class PipelineTests(SimpleTestCase):
+    def run_pipeline(self, codes, concurrency=2):
+        discarded = []
+
+        async def run():
+            pipeline = Pipeline(codes, 1, _run_step, concurrency, discarded.append)
+            results = [(index, result['seen']) async for index, result in pipeline.results()]
+            pipeline.close()
+            return results, pipeline.frame
+
+        results, frame = asyncio.run(run())
+        return results, frame, discarded
+
+    def test_steps_see_the_frame_of_the_last_writer(self):
+        codes = ['df.describe()', 'df = df + 1', 'df.describe()', 'df.describe()', 'df = df + 1', 'df.describe()']
+        results, frame, discarded = self.run_pipeline(codes)
+        self.assertEqual(results, [(0, 1), (1, 1), (2, 2), (3, 2), (4, 2), (5, 3)])
+        self.assertEqual(frame, 3)
+        self.assertEqual(discarded, [2])
+
+    def test_unexpected_writer_reruns_the_steps_after_it(self):
+        codes = ['exec("df = df * 10")', 'df = df + 1', 'df.describe()']
+        results, frame, discarded = self.run_pipeline(codes)
+        self.assertEqual(results, [(0, 1), (1, 10), (2, 11)])
+        self.assertEqual(frame, 11)
+        # Including the frame of the step that ran on the stale frame.
+        self.assertEqual(sorted(discarded), [2, 10])
+
+
+@override_settings(EXECUTE_SANDBOX_WORKERS=0)
+class ReplayViewTests(TestCase):
+    async def upload(self):
+        await self.async_client.post('/upload_data/', {'file': SimpleUploadedFile('d.csv', b'a\n1\n2\n')})
+
+    async def replay(self, data):
+        response = await self.async_client.post('/replay/', json.dumps(data), content_type='application/json')
+        if response['Content-Type'] != 'text/event-stream':
+            return response.status_code, response.json()
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        return response.status_code, [event async for event in aiter_events(_lines(body.decode()))]
+
+    async def test_codes_run_in_order_and_make_one_version(self):
+        await self.upload()
+        before = (await self.async_client.get('/versions/')).json()['versions']
+        status, events = await self.replay({'codes': ["df['b'] = df['a'] * 2", "df['b'].sum()", 'df = df.head(1)']})
+        self.assertEqual(status, 200)
+        self.assertEqual([name for name, _ in events], ['step', 'step', 'step', 'done'])
+        self.assertEqual(events[1][1]['result']['data'], [{'type': 'text', 'data': '6'}])
+        self.assertEqual(events[-1][1]['metadata']['columns'], ['a', 'b'])
+        after = (await self.async_client.get('/versions/')).json()['versions']
+        self.assertEqual(len(after), len(before) + 1)
+
+    async def test_history_entries(self):
+        await self.upload()
+        ids = []
+        for command, code in (('add b', "df['b'] = 1"), ('count', 'df.columns.size')):
+            response = await self.async_client.post('/add_history/', json.dumps({'command': command, 'code': code}),
+                                                    content_type='application/json')
+            ids.append(response.json()['id'])
+        status, events = await self.replay({'entries': ids[::-1]})
+        self.assertEqual([(name, data.get('command')) for name, data in events],
+                         [('step', 'count'), ('step', 'add b'), ('done', None)])
+        self.assertEqual(events[0][1]['result']['data'], [{'type': 'text', 'data': '1'}])
+        # Without a body, the whole history runs, oldest first.
+        status, events = await self.replay({})
+        self.assertEqual([data.get('command') for _, data in events], ['add b', 'count', None])
+        self.assertEqual(events[1][1]['result']['data'], [{'type': 'text', 'data': '2'}])
+
+    async def test_bad_requests(self):
+        self.assertEqual((await self.replay({'codes': ['df.head()']}))[0], 400)
+        await self.upload()
+        self.assertEqual((await self.replay({'codes': 'df.head()'}))[0], 400)
+        self.assertEqual((await self.replay({'entries': ['1']}))[0], 400)
+        self.assertEqual((await self.replay({'entries': [10 ** 6]}))[0], 404)
+        self.assertEqual((await self.replay({'codes': []}))[0], 400)
+        with override_settings(REPLAY_MAX_STEPS=1):
+            self.assertEqual((await self.replay({'codes': ['1', '2']}))[0], 400)
@@ -0,0 +1,91 @@
+import functools
+import json
+from unittest import mock
+
+import httpx
+from django.test import SimpleTestCase, TestCase
+
+from interpreter_app.reply_cache import ReplyCache, normalize_command
+
+METADATA = {'columns': ['a', 'b'], 'dtypes': {'a': 'int64', 'b': 'object'}}
+HISTORY = [{'role': 'user', 'content': 'hello'}, {'role': 'assistant', 'content': 'hi'}]
+REPLY = {'code': "df['a'].sum()", 'message': 'The total.', 'audio': 'UklGRg=='}
+DELTA = [{'role': 'user', 'content': 'total of a'}, {'role': 'assistant', 'content': 'The total.'}]
+
+
+class ReplyCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = ReplyCache(1024 ** 2)
+        self.cache.store('Total of a.', METADATA, HISTORY, REPLY, HISTORY + DELTA)
+
+    def test_normalize_command(self):
+        self.assertEqual(normalize_command('  Total   OF a?! '), 'total of a')
+
+    def test_lookup(self):
+        reply = self.cache.lookup('total of A', METADATA, HISTORY)
+        self.assertEqual(reply, {**REPLY, 'history_delta': DELTA})
+        self.assertEqual(self.cache.stats()['top_entries'][0]['hits'], 1)
+
+    def test_key_includes_schema_and_history(self):
+        self.assertIsNone(self.cache.lookup('total of a', {**METADATA, 'columns': ['a']}, HISTORY))
+        self.assertIsNone(self.cache.lookup('total of a', METADATA, HISTORY + DELTA))
+        # Only the schema counts, not the values.
+        self.assertIsNotNone(self.cache.lookup('total of a', {**METADATA, 'sample_rows': [[1, 'x']]}, HISTORY))
+        # And only the last history_messages messages.
+        self.assertIsNotNone(self.cache.lookup('total of a', METADATA, [{'role': 'user', 'content': 'x'}] + HISTORY))
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def test_replies_that_rewrite_history_are_not_stored(self):
+        cache = ReplyCache(1024 ** 2)
+        cache.store('total of a', METADATA, HISTORY, REPLY, DELTA)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_memory_budget(self):
+        cache = ReplyCache(0)
+        cache.store('total of a', METADATA, HISTORY, REPLY, HISTORY + DELTA)
+        self.assertIsNone(cache.lookup('total of a', METADATA, HISTORY))
+        nbytes = self.cache.stats()['bytes']
+        cache = ReplyCache(nbytes * 2)
+        for command in ('one', 'two', 'three'):
+            cache.store(command, METADATA, HISTORY, REPLY, HISTORY + DELTA)
+        self.assertIsNone(cache.lookup('one', METADATA, HISTORY))
+        self.assertIsNotNone(cache.lookup('three', METADATA, HISTORY))
+        self.assertLessEqual(cache.stats()['bytes'], nbytes * 2)
+
+    def test_fuzzy_lookup(self):
+        cache = ReplyCache(1024 ** 2, fuzzy_threshold=0.7)
+        cache.store('show the top 5 rows', METADATA, HISTORY, REPLY, HISTORY + DELTA)
+        self.assertIsNotNone(cache.lookup('show me the top 5 rows', METADATA, HISTORY))
+        # Different numbers never match.
+        self.assertIsNone(cache.lookup('show the top 6 rows', METADATA, HISTORY))
+        self.assertEqual(cache.stats()['fuzzy_hits'], 1)
+
+
+class GenerateCodeCacheTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('interpreter_app.views.reply_cache', ReplyCache(1024 ** 2))
+        self.cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_repeated_command_skips_the_backend(self):
+        calls = []
+
+        def handler(request):
+            calls.append(json.loads(request.content))
+            history = calls[-1]['conversation_history']
+            return httpx.Response(200, json={**REPLY, 'updated_history': history + DELTA})
+
+        transport = httpx.MockTransport(handler)
+        with mock.patch('interpreter_app.backend.httpx.AsyncClient',
+                        functools.partial(httpx.AsyncClient, transport=transport)):
+            replies = []
+            for _ in range(2):
+                # A page load starts a new conversation.
+                await self.async_client.get('/')
+                response = await self.async_client.post('/generate_code/', json.dumps({'command': 'Total of a'}),
+                                                        content_type='application/json')
+                replies.append(response.json())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(replies[0], replies[1])
+        self.assertEqual(replies[0]['code'], REPLY['code'])
+        self.assertEqual(self.cache.stats()['hits'], 1)
@@ -0,0 +1,96 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from interpreter_app import executor
+from interpreter_app.result_cache import ResultCache
+
+
+class ResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_key(self):
+        key = ResultCache.key(1, 'df.head()', {'b': 1, 'a': 2})
+        self.assertEqual(key, ResultCache.key(1, 'df.head()', {'a': 2, 'b': 1}))
+        self.assertNotEqual(key, ResultCache.key(2, 'df.head()', {'a': 2, 'b': 1}))
+        self.assertNotEqual(key, ResultCache.key(1, 'df.tail()', {'a': 2, 'b': 1}))
+        self.assertNotEqual(key, ResultCache.key(1, 'df.head()', {'a': 3, 'b': 1}))
+
+    def test_get_and_put(self):
+        cache = ResultCache(1024)
+        self.assertIsNone(cache.get('k'))
+        cache.put('k', {'output_items': [{'type': 'text', 'data': '3'}]})
+        self.assertEqual(cache.get('k'), {'output_items': [{'type': 'text', 'data': '3'}]})
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (1, 1))
+
+    def test_least_recently_used_is_evicted(self):
+        value = {'data': 'x' * 40}
+        size = len(json.dumps(value))
+        cache = ResultCache(size * 2)
+        cache.put('a', value)
+        cache.put('b', value)
+        cache.get('a')
+        cache.put('c', value)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), value)
+        self.assertEqual(cache.stats()['resident_bytes'], size * 2)
+        # Values over the whole budget are not kept.
+        cache.put('big', {'data': 'x' * 1000})
+        self.assertIsNone(cache.get('big'))
+
+    def test_disk_tier(self):
+        value = {'data': 'x' * 40}
+        cache = ResultCache(0, self.directory, disk_budget=1024)
+        cache.put('a', value)
+        self.assertEqual(cache.stats()['entries'], 0)
+        # Another process, or this one after a restart, finds it on disk.
+        other = ResultCache(1024, self.directory, disk_budget=1024)
+        self.assertEqual(other.get('a'), value)
+        self.assertEqual(other.stats()['disk_hits'], 1)
+        self.assertEqual(other.get('a'), value)
+        self.assertEqual(other.stats()['hits'], 1)
+
+    def test_disk_budget(self):
+        value = {'data': 'x' * 40}
+        size = len(json.dumps(value))
+        cache = ResultCache(0, self.directory, disk_budget=size * 2)
+        for key in 'abc':
+            cache.put(key, value)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['b.json', 'c.json'])
+        cache.clear()
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+@override_settings(EXECUTE_SANDBOX_WORKERS=0)
+class ExecuteCodeCacheTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('interpreter_app.views.result_cache', ResultCache(1024 ** 2))
+        self.cache = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.post('/upload_data/', {'file': SimpleUploadedFile('d.csv', b'a,b\n1,x\n2,y\n3,z\n')})
+
+    def execute(self, code):
+        response = self.client.post('/execute_code/', json.dumps({'code': code}), content_type='application/json')
+        self.assertEqual(response.json()['status'], 'success')
+        return response.json()
+
+    def test_repeated_code_is_served_from_the_cache(self):
+        with mock.patch.object(executor, 'run_code', wraps=executor.run_code) as run_code:
+            first = self.execute("df['a'].sum()")
+            second = self.execute("df['a'].sum()")
+            self.assertEqual(run_code.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_new_version_is_not_served_stale_results(self):
+        total = "df['a'].sum()"
+        self.assertEqual(self.execute(total)['result']['data'], [{'type': 'text', 'data': '6'}])
+        self.execute("df['a'] = df['a'] * 10")
+        self.assertEqual(self.execute(total)['result']['data'], [{'type': 'text', 'data': '60'}])
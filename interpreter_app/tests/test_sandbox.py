@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+from django.test import SimpleTestCase
+
+from interpreter_app.sandbox import SandboxPool, read_frame, write_frame
+
+
+class SandboxTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.pool = SandboxPool(1, cpu_time_limit=30, wall_time_limit=60, memory_limit=2 * 1024 ** 3,
+                               exchange_dir=cls.directory)
+        cls.pool.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.frame = pd.DataFrame({'a': [1.0, 6.0, 7.0, 2.0], 'b': [1.0, 2.0, 3.0, 4.0]})
+        self.path = write_frame(self.frame, os.path.join(self.directory, 'frame'))
+
+    def run_code(self, code):
+        result = self.pool.run(self.path, code, {'output_dir': None})
+        self.assertEqual(result['status'], 'success', result.get('message'))
+        self.assertTrue(result['df_path'])
+        try:
+            return read_frame(result['df_path']).copy()
+        finally:
+            os.remove(result['df_path'])
+
+    def test_in_place_writes_to_mapped_frame(self):
+        # The frame is memory-mapped read-only in the worker.
+        self.assertEqual(self.run_code("df.loc[df.a > 5, 'b'] = 0")['b'].tolist(), [1.0, 0.0, 0.0, 4.0])
+        self.assertEqual(self.run_code("df.at[3, 'a'] = 99")['a'].tolist(), [1.0, 6.0, 7.0, 99.0])
+        self.assertEqual(self.run_code('df.iloc[2, 0] = 55')['a'].tolist(), [1.0, 6.0, 55.0, 2.0])
+        # The file the worker read is left as it was.
+        pd.testing.assert_frame_equal(read_frame(self.path), self.frame)
+
+    def test_unchanged_frame_is_not_returned(self):
+        for code in ("df['a'].sum()", 'df.describe()', "top = df.nlargest(2, 'a')\ntop['b'] = 0", 'df = df'):
+            result = self.pool.run(self.path, code, {'output_dir': None})
+            self.assertEqual(result['status'], 'success')
+            self.assertIsNone(result['df_path'], code)
+
+    def test_changes_are_detected(self):
+        self.assertEqual(self.run_code("df = df.rename(columns={'a': 'c'})").columns.tolist(), ['c', 'b'])
+        self.assertEqual(self.run_code('df.index = df.index + 10').index.tolist(), [10, 11, 12, 13])
+        self.assertEqual(self.run_code("df['c'] = 1").columns.tolist(), ['a', 'b', 'c'])
+        self.assertEqual(len(self.run_code('df = df[df.a > 5]')), 2)
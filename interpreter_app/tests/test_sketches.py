@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase, override_settings
+
+from interpreter_app.helpers import MetadataProfiler, update_metadata
+from interpreter_app.sketches import HeavyHitters, HyperLogLog, ReservoirSampler, hash_values
+
+
+class SketchTests(SimpleTestCase):
+    def test_hyperloglog_estimate(self):
+        for distinct in (10, 1000, 200_000):
+            sketch = HyperLogLog()
+            values = np.arange(distinct)
+            # Repeats do not count.
+            sketch.add(hash_values(np.concatenate([values, values[:distinct // 2]])))
+            self.assertAlmostEqual(sketch.count() / distinct, 1, delta=0.05)
+
+    def test_heavy_hitters_keep_frequent_values(self):
+        rng = np.random.default_rng(0)
+        values = np.concatenate([np.repeat(['a', 'b', 'c'], [5000, 3000, 2000]),
+                                 np.array([f'rare{i}' for i in range(5000)])]).astype(object)
+        rng.shuffle(values)
+        hitters = HeavyHitters(capacity=20)
+        for chunk in np.array_split(values, 7):
+            hitters.add(hash_values(chunk), chunk)
+        self.assertLessEqual(len(hitters), 20)
+        self.assertEqual(hitters.top(3), ['a', 'b', 'c'])
+
+    def test_heavy_hitters_with_copy_on_write(self):
+        with pd.option_context('mode.copy_on_write', True):
+            hitters = HeavyHitters(capacity=5)
+            for chunk in (np.array(['a', 'b', 'a'], dtype=object), np.array(['a', 'c'], dtype=object)):
+                hitters.add(hash_values(chunk), chunk)
+        self.assertEqual(hitters.top(1), ['a'])
+
+    def test_reservoir_is_uniform(self):
+        counts = np.zeros(100)
+        for seed in range(2000):
+            sampler = ReservoirSampler(5, seed=seed)
+            for start in range(0, 100, 30):
+                sampler.add(np.arange(start, min(start + 30, 100)))
+            self.assertEqual(len(set(sampler.sample.tolist())), 5)
+            counts[sampler.sample] += 1
+        # Each position is picked 100 times in expectation.
+        self.assertLess(np.abs(counts - 100).max(), 45)
+
+
+class ApproximateMetadataTests(SimpleTestCase):
+    def setUp(self):
+        self.frame = pd.DataFrame({
+            'g': ['a', 'b', 'a', None] * 50,
+            'c': pd.Categorical(['u', 'v', 'w', 'u'] * 50),
+            'n': range(200),
+        })
+
+    def test_approximate_profile(self):
+        metadata = MetadataProfiler().profile(self.frame, approximate=True)
+        self.assertTrue(metadata['approximate'])
+        self.assertEqual(metadata['distinct_counts'], {'g': 2, 'c': 3})
+        self.assertEqual(metadata['categorical_values']['g'], ['a', 'b'])
+        self.assertEqual(metadata['categorical_values']['c'], ['u', 'v', 'w'])
+        self.assertEqual(metadata['numerical_ranges']['n'], {'min': 0, 'max': 199})
+        self.assertEqual(len(metadata['sample_rows']), 3)
+
+    def test_threshold_setting(self):
+        with override_settings(METADATA_APPROXIMATE_ROWS=None):
+            self.assertNotIn('approximate', update_metadata(self.frame))
+        with override_settings(METADATA_APPROXIMATE_ROWS=100):
+            self.assertTrue(update_metadata(self.frame)['approximate'])
+        with override_settings(METADATA_APPROXIMATE_ROWS=1000):
+            self.assertNotIn('approximate', update_metadata(self.frame))
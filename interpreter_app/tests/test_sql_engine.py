@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+
+import duckdb
+import pandas as pd
+from django.test import SimpleTestCase
+
+from interpreter_app.executor import run_code
+from interpreter_app.sql_engine import make_sql
+
+
+class SqlTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.frame = pd.DataFrame({'g': ['a', 'b', 'a'], 'v': [1, 2, 3]})
+
+    def test_queries_df_and_other_frames(self):
+        sql = make_sql(lambda: self.frame)
+        result = sql('SELECT g, SUM(v) AS total FROM df GROUP BY g ORDER BY g')
+        self.assertEqual(result.to_dict('list'), {'g': ['a', 'b'], 'total': [4, 2]})
+        names = pd.DataFrame({'g': ['a'], 'name': ['first']})
+        result = sql('SELECT name, v FROM df JOIN names USING (g) ORDER BY v', names=names)
+        self.assertEqual(result['v'].tolist(), [1, 3])
+
+    def test_sees_changes_made_to_df(self):
+        result = run_code(self.frame, "df = df[df.v > 1]\nsql('SELECT COUNT(*) AS n FROM df')['n'][0]",
+                          {'output_dir': None})
+        self.assertEqual(result['output_items'][0], {'type': 'text', 'data': '2'})
+
+    def test_files_cannot_be_reached(self):
+        path = os.path.join(self.directory, 'data.csv')
+        self.frame.to_csv(path, index=False)
+        sql = make_sql(lambda: self.frame, {'threads': 2, 'temp_directory': os.path.join(self.directory, 'spill')})
+        for query in (f"SELECT * FROM read_csv('{path}')",
+                      f"SELECT * FROM '{path}'",
+                      f"COPY df TO '{os.path.join(self.directory, 'out.csv')}'",
+                      f"ATTACH '{os.path.join(self.directory, 'other.db')}'"):
+            with self.assertRaises(duckdb.Error, msg=query):
+                sql(query)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['data.csv'])
+        for query in ('SET enable_external_access = true', "SET memory_limit = '1TB'"):
+            with self.assertRaises(duckdb.InvalidInputException, msg=query):
+                sql(query)
+        self.assertEqual(len(sql('SELECT * FROM df')), 3)
+
+    def test_errors_reach_the_code(self):
+        result = run_code(self.frame, "sql(\"SELECT * FROM read_csv('/etc/passwd')\")", {'output_dir': None})
+        self.assertEqual(result['status'], 'error')
+        self.assertIn('disabled', result['message'])
@@ -0,0 +1,87 @@
+import os
+import pickle
+import shutil
+import tempfile
+from unittest import mock
+
+import pandas as pd
+from django.test import SimpleTestCase, override_settings
+
+from interpreter_app import sql_engine, startup, views
+from interpreter_app.sandbox import write_frame
+
+
+def _in_forked_child(function):
+    # Runs function in a forked process, as gunicorn runs a worker after
+    # --preload, and returns what it returned (or the exception it raised).
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            outcome = function()
+        except Exception as e:
+            outcome = e
+        with os.fdopen(write_fd, 'wb') as f:
+            pickle.dump(outcome, f)
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd, 'rb') as f:
+        outcome = pickle.load(f)
+    os.waitpid(pid, 0)
+    if isinstance(outcome, Exception):
+        raise outcome
+    return outcome
+
+
+class PreloadTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        for patcher in (mock.patch.object(startup, '_preloaded', False),
+                        mock.patch.dict(startup.startup_report, clear=True),
+                        mock.patch.object(views, '_sandbox_pool', None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        override = override_settings(EXECUTE_SANDBOX_WORKERS=1, EXECUTE_SANDBOX_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def pool(self):
+        pool = views._sandbox_pool
+        self.addCleanup(pool.shutdown)
+        return pool
+
+    def test_phases_and_sandbox_workers(self):
+        report = startup.preload()
+        self.assertTrue({'import:executor', 'warm_up', 'sandbox', 'preload'} <= set(report))
+        self.assertTrue(self.pool()._started)
+        # Once per process.
+        self.assertIs(startup.preload(), report)
+
+    def test_without_sandbox_workers(self):
+        with override_settings(EXECUTE_SANDBOX_WORKERS=0):
+            self.assertNotIn('sandbox', startup.preload())
+        self.assertIsNone(views._sandbox_pool)
+
+    def test_forked_process_starts_its_own_workers_and_database(self):
+        startup.preload()
+        pool = self.pool()
+        path = write_frame(pd.DataFrame({'a': [1, 2, 3]}), os.path.join(self.directory, 'frame'))
+        # The warm-up's sql() query opened the database.
+        self.assertIsNotNone(sql_engine._database)
+
+        def in_worker():
+            reset = sql_engine._database is None
+            sql = sql_engine.make_sql(lambda: pd.DataFrame({'a': [1, 2]}))
+            count = sql('select count(*) as n from df')['n'].tolist()
+            result = pool.run(path, "df['a'].sum()", {'output_dir': None})
+            pool.shutdown()
+            return reset, count, result['status'], result['output_items']
+
+        reset, count, status, output = _in_forked_child(in_worker)
+        self.assertEqual((reset, count, status), (True, [2], 'success'))
+        self.assertEqual(output, [{'type': 'text', 'data': '6'}])
+        # The parent's workers are left to it.
+        self.assertEqual(pool.run(path, "df['a'].max()", {'output_dir': None})['output_items'],
+                         [{'type': 'text', 'data': '3'}])
@@ -0,0 +1,224 @@
+import json
+import os
+import runpy
+import shutil
+import tempfile
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from interpreter_app.sandbox import read_frame, write_frame
+from interpreter_app.store import DataFrameStore, SharedDataFrameStore
+
+
+class StoreTestMixin:
+    """Version history behaviour of a store; make_store(max_versions) builds one."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.frame = pd.DataFrame({'a': [1.0, 2.0, 3.0], 'b': ['x', 'y', 'z']})
+
+    def test_commit_undo_redo_checkout(self):
+        store = self.make_store()
+        root = store.put('k', self.frame, {'columns': ['a', 'b']})
+        changed = self.frame.assign(a=[1.0, 5.0, 3.0])
+        head = store.commit('k', changed, {'columns': ['a', 'b']}, label="df.loc[1, 'a'] = 5")
+        self.assertEqual(store.get_version('k'), head)
+        self.assertEqual(store.get('k')['a'].tolist(), [1.0, 5.0, 3.0])
+        self.assertEqual(store.get('k', root)['a'].tolist(), [1.0, 2.0, 3.0])
+
+        self.assertEqual(store.undo('k'), root)
+        self.assertEqual(store.get('k')['a'].tolist(), [1.0, 2.0, 3.0])
+        self.assertIsNone(store.undo('k'))
+        self.assertEqual(store.redo('k'), head)
+        self.assertIsNone(store.redo('k'))
+        self.assertTrue(store.checkout('k', root))
+        self.assertFalse(store.checkout('k', 'unknown'))
+
+        versions = store.versions('k')
+        self.assertEqual([v['version'] for v in versions], [root, head])
+        self.assertEqual(versions[1]['parent'], root)
+        self.assertEqual(versions[1]['label'], "df.loc[1, 'a'] = 5")
+        self.assertEqual([v['head'] for v in versions], [True, False])
+
+    def test_diff(self):
+        store = self.make_store()
+        old = store.put('k', self.frame)
+        new = store.commit('k', self.frame.assign(a=[1, 2, 3], c=1.0))
+        diff = store.diff('k', old, new)
+        self.assertEqual(diff['added'], ['c'])
+        self.assertEqual(diff['changed'], ['a'])
+        self.assertEqual(diff['dtype_changes'], {'a': ['float64', 'int64']})
+        self.assertIsNone(store.diff('k', old, 'unknown'))
+
+    def test_squash_keeps_max_versions(self):
+        store = self.make_store(max_versions=3)
+        versions = [store.put('k', self.frame)]
+        for i in range(4):
+            versions.append(store.commit('k', self.frame.assign(a=float(i)), label=str(i)))
+        kept = store.versions('k')
+        self.assertEqual([v['version'] for v in kept], versions[-3:])
+        # The oldest kept version is re-parented onto what is left.
+        self.assertIsNone(kept[0]['parent'])
+        self.assertEqual(kept[2]['parent'], versions[-2])
+        self.assertEqual(store.stats()['squashed'], 2)
+
+    def test_metadata_and_discard(self):
+        store = self.make_store()
+        store.put('k', self.frame, {'columns': ['a', 'b']})
+        store.set_metadata('k', {'columns': ['a']})
+        self.assertEqual(store.get_metadata('k'), {'columns': ['a']})
+        self.assertIn('k', store)
+        store.discard('k')
+        self.assertNotIn('k', store)
+        self.assertIsNone(store.get('k'))
+        self.assertEqual(store.get_metadata('k'), {})
+
+
+class DataFrameStoreTests(StoreTestMixin, SimpleTestCase):
+    def make_store(self, max_versions=20, memory_budget=1024 ** 3):
+        return DataFrameStore(memory_budget, self.directory, max_versions)
+
+    def test_unchanged_columns_are_shared(self):
+        store = self.make_store()
+        store.put('k', self.frame)
+        store.commit('k', self.frame.assign(c=1))
+        self.assertTrue(np.shares_memory(store.get('k')['a'].to_numpy(), self.frame['a'].to_numpy()))
+
+    def test_put_get_discard(self):
+        store = self.make_store()
+        store.put('k', self.frame, {'columns': ['a', 'b']})
+        self.assertIs(store.get('k'), self.frame)
+        self.assertEqual(store.get_metadata('k'), {'columns': ['a', 'b']})
+        self.assertIsNone(store.get('other'))
+        self.assertEqual(store.get_metadata('other'), {})
+        store.discard('k')
+        self.assertNotIn('k', store)
+        self.assertIsNone(store.get('k'))
+
+    def test_least_recently_used_is_spilled_and_reloaded(self):
+        store = self.make_store(memory_budget=1)
+        store.put('old', self.frame)
+        store.put('new', self.frame)
+        stats = store.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['spilled_entries'], 1)
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        pd.testing.assert_frame_equal(store.get('old'), self.frame)
+        self.assertEqual(store.stats()['misses'], 1)
+        # The file is removed once the frame is back in memory.
+        self.assertEqual([name for name in os.listdir(self.directory) if 'old' in name], [])
+
+    def test_spilled_frame_is_read_by_column(self):
+        store = self.make_store(memory_budget=1)
+        store.put('old', self.frame)
+        store.put('new', self.frame)
+        self.assertEqual(store.get('old', columns={'b', 'missing'}).columns.tolist(), ['b'])
+        # A projected read is for one use: the frame stays on disk.
+        self.assertEqual(store.stats()['spilled_entries'], 1)
+        self.assertEqual(store.get('old').columns.tolist(), ['a', 'b'])
+
+    def test_most_recent_frame_stays_over_budget(self):
+        store = self.make_store(memory_budget=1)
+        store.put('only', self.frame)
+        self.assertEqual(store.stats()['resident_entries'], 1)
+        self.assertEqual(store.stats()['hits'], 0)
+        store.get('only')
+        self.assertEqual(store.stats()['hits'], 1)
+
+    def test_frames_parquet_cannot_hold_are_pickled(self):
+        store = self.make_store(memory_budget=1)
+        mixed = pd.DataFrame({0: [1, 2], 'b': [{'x': 1}, 'text']})
+        store.put('mixed', mixed)
+        store.put('new', self.frame)
+        self.assertTrue(any(name.endswith('.pkl') for name in os.listdir(self.directory)))
+        pd.testing.assert_frame_equal(store.get('mixed'), mixed)
+
+
+class SharedDataFrameStoreTests(StoreTestMixin, SimpleTestCase):
+    def make_store(self, max_versions=20, memory_budget=1024 ** 3):
+        return SharedDataFrameStore(self.directory, memory_budget, max_versions)
+
+    def test_processes_see_each_others_changes(self):
+        # Two stores on one directory stand for two server processes.
+        first, second = self.make_store(), self.make_store()
+        root = first.put('k', self.frame, {'columns': ['a', 'b']})
+        pd.testing.assert_frame_equal(second.get('k'), self.frame)
+        head = second.commit('k', self.frame.assign(a=0.0), {'columns': ['a', 'b']})
+        self.assertEqual(first.get_version('k'), head)
+        self.assertEqual(first.get('k')['a'].tolist(), [0.0, 0.0, 0.0])
+        self.assertEqual(first.undo('k'), root)
+        self.assertEqual(second.get_version('k'), root)
+
+    def test_numeric_columns_are_mapped(self):
+        store = self.make_store()
+        store.put('k', self.frame)
+        df = store.get('k')
+        self.assertFalse(df['a'].to_numpy().flags.writeable)
+        # Only the string column and the index are in private memory.
+        self.assertLess(store.stats()['private_bytes'], df.memory_usage(deep=True).sum())
+        copy = df.copy(deep=False)
+        copy.loc[0, 'a'] = 10.0
+        self.assertEqual(store.get('k')['a'].tolist(), [1.0, 2.0, 3.0])
+
+    def test_worker_file_is_taken_over(self):
+        store = self.make_store()
+        store.put('k', self.frame)
+        path = write_frame(self.frame.assign(a=0.0), os.path.join(self.directory, 'worker'))
+        store.commit('k', read_frame(path), path=path)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(store.get('k')['a'].tolist(), [0.0, 0.0, 0.0])
+
+
+class WorkerSettingsTests(SimpleTestCase):
+    def load_settings(self, web_concurrency=None):
+        from voice_interpreter import settings as settings_module
+
+        with mock.patch.dict(os.environ):
+            os.environ.pop('WEB_CONCURRENCY', None)
+            if web_concurrency is not None:
+                os.environ['WEB_CONCURRENCY'] = web_concurrency
+            return runpy.run_path(settings_module.__file__)
+
+    def test_several_workers_share_datasets_and_cache(self):
+        values = self.load_settings('4')
+        self.assertEqual(values['SERVER_WORKERS'], 4)
+        self.assertEqual(values['DATAFRAME_STORE_SHARED_DIR'], os.path.join(values['MEDIA_ROOT'], 'datasets'))
+        self.assertEqual(values['CACHES']['default']['BACKEND'],
+                         'django.core.cache.backends.filebased.FileBasedCache')
+
+    def test_one_worker_keeps_datasets_in_memory(self):
+        values = self.load_settings()
+        self.assertIsNone(values['DATAFRAME_STORE_SHARED_DIR'])
+        self.assertNotIn('CACHES', values)
+
+
+@override_settings(EXECUTE_SANDBOX_WORKERS=0)
+class VersionViewTests(TestCase):
+    def setUp(self):
+        self.client.post('/upload_data/', {'file': SimpleUploadedFile('d.csv', b'a,b\n1,x\n2,y\n')})
+
+    def post(self, url, data=None):
+        return self.client.post(url, json.dumps(data or {}), content_type='application/json')
+
+    def test_undo_redo_checkout_and_diff(self):
+        root = self.client.get('/versions/').json()['head']
+        self.post('/execute_code/', {'code': "df['c'] = df['a'] * 2"})
+        versions = self.client.get('/versions/').json()
+        head = versions['head']
+        self.assertEqual([v['version'] for v in versions['versions']], [root, head])
+        self.assertEqual(self.client.get('/versions/diff/').json()['diff']['added'], ['c'])
+
+        response = self.post('/versions/undo/')
+        self.assertEqual(response.json()['version'], root)
+        self.assertEqual(response.json()['metadata']['columns'], ['a', 'b'])
+        self.assertEqual(self.post('/versions/undo/').status_code, 400)
+        self.assertEqual(self.post('/versions/redo/').json()['version'], head)
+        self.assertEqual(self.post('/versions/redo/').status_code, 400)
+        self.assertEqual(self.post('/versions/checkout/', {'version': root}).json()['version'], root)
+        self.assertEqual(self.post('/versions/checkout/', {'version': 'unknown'}).status_code, 404)
+        self.assertEqual(self.client.get('/versions/diff/', {'from': 'unknown'}).status_code, 404)
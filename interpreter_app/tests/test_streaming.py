@@ -0,0 +1,105 @@
+import asyncio
+import functools
+import json
+from unittest import mock
+
+import httpx
+from django.test import SimpleTestCase, TestCase
+
+from interpreter_app.reply_cache import ReplyCache
+from interpreter_app.streaming import AUDIO_CHUNK_CHARS, aiter_events, format_event, reply_events
+
+
+async def _alist(iterator):
+    return [item async for item in iterator]
+
+
+async def _lines(text):
+    for line in text.split('\n'):
+        yield line
+
+
+def _parse(body):
+    return asyncio.run(_alist(aiter_events(_lines(body.decode()))))
+
+
+class StreamingEventsTests(SimpleTestCase):
+    def test_events_round_trip(self):
+        body = format_event('code', {'delta': 'df.head()\n'}) + format_event('done', {'updated_history': []})
+        self.assertEqual(_parse(body), [('code', {'delta': 'df.head()\n'}), ('done', {'updated_history': []})])
+
+    def test_comments_multiline_data_and_unterminated_event(self):
+        body = b': keep-alive\n\nevent: answer\ndata: {"delta":\ndata: "hi"}\n\ndata:{"x": 1}'
+        self.assertEqual(_parse(body), [('answer', {'delta': 'hi'}), ('message', {'x': 1})])
+
+    def test_reply_events(self):
+        audio = 'A' * (AUDIO_CHUNK_CHARS * 2 + 4)
+        events = list(reply_events({'code': 'x = 1', 'message': 'Done.', 'audio': audio,
+                                    'updated_history': [{'role': 'user'}]}))
+        self.assertEqual([event for event, _ in events],
+                         ['code', 'code_end', 'answer', 'audio', 'audio', 'audio', 'done'])
+        self.assertEqual(''.join(data['data'] for event, data in events if event == 'audio'), audio)
+        self.assertEqual(events[-1][1], {'updated_history': [{'role': 'user'}]})
+        # Without code, code_end still comes first.
+        self.assertEqual([event for event, _ in reply_events({'message': 'Hi.'})], ['code_end', 'answer', 'done'])
+
+
+class GenerateCodeStreamTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('interpreter_app.views.reply_cache', ReplyCache(1024 ** 2))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def stream(self, handler, command='show the data'):
+        transport = httpx.MockTransport(handler)
+        with mock.patch('interpreter_app.backend.httpx.AsyncClient',
+                        functools.partial(httpx.AsyncClient, transport=transport)):
+            response = await self.async_client.post('/generate_code_stream/', json.dumps({'command': command}),
+                                                    content_type='application/json')
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            body = b''.join([chunk async for chunk in response.streaming_content])
+        return await _alist(aiter_events(_lines(body.decode())))
+
+    async def test_streamed_reply_is_relayed(self):
+        payloads = []
+
+        def handler(request):
+            payloads.append(json.loads(request.content))
+            body = (format_event('code', {'delta': 'df'}) + format_event('code', {'delta': '.head()'})
+                    + format_event('answer', {'delta': 'Here.'})
+                    + format_event('done', {'updated_history': [{'role': 'user', 'content': 'show'}]}))
+            return httpx.Response(200, content=body, headers={'Content-Type': 'text/event-stream'})
+
+        events = await self.stream(handler)
+        self.assertTrue(payloads[0]['stream'])
+        self.assertEqual(payloads[0]['user_input'], 'show the data')
+        # code_end is added before the first event that is not code, and the
+        # history is not sent on to the browser.
+        self.assertEqual(events, [('code', {'delta': 'df'}), ('code', {'delta': '.head()'}), ('code_end', {}),
+                                  ('answer', {'delta': 'Here.'}), ('done', {})])
+
+    async def test_json_reply_is_relayed_as_a_stream(self):
+        def handler(request):
+            return httpx.Response(200, json={'code': 'x = 1', 'message': 'Set.', 'updated_history': []})
+
+        self.assertEqual(await self.stream(handler), [('code', {'delta': 'x = 1'}), ('code_end', {}),
+                                                      ('answer', {'delta': 'Set.'}), ('done', {})])
+
+    async def test_backend_error_is_an_error_event(self):
+        def handler(request):
+            return httpx.Response(400, text='bad request')
+
+        self.assertEqual(await self.stream(handler), [('error', {'message': 'bad request'})])
+
+    async def test_cached_reply_is_replayed_without_the_backend(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, json={'code': 'x = 1', 'message': 'Set.', 'updated_history': []})
+
+        first = await self.stream(handler, 'set x')
+        await self.async_client.get('/')
+        second = await self.stream(handler, 'set x')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(first, second)
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+from django.test import SimpleTestCase, override_settings
+
+from interpreter_app.tables import MAX_PAGE_ROWS, TablePager, page_payload, to_arrow, write_table
+
+
+class TableTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.frame = pd.DataFrame({'n': [3, 1, 2, 5, 4], 'g': list('abcde')})
+
+    def test_to_arrow(self):
+        frame = pd.DataFrame([[1, 2, 1], [3, 4, 'x']], columns=['a', 'a', ('b', 'c')],
+                             index=pd.Index(['r', 's'], name='row'))
+        table = to_arrow(frame)
+        self.assertEqual(table.column_names, ['row', 'a', 'a.1', 'b / c'])
+        # Objects Arrow cannot type are shown as strings.
+        self.assertEqual(table.column('b / c').to_pylist(), ['1', 'x'])
+        self.assertEqual(to_arrow(self.frame).column_names, ['n', 'g'])
+
+    def test_page_payload(self):
+        table = to_arrow(self.frame)
+        self.assertEqual(page_payload(table.slice(1, 2), 1, 5),
+                         {'rows': 5, 'offset': 1, 'columns': ['n', 'g'], 'data': [[1, 2], ['b', 'c']]})
+
+    def test_pages(self):
+        name, table = write_table(self.frame, self.directory)
+        path = os.path.join(self.directory, name)
+        pager = TablePager()
+        page, total = pager.page(path, offset=1, limit=2)
+        self.assertEqual(total, 5)
+        self.assertEqual(page.column('n').to_pylist(), [1, 2])
+        page, _ = pager.page(path, offset=0, limit=3, sort='n', descending=True, columns=['g'])
+        self.assertEqual(page.column_names, ['g'])
+        self.assertEqual(page.column('g').to_pylist(), ['d', 'e', 'a'])
+        page, _ = pager.page(path, offset=3, limit=MAX_PAGE_ROWS + 1, sort='n')
+        self.assertEqual(page.column('n').to_pylist(), [4, 5])
+        # The sort order is computed once per table and column.
+        self.assertEqual(len(pager._sort_orders), 2)
+        with self.assertRaises(KeyError):
+            pager.page(path, columns=['missing'])
+
+
+class TablePageViewTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        override = override_settings(RENDER_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.name, _ = write_table(pd.DataFrame({'n': range(10), 'g': ['x'] * 10}), self.directory)
+
+    def test_json_page(self):
+        response = self.client.get(f'/table_page/{self.name}', {'offset': 8, 'limit': 5, 'sort': 'n',
+                                                                'descending': '1', 'columns': 'n'})
+        self.assertEqual(response.json(), {'status': 'success', 'rows': 10, 'offset': 8, 'columns': ['n'],
+                                           'data': [[1, 0]]})
+
+    def test_arrow_page(self):
+        response = self.client.get(f'/table_page/{self.name}', {'limit': 3, 'format': 'arrow'})
+        self.assertEqual(response['X-Total-Rows'], '10')
+        table = pa.ipc.open_stream(response.content).read_all()
+        self.assertEqual(table.column('n').to_pylist(), [0, 1, 2])
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get(f'/table_page/{self.name}', {'offset': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(f'/table_page/{self.name}', {'sort': 'missing'}).status_code, 400)
+        self.assertEqual(self.client.get('/table_page/' + '0' * 32 + '.arrow').status_code, 404)
+        self.assertEqual(self.client.get('/table_page/..%2Fdb.sqlite3').status_code, 404)
@@ -0,0 +1,84 @@
+import os
+import re
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from interpreter_app.timing import RequestMetrics, request_metrics, sampled_profile, server_timing, stage
+
+
+def _server_timing(response):
+    return dict(re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing']))
+
+
+class RequestMetricsTests(SimpleTestCase):
+    def test_render(self):
+        metrics = RequestMetrics(window=2)
+        for seconds in (0.001, 0.2, 0.3):
+            metrics.observe('stage', 'exec', seconds)
+        metrics.count_response('execute_code', 200)
+        text = metrics.render({'interpreter_store_hits': 3})
+        self.assertIn('interpreter_stage_seconds_bucket{stage="exec",le="0.005"} 1', text)
+        self.assertIn('interpreter_stage_seconds_bucket{stage="exec",le="+Inf"} 3', text)
+        self.assertIn('interpreter_stage_seconds_count{stage="exec"} 3', text)
+        # Quantiles are over the last window samples only.
+        self.assertIn('interpreter_stage_seconds_recent_count{stage="exec"} 2', text)
+        self.assertIn('interpreter_stage_seconds_recent{stage="exec",quantile="0.5"} 0.3', text)
+        self.assertIn('interpreter_responses_total{endpoint="execute_code",status="200"} 1', text)
+        self.assertIn('# TYPE interpreter_store_hits gauge\ninterpreter_store_hits 3', text)
+
+    def test_server_timing(self):
+        self.assertEqual(server_timing({'parse': 0.0123}, 0.05), 'parse;dur=12.3, total;dur=50.0')
+
+    def test_stages_outside_requests_reach_the_histograms(self):
+        with stage('test_only_stage'):
+            pass
+        self.assertIn('stage="test_only_stage"', request_metrics.render())
+
+
+class TimingMiddlewareTests(TestCase):
+    def upload(self):
+        return self.client.post('/upload_data/', {'file': SimpleUploadedFile('d.csv', b'a\n1\n2\n')})
+
+    def test_server_timing_header(self):
+        stages = _server_timing(self.upload())
+        self.assertTrue({'parse', 'metadata', 'store', 'serialize', 'total'} <= set(stages))
+        self.assertGreaterEqual(float(stages['total']), float(stages['parse']))
+        with override_settings(SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', self.upload())
+
+    def test_metrics_endpoint(self):
+        self.upload()
+        response = self.client.get('/metrics/')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        self.assertIn('interpreter_endpoint_seconds_count{endpoint="upload_data"}', text)
+        self.assertIn('interpreter_stage_seconds_count{stage="parse"}', text)
+        self.assertRegex(text, r'interpreter_responses_total\{endpoint="upload_data",status="200"\} \d+')
+        self.assertIn('# TYPE interpreter_store_hits gauge', text)
+        self.assertEqual(self.client.post('/metrics/').status_code, 400)
+
+
+class SampledProfileTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_slow_runs_are_saved(self):
+        with override_settings(PROFILE_SAMPLE_RATE=1.0, PROFILE_SLOW_MS=0, PROFILE_DIR=self.directory,
+                               PROFILE_MAX_FILES=2):
+            for _ in range(3):
+                with sampled_profile('execute_code'):
+                    sum(range(1000))
+        names = os.listdir(self.directory)
+        self.assertEqual(len(names), 2)
+        self.assertTrue(all(name.startswith('execute_code-') and name.endswith('.prof') for name in names))
+
+    def test_fast_and_unsampled_runs_are_not_saved(self):
+        for rate, slow in ((1.0, 60_000), (0.0, 0)):
+            with override_settings(PROFILE_SAMPLE_RATE=rate, PROFILE_SLOW_MS=slow, PROFILE_DIR=self.directory):
+                with sampled_profile('execute_code'):
+                    pass
+        self.assertEqual(os.listdir(self.directory), [])
@@ -0,0 +1,115 @@
+import asyncio
+import functools
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import wave
+from unittest import mock
+
+import httpx
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from interpreter_app.backend import BackendClient
+from interpreter_app import views
+from interpreter_app.views import _transcription_request
+
+
+def _tone_wav(seconds=1.0, rate=16000):
+    samples = (np.sin(np.arange(int(seconds * rate)) * 2 * np.pi * 440 / rate) * 10000).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+class TranscriptionRetryTests(SimpleTestCase):
+    def test_retry_sends_the_recording_again(self):
+        recording = _tone_wav()
+        sizes = []
+
+        async def handler(request):
+            sizes.append(len(await request.aread()))
+            return httpx.Response(503 if len(sizes) == 1 else 200, json={'text': 'hello'})
+
+        async def transcribe():
+            client = BackendClient('http://backend', retries=2, backoff=0)
+            request = await _transcription_request(lambda: iter([recording]), 'speech.wav', 'audio/wav')
+            try:
+                return await client.post('transcribe', **request)
+            finally:
+                await client.aclose()
+
+        transport = httpx.MockTransport(handler)
+        with mock.patch('interpreter_app.backend.httpx.AsyncClient',
+                        functools.partial(httpx.AsyncClient, transport=transport)):
+            response = asyncio.run(transcribe())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(sizes), 2)
+        self.assertGreater(sizes[0], 16000)
+        self.assertEqual(sizes[0], sizes[1])
+
+
+class TranscribeChunkTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        override = override_settings(TRANSCRIBE_UPLOAD_DIR=self.directory, TRANSCRIBE_MAX_UPLOAD_BYTES=20000)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.upload = 'a' * 32
+
+    async def send(self, data):
+        return await self.async_client.post(f'/transcribe/chunk/?upload={self.upload}', data,
+                                            content_type='application/octet-stream')
+
+    async def test_chunks_are_appended_off_the_event_loop(self):
+        stale = os.path.join(self.directory, 'old.part')
+        open(stale, 'wb').close()
+        os.utime(stale, (time.time() - 3600, time.time() - 3600))
+        threads = []
+        append_chunk = views._append_audio_chunk
+
+        def append(*args):
+            threads.append(threading.current_thread())
+            return append_chunk(*args)
+
+        recording = _tone_wav(0.5)
+        with mock.patch.object(views, '_append_audio_chunk', side_effect=append):
+            for start in range(0, len(recording), 4000):
+                response = await self.send(recording[start:start + 4000])
+        self.assertEqual(response.json(), {'status': 'success', 'bytes': len(recording)})
+        self.assertNotIn(threading.current_thread(), threads)
+        # Recordings never transcribed are removed when a new one starts.
+        self.assertFalse(os.path.exists(stale))
+        path, = [os.path.join(self.directory, name) for name in os.listdir(self.directory)]
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), recording)
+
+        sent = []
+
+        async def handler(request):
+            sent.append(await request.aread())
+            return httpx.Response(200, json={'text': 'hello'})
+
+        with mock.patch('interpreter_app.backend.httpx.AsyncClient',
+                        functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handler))):
+            response = await self.async_client.post(f'/transcribe/?upload={self.upload}')
+        self.assertEqual(response.json(), {'status': 'success', 'text': 'hello'})
+        self.assertIn(b'RIFF', sent[0])
+        self.assertEqual(os.listdir(self.directory), [])
+
+    async def test_too_large_recording_is_dropped(self):
+        self.assertEqual((await self.send(b'x' * 15000)).status_code, 200)
+        self.assertEqual((await self.send(b'x' * 15000)).status_code, 413)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    async def test_bad_upload_id(self):
+        self.upload = '../../etc'
+        self.assertEqual((await self.send(b'x')).status_code, 400)
@@ -0,0 +1,220 @@
+# interpreter_app/timing.py
+#
+# Where a request's time goes. Views wrap their parts (upload parsing,
+# /transcribe, /converse, exec, metadata, rendering, JSON serialization) in
+# stage(name); timing_middleware reports the stages of each response in a
+# Server-Timing header for the browser devtools, and every stage and
+# endpoint feeds the latency histograms the metrics view exports in
+# Prometheus text format. Metrics are kept per process.
+
+import bisect
+import contextlib
+import contextvars
+import cProfile
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+from interpreter_app.startup import record_first_request
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Stage durations of the current request, in seconds. The middleware puts a
+# fresh dict here; copies of the context (threads, tasks) share it.
+_request_stages = contextvars.ContextVar('request_stages', default=None)
+
+
+class LatencyHistogram:
+    """Cumulative bucket counts since start, plus the last window samples for quantiles."""
+
+    def __init__(self, window):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+    def quantiles(self):
+        recent = sorted(self.recent)
+        if not recent:
+            return {}
+        return {q: recent[min(len(recent) - 1, int(q * len(recent)))] for q in QUANTILES}
+
+
+class RequestMetrics:
+    """Latency histograms per stage and per endpoint, and response counts by status."""
+
+    def __init__(self, window=1024):
+        self.window = window
+        self._histograms = {'stage': {}, 'endpoint': {}}
+        self._responses = {}
+        self.profiles_saved = 0
+        self._lock = threading.Lock()
+
+    def observe(self, kind, name, seconds):
+        with self._lock:
+            histogram = self._histograms[kind].get(name)
+            if histogram is None:
+                histogram = self._histograms[kind][name] = LatencyHistogram(self.window)
+            histogram.observe(seconds)
+
+    def count_response(self, endpoint, status):
+        with self._lock:
+            self._responses[endpoint, status] = self._responses.get((endpoint, status), 0) + 1
+
+    def count_profile(self):
+        with self._lock:
+            self.profiles_saved += 1
+
+    def render(self, gauges=None):
+        """Prometheus text exposition; gauges is {metric name: value} added as is."""
+        lines = []
+        with self._lock:
+            for kind, histograms in self._histograms.items():
+                family = f'interpreter_{kind}_seconds'
+                lines.append(f'# HELP {family} Latency per {kind} since the process started.')
+                lines.append(f'# TYPE {family} histogram')
+                for name, h in sorted(histograms.items()):
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS + (float('inf'),), h.counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f'{family}_bucket{{{kind}="{name}",le="{le}"}} {cumulative}')
+                    lines.append(f'{family}_sum{{{kind}="{name}"}} {h.sum!r}')
+                    lines.append(f'{family}_count{{{kind}="{name}"}} {h.count}')
+                lines.append(f'# HELP {family}_recent Latency per {kind} over the last {self.window} requests.')
+                lines.append(f'# TYPE {family}_recent summary')
+                for name, h in sorted(histograms.items()):
+                    for q, value in h.quantiles().items():
+                        lines.append(f'{family}_recent{{{kind}="{name}",quantile="{q}"}} {value!r}')
+                    lines.append(f'{family}_recent_sum{{{kind}="{name}"}} {sum(h.recent)!r}')
+                    lines.append(f'{family}_recent_count{{{kind}="{name}"}} {len(h.recent)}')
+            lines.append('# HELP interpreter_responses_total Responses per endpoint and status code.')
+            lines.append('# TYPE interpreter_responses_total counter')
+            for (endpoint, status), count in sorted(self._responses.items()):
+                lines.append(f'interpreter_responses_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+            lines.append('# HELP interpreter_profiles_saved_total Slow execute_code runs saved as cProfile files.')
+            lines.append('# TYPE interpreter_profiles_saved_total counter')
+            lines.append(f'interpreter_profiles_saved_total {self.profiles_saved}')
+        for name, value in sorted((gauges or {}).items()):
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics(window=getattr(settings, 'METRICS_WINDOW', 1024))
+
+
+def record(name, seconds):
+    """Adds seconds to stage name, for time measured elsewhere (e.g. in a sandbox worker)."""
+    request_metrics.observe('stage', name, seconds)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+
+@contextlib.contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def server_timing(stages, total):
+    entries = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in stages.items()]
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def _begin():
+    stages = {}
+    return stages, _request_stages.set(stages), time.perf_counter()
+
+
+def _end(request, response, stages, token, start):
+    _request_stages.reset(token)
+    total = time.perf_counter() - start
+    match = getattr(request, 'resolver_match', None)
+    endpoint = match.url_name if match is not None and match.url_name else 'unmatched'
+    request_metrics.observe('endpoint', endpoint, total)
+    record_first_request(total)
+    request_metrics.count_response(endpoint, response.status_code)
+    # For streaming responses this is the time to the headers; stages that
+    # run while the body streams only reach the histograms.
+    if getattr(settings, 'SERVER_TIMING', True):
+        response['Server-Timing'] = server_timing(stages, total)
+    return response
+
+
+@sync_and_async_middleware
+def timing_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            stages, token, start = _begin()
+            return _end(request, await get_response(request), stages, token, start)
+    else:
+        def middleware(request):
+            stages, token, start = _begin()
+            return _end(request, get_response(request), stages, token, start)
+    return middleware
+
+
+_profile_lock = threading.Lock()
+
+
+def _prune_profiles(profile_dir, max_files):
+    entries = sorted(
+        (e for e in os.scandir(profile_dir) if e.name.endswith('.prof')),
+        key=lambda e: e.stat().st_mtime,
+    )
+    for entry in entries[:max(0, len(entries) - max_files)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+@contextlib.contextmanager
+def sampled_profile(name):
+    """
+    Runs the block under cProfile for a PROFILE_SAMPLE_RATE fraction of
+    calls and keeps the profile in PROFILE_DIR if the block took at least
+    PROFILE_SLOW_MS. One block is profiled at a time per process; only the
+    calling thread is profiled (code run in a sandbox worker shows up as
+    the wait for it).
+    """
+    rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0.0)
+    if not rate or random.random() >= rate or not _profile_lock.acquire(blocking=False):
+        yield
+        return
+    profile = cProfile.Profile()
+    start = time.perf_counter()
+    try:
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms >= getattr(settings, 'PROFILE_SLOW_MS', 1000):
+            profile_dir = getattr(settings, 'PROFILE_DIR', os.path.join(settings.MEDIA_ROOT, 'profiles'))
+            os.makedirs(profile_dir, exist_ok=True)
+            profile.dump_stats(os.path.join(profile_dir, f'{name}-{time.time_ns()}-{elapsed_ms:.0f}ms.prof'))
+            _prune_profiles(profile_dir, getattr(settings, 'PROFILE_MAX_FILES', 50))
+            request_metrics.count_profile()
+    finally:
+        _profile_lock.release()
@@ -6,11 +6,24 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('upload_data/', views.upload_data, name='upload_data'),
+    path('upload_progress/', views.upload_progress, name='upload_progress'),
     path('transcribe/', views.transcribe, name='transcribe'),
+    path('transcribe/chunk/', views.transcribe_chunk, name='transcribe_chunk'),
     path('generate_code/', views.generate_code, name='generate_code'),
+    path('generate_code_stream/', views.generate_code_stream, name='generate_code_stream'),
     path('execute_code/', views.execute_code, name='execute_code'),
+    path('replay/', views.replay, name='replay'),
+    path('versions/', views.list_versions, name='list_versions'),
+    path('versions/checkout/', views.checkout_version, name='checkout_version'),
+    path('versions/undo/', views.undo_version, name='undo_version'),
+    path('versions/redo/', views.redo_version, name='redo_version'),
+    path('versions/diff/', views.diff_versions, name='diff_versions'),
+    path('rendered/<str:name>', views.rendered_output, name='rendered_output'),
+    path('table_page/<str:name>', views.table_page, name='table_page'),
     path('add_history/', views.add_history, name='add_history'),
     path('get_history/', views.get_history, name='get_history'),
     path('delete_history/', views.delete_history, name='delete_history'),
+    path('store_stats/', views.store_stats, name='store_stats'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
 
@@ -1,98 +1,345 @@
 # views.py
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.urls import reverse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-import pandas as pd
-import numpy as np
-import base64
-import io
+from django.utils.functional import SimpleLazyObject
+import asyncio
+import importlib
 import json
-import matplotlib
+import os
+import re
+import threading
+import time
+import uuid
 
-from interpreter_app.helpers import update_metadata
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from matplotlib.axes import Axes
+from plotly.offline import get_plotlyjs_version
 
-import seaborn as sns
-import plotly
-import plotly.express as px
-import plotly.io as pio
+from interpreter_app.backend import backend
+from interpreter_app.history import (add_entry, append_chat_history, clear_chat_history, clear_entries,
+                                     entries_page, load_chat_history, replay_entries)
+from interpreter_app.metadata_sync import (METADATA_VERSION_HEADER, compact_metadata, metadata_fields,
+                                          metadata_version)
+from interpreter_app.reply_cache import reply_cache
+from interpreter_app.result_cache import result_cache
+from interpreter_app.startup import startup_report
+from interpreter_app.timing import record, request_metrics, sampled_profile, stage
+from interpreter_app.streaming import aiter_events, format_event, reply_events
 
-import requests
+# pandas, matplotlib, plotly, pyarrow, duckdb and PyAV are imported by the
+# views that use them, so that endpoints like get_history and management
+# commands start without them; startup.preload() loads them before serving.
+df_store = SimpleLazyObject(lambda: importlib.import_module('interpreter_app.store').df_store)
 
-API_URL = "http://10.32.15.88:6000"
+_sandbox_pool = None
+_sandbox_pool_lock = threading.Lock()
 
-df_store = None
-metadata_store = {}
+def _get_sandbox_pool():
+    from interpreter_app.sandbox import SandboxPool
+
+    global _sandbox_pool
+    with _sandbox_pool_lock:
+        if _sandbox_pool is None:
+            _sandbox_pool = SandboxPool(
+                size=settings.EXECUTE_SANDBOX_WORKERS,
+                cpu_time_limit=getattr(settings, 'EXECUTE_CPU_TIME_LIMIT', 30),
+                wall_time_limit=getattr(settings, 'EXECUTE_WALL_TIME_LIMIT', 60),
+                memory_limit=getattr(settings, 'EXECUTE_MEMORY_LIMIT', 2 * 1024 ** 3),
+                exchange_dir=getattr(settings, 'EXECUTE_SANDBOX_DIR',
+                                     os.path.join(settings.MEDIA_ROOT, 'sandbox')),
+            )
+        return _sandbox_pool
+
+_last_render_prune = 0.0
+
+def _render_dir():
+    return getattr(settings, 'RENDER_DIR', os.path.join(settings.MEDIA_ROOT, 'renders'))
+
+def _render_options():
+    return {
+        'image_format': getattr(settings, 'RENDER_IMAGE_FORMAT', 'png'),
+        'dpi': getattr(settings, 'RENDER_DPI', 100),
+        'max_pixels': getattr(settings, 'RENDER_MAX_PIXELS', 2000),
+        'rasterize_points': getattr(settings, 'RENDER_RASTERIZE_POINTS', 5000),
+        'plotly_format': getattr(settings, 'RENDER_PLOTLY_FORMAT', 'json'),
+        'table_page_rows': getattr(settings, 'TABLE_PAGE_ROWS', 100),
+        'point_budget': getattr(settings, 'PLOT_POINT_BUDGET', None),
+        'line_downsampling': getattr(settings, 'PLOT_LINE_DOWNSAMPLING', 'minmax'),
+        'workers': getattr(settings, 'RENDER_WORKERS', 1),
+        'output_dir': _render_dir(),
+    }
+
+def _sql_options():
+    return {
+        'threads': getattr(settings, 'SQL_ENGINE_THREADS', None),
+        'memory_limit': getattr(settings, 'SQL_ENGINE_MEMORY_LIMIT', None),
+        'temp_directory': getattr(settings, 'SQL_ENGINE_TEMP_DIR', None),
+    }
+
+def _converse_metadata(dataset_key):
+    # The compact profile of the dataset, and sql() for the model to use.
+    from interpreter_app.sql_engine import SQL_DESCRIPTION
+
+    metadata = df_store.get_metadata(dataset_key)
+    if not metadata:
+        return metadata
+    metadata = compact_metadata(
+        metadata,
+        max_columns=getattr(settings, 'CONVERSE_METADATA_MAX_COLUMNS', None),
+        sample_rows=getattr(settings, 'CONVERSE_METADATA_SAMPLE_ROWS', 3),
+        max_values=getattr(settings, 'CONVERSE_METADATA_MAX_VALUES', 20),
+    )
+    return {**metadata, 'sql': SQL_DESCRIPTION}
+
+async def _converse_payload(session_key, metadata, full=False, **fields):
+    """
+    A /converse payload with metadata sent as its version, a delta against
+    the version last sent for the session, or in full (see
+    metadata_sync.py).
+    """
+    if not getattr(settings, 'CONVERSE_METADATA_HANDSHAKE', True):
+        return {**fields, 'metadata': metadata}
+    sent = None if full else await cache.aget(f'converse_metadata:{session_key}')
+    return {**fields, **metadata_fields(metadata, sent)}
+
+async def _metadata_sent(session_key, metadata, response):
+    # Only metadata the backend acknowledged is referred to by version later.
+    version = metadata_version(metadata) if metadata else None
+    if version and response.headers.get(METADATA_VERSION_HEADER) == version:
+        await cache.aset(f'converse_metadata:{session_key}', {'version': version, 'metadata': metadata},
+                         getattr(settings, 'CONVERSE_METADATA_TIMEOUT', 3600))
+
+def _metadata_required(status_code, body):
+    # The backend's answer when it lacks the version a payload refers to.
+    if status_code != 409:
+        return False
+    try:
+        return bool(json.loads(body).get('metadata_required'))
+    except (ValueError, AttributeError):
+        return False
+
+def _link_outputs(output_items):
+    # Rendered images are fetched separately from rendered_output, and the
+    # rows of table results from table_page.
+    for item in output_items:
+        if 'file' in item:
+            view = 'table_page' if item['type'] == 'table' else 'rendered_output'
+            item['url'] = reverse(view, args=[item['file']])
+    return output_items
+
+def _outputs_available(output_items):
+    return all(os.path.exists(os.path.join(_render_dir(), item['file']))
+               for item in output_items if 'file' in item)
+
+def _prune_renders():
+    from interpreter_app.rendering import prune_output_dir
+
+    global _last_render_prune
+    now = time.monotonic()
+    if now - _last_render_prune >= getattr(settings, 'RENDER_PRUNE_INTERVAL', 60):
+        _last_render_prune = now
+        prune_output_dir(_render_dir(), getattr(settings, 'RENDER_DIR_BUDGET', 512 * 1024 ** 2))
+
+def _dataset_key(request):
+    # One dataset per session; the session needs a key before the first upload.
+    if request.session.session_key is None:
+        request.session.save()
+    return request.session.session_key
+
+async def _adataset_key(request):
+    if request.session.session_key is None:
+        await request.session.asave()
+    return request.session.session_key
+
+def _request_user(request):
+    return request.user if request.user.is_authenticated else None
+
+async def _arequest_user(request):
+    user = await request.auser()
+    return user if user.is_authenticated else None
 
 def index(request):
-    if 'history' not in request.session:
-        request.session['history'] = []
-    request.session['chat_history'] = []
-    return render(request, 'interpreter_app/index.html')
+    # A page load starts a new conversation; the command history is kept.
+    if request.session.session_key is not None:
+        clear_chat_history(request.session.session_key)
+    return render(request, 'interpreter_app/index.html', {'plotly_js_version': get_plotlyjs_version()})
 
 @csrf_exempt
 def upload_data(request):
-    global df_store, metadata_store
+    from interpreter_app.helpers import update_metadata
+    from interpreter_app.ingest import CHUNK_ROWS, is_supported, read_upload
+
     if request.method == 'POST' and request.FILES.get('file'):
         uploaded_file = request.FILES['file']
+        if not is_supported(uploaded_file.name):
+            return JsonResponse({'status': 'error', 'message': 'Unsupported file type.'}, status=400)
+        dataset_key = _dataset_key(request)
+        progress_key = f'upload_progress:{dataset_key}'
+
+        def report_progress(rows, bytes_read, total_bytes):
+            cache.set(progress_key, {'rows': rows, 'bytes_read': bytes_read, 'total_bytes': total_bytes}, 300)
+
         try:
-            if uploaded_file.name.endswith('.csv'):
-                df = pd.read_csv(uploaded_file)
-            elif uploaded_file.name.endswith('.xlsx'):
-                df = pd.read_excel(uploaded_file)
-            elif uploaded_file.name.endswith('.txt'):
-                df = pd.read_csv(uploaded_file, delimiter='\t')
-            else:
-                return JsonResponse({'status': 'error', 'message': 'Unsupported file type.'}, status=400)
-
-            df_store = df
-
-            metadata = {}
-            metadata['columns'] = list(df.columns)
-            metadata['dtypes'] = df.dtypes.apply(lambda x: x.name).to_dict()
-            metadata['sample_rows'] = df.head(3).to_dict(orient='records')
-
-            numerical_cols = df.select_dtypes(include=[np.number]).columns
-            metadata['numerical_ranges'] = {}
-            for col in numerical_cols:
-                min_value = df[col].min()
-                max_value = df[col].max()
-                if isinstance(min_value, (np.integer, np.int64, np.int32)):
-                    min_value = int(min_value)
-                elif isinstance(min_value, (np.floating, np.float64, np.float32)):
-                    min_value = float(min_value)
-                if isinstance(max_value, (np.integer, np.int64, np.int32)):
-                    max_value = int(max_value)
-                elif isinstance(max_value, (np.floating, np.float64, np.float32)):
-                    max_value = float(max_value)
-                metadata['numerical_ranges'][col] = {'min': min_value, 'max': max_value}
-
-            categorical_cols = df.select_dtypes(include=['object', 'category']).columns
-            metadata['categorical_values'] = {}
-            for col in categorical_cols:
-                unique_values = df[col].unique()
-                if len(unique_values) <= 20:
-                    metadata['categorical_values'][col] = unique_values.tolist()
-                else:
-                    metadata['categorical_values'][col] = unique_values[:20].tolist() + ['...']
+            with stage('parse'):
+                df, info = read_upload(
+                    uploaded_file,
+                    row_budget=getattr(settings, 'UPLOAD_ROW_BUDGET', None),
+                    chunk_rows=getattr(settings, 'UPLOAD_CHUNK_ROWS', CHUNK_ROWS),
+                    downcast=getattr(settings, 'UPLOAD_DOWNCAST', ()),
+                    progress=report_progress,
+                )
 
-            metadata_store = metadata
-            return JsonResponse({'status': 'success', 'metadata': metadata})
+            with stage('metadata'):
+                metadata = update_metadata(df)
+            with stage('store'):
+                df_store.put(dataset_key, df, metadata)
+            with stage('serialize'):
+                return JsonResponse({'status': 'success', 'metadata': metadata, 'rows': info['rows'], 'truncated': info['truncated']})
         except Exception as e:
             return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+        finally:
+            cache.delete(progress_key)
     else:
         return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
 
+def upload_progress(request):
+    if request.method == 'GET':
+        progress = cache.get(f'upload_progress:{_dataset_key(request)}')
+        return JsonResponse({'status': 'success', 'progress': progress})
+    return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+def _audio_upload_path(dataset_key, upload_id):
+    upload_dir = getattr(settings, 'TRANSCRIBE_UPLOAD_DIR', os.path.join(settings.MEDIA_ROOT, 'audio_uploads'))
+    return os.path.join(upload_dir, f'{dataset_key}.{upload_id}.part')
+
+def _prune_audio_uploads(upload_dir, max_age):
+    # Recordings whose transcription was never requested.
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(upload_dir))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.name.endswith('.part') and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+@csrf_exempt
+async def transcribe_chunk(request):
+    """
+    Appends the raw request body to the recording identified by the
+    'upload' query parameter, so the browser can send audio while the user
+    is still speaking and then ask transcribe to process it.
+    """
+    upload_id = request.GET.get('upload', '')
+    if request.method != 'POST' or not _UPLOAD_ID.match(upload_id):
+        return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+    path = _audio_upload_path(await _adataset_key(request), upload_id)
+    # File system calls, including the prune scan, are kept off the event loop.
+    size = await asyncio.to_thread(
+        _append_audio_chunk, path, request.body,
+        getattr(settings, 'TRANSCRIBE_MAX_UPLOAD_BYTES', 10 * 1024 ** 2),
+        getattr(settings, 'TRANSCRIBE_UPLOAD_MAX_AGE', 600))
+    if size is None:
+        return JsonResponse({'status': 'error', 'message': 'Recording too large.'}, status=413)
+    return JsonResponse({'status': 'success', 'bytes': size})
+
+def _append_audio_chunk(path, data, max_bytes, max_age):
+    # Returns the recording's new size, or None (and drops the recording)
+    # when it would exceed max_bytes.
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    if size + len(data) > max_bytes:
+        if size:
+            os.remove(path)
+        return None
+    if not size:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _prune_audio_uploads(os.path.dirname(path), max_age)
+    with open(path, 'ab') as f:
+        f.write(data)
+    return size + len(data)
+
+async def _astream(iterator):
+    # Decoding is CPU work on a blocking file, so each chunk is produced in
+    # a worker thread.
+    while True:
+        chunk = await asyncio.to_thread(next, iterator, None)
+        if chunk is None:
+            return
+        yield chunk
+
+async def _transcription_request(read_chunks, name, content_type):
+    """
+    Keyword arguments for backend.post('transcribe'): the recording as a
+    trimmed 16 kHz WAV streamed as a multipart body, or as received if it
+    cannot be decoded. read_chunks() returns a fresh iterator over the file.
+    """
+    from interpreter_app.audio import speech_wav
+
+    options = {
+        'rate': getattr(settings, 'TRANSCRIBE_SAMPLE_RATE', 16000),
+        'trim': getattr(settings, 'TRANSCRIBE_TRIM_SILENCE', True),
+        'threshold_db': getattr(settings, 'TRANSCRIBE_VAD_THRESHOLD_DB', -50.0),
+        'padding_ms': getattr(settings, 'TRANSCRIBE_VAD_PADDING_MS', 300),
+    }
+    try:
+        first = [await asyncio.to_thread(speech_wav, read_chunks(), **options)]
+    except Exception:
+        return {'files': {'file': (name, b''.join(read_chunks()), content_type)}}
+    boundary = uuid.uuid4().hex
+
+    async def body():
+        # Called once per attempt (see BackendClient): a retry decodes the
+        # recording again.
+        wav = first.pop() if first else await asyncio.to_thread(speech_wav, read_chunks(), **options)
+        yield (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="speech.wav"\r\n'
+               'Content-Type: audio/wav\r\n\r\n').encode()
+        async for chunk in _astream(wav):
+            yield chunk
+        yield f'\r\n--{boundary}--\r\n'.encode()
+
+    return {'content': body, 'headers': {'Content-Type': f'multipart/form-data; boundary={boundary}'}}
+
 @csrf_exempt
-def transcribe(request):
-    if request.method == 'POST' and request.FILES.get('file'):
-        audio_file = request.FILES['file']
-        files = {'file': (audio_file.name, audio_file.read(), 'audio/wav')}
+async def transcribe(request):
+    """
+    Transcribes a recording posted as the multipart 'file', or one sent
+    earlier through transcribe_chunk when the 'upload' query parameter is
+    given.
+    """
+    upload_id = request.GET.get('upload', '')
+    if request.method == 'POST' and (request.FILES.get('file') or _UPLOAD_ID.match(upload_id)):
+        if request.FILES.get('file'):
+            audio_file = request.FILES['file']
+            name, content_type, path = audio_file.name, audio_file.content_type, None
+
+            def read_chunks():
+                audio_file.seek(0)
+                return audio_file.chunks()
+        else:
+            path = _audio_upload_path(await _adataset_key(request), upload_id)
+            if not os.path.exists(path):
+                return JsonResponse({'status': 'error', 'message': 'Unknown upload.'}, status=404)
+            name, content_type = 'recording', 'application/octet-stream'
+
+            def read_chunks():
+                with open(path, 'rb') as f:
+                    yield from iter(lambda: f.read(64 * 1024), b'')
         try:
-            response = requests.post(f"{API_URL}/transcribe", files=files)
+            with stage('audio'):
+                transcription_request = await _transcription_request(read_chunks, name, content_type)
+            # Includes decoding the rest of the recording, which is streamed
+            # to the backend as it is decoded.
+            with stage('transcribe'):
+                response = await backend.post('transcribe', **transcription_request)
             if response.status_code == 200:
                 text = response.json().get("text", "")
                 return JsonResponse({'status': 'success', 'text': text})
@@ -100,37 +347,62 @@ def transcribe(request):
                 return JsonResponse({'status': 'error', 'message': response.text}, status=400)
         except Exception as e:
             return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+        finally:
+            if path and os.path.exists(path):
+                os.remove(path)
     return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
 
 @csrf_exempt
-def generate_code(request):
+async def generate_code(request):
     """
     preview:
     - Sends a POST request to the /converse endpoint.
-    - Uses payload keys 'user_input', 'metadata', and 'conversation_history' (from 'chat_history').
-    - Updates the session chat_history with the returned updated_history.
+    - Uses payload keys 'user_input', 'conversation_history' (the stored chat
+      history, trimmed to CHAT_HISTORY_TOKEN_BUDGET, see history.py) and
+      'metadata_version' with 'metadata' or 'metadata_base'/'metadata_delta'
+      when the backend lacks that version (see metadata_sync.py).
+    - Appends the messages the returned updated_history adds to the stored chat history.
     - Returns code and message.
     """
-    global metadata_store
     if request.method == 'POST':
         data = json.loads(request.body)
         command = data.get('command', '')
-        chat_history = request.session.get('chat_history', [])
-        payload = {
-            'user_input': command,
-            'metadata': metadata_store,
-            'conversation_history': chat_history
-        }
+        session_key = await _adataset_key(request)
+        with stage('history'):
+            chat_history = await load_chat_history(session_key)
+        # Store reads and the reply cache's hashing are kept off the event loop.
+        metadata = await asyncio.to_thread(_converse_metadata, session_key)
+        cached = await asyncio.to_thread(reply_cache.lookup, command, metadata, chat_history)
+        if cached is not None:
+            await append_chat_history(session_key, chat_history, chat_history + cached['history_delta'],
+                                      await _arequest_user(request))
+            return JsonResponse({
+                'status': 'success',
+                'code': cached['code'],
+                'message': cached['message'],
+                'audio': cached['audio'],
+            })
         headers = {'Content-Type': 'application/json'}
         try:
-            response = requests.post(f"{API_URL}/converse", headers=headers, data=json.dumps(payload))
+            with stage('converse'):
+                for full in (False, True):
+                    payload = await _converse_payload(session_key, metadata, full,
+                                                      user_input=command, conversation_history=chat_history)
+                    response = await backend.post('converse', headers=headers, content=json.dumps(payload))
+                    if not _metadata_required(response.status_code, response.content):
+                        break
             if response.status_code == 200:
+                await _metadata_sent(session_key, metadata, response)
                 res_json = response.json()
                 code = res_json.get('code', '')
                 message = res_json.get('message', '')
                 audio = res_json.get('audio', '')
                 updated_history = res_json.get('updated_history', [])
-                request.session['chat_history'] = updated_history
+                with stage('history'):
+                    await append_chat_history(session_key, chat_history, updated_history,
+                                              await _arequest_user(request))
+                await asyncio.to_thread(reply_cache.store, command, metadata, chat_history, res_json,
+                                        updated_history)
                 return JsonResponse({
                     'status': 'success',
                     'code': code,
@@ -143,147 +415,420 @@ def generate_code(request):
             return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
     return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
 
+@csrf_exempt
+async def generate_code_stream(request):
+    """
+    Streaming variant of generate_code. Asks /converse to stream and relays
+    its events to the browser as server-sent events (see streaming.py), so
+    the code can be shown and run before the spoken answer has arrived. A
+    backend that answers with plain JSON is relayed as a short stream.
+    Replies found in the reply cache are replayed without calling /converse.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+    data = json.loads(request.body)
+    command = data.get('command', '')
+    session_key = await _adataset_key(request)
+    user = await _arequest_user(request)
+    with stage('history'):
+        chat_history = await load_chat_history(session_key)
+    metadata = await asyncio.to_thread(_converse_metadata, session_key)
+    headers = {'Content-Type': 'application/json', 'Accept': 'text/event-stream'}
+    cached = await asyncio.to_thread(reply_cache.lookup, command, metadata, chat_history)
+
+    async def relay(upstream):
+        code_ended = False
+        reply = {'code': '', 'message': '', 'audio': ''}
+        async for event, event_data in upstream:
+            if event not in ('code', 'code_end') and not code_ended:
+                code_ended = True
+                yield format_event('code_end', {})
+            if event == 'code_end':
+                if code_ended:
+                    continue
+                code_ended = True
+            if event == 'code':
+                reply['code'] += event_data.get('delta', '')
+            elif event == 'answer':
+                reply['message'] += event_data.get('delta', '')
+            elif event == 'audio':
+                reply['audio'] += event_data.get('data', '')
+            elif event == 'done':
+                updated_history = event_data.get('updated_history', [])
+                await append_chat_history(session_key, chat_history, updated_history, user)
+                if cached is None:
+                    await asyncio.to_thread(reply_cache.store, command, metadata, chat_history, reply,
+                                            updated_history)
+                event_data = {}
+            yield format_event(event, event_data)
+
+    async def events():
+        try:
+            if cached is not None:
+                replay = dict(cached, updated_history=chat_history + cached['history_delta'])
+                async for chunk in relay(_aiter(reply_events(replay))):
+                    yield chunk
+                return
+            # Runs after the response headers are sent, so it reaches the
+            # metrics but not the Server-Timing header.
+            with stage('converse_stream'):
+                for full in (False, True):
+                    payload = await _converse_payload(session_key, metadata, full, user_input=command,
+                                                      conversation_history=chat_history, stream=True)
+                    async with backend.stream('converse', headers=headers, content=json.dumps(payload)) as response:
+                        if response.status_code != 200:
+                            body = await response.aread()
+                            if not full and _metadata_required(response.status_code, body):
+                                continue
+                            yield format_event('error', {'message': body.decode(errors='replace')})
+                            return
+                        await _metadata_sent(session_key, metadata, response)
+                        if response.headers.get('content-type', '').startswith('text/event-stream'):
+                            upstream = aiter_events(response.aiter_lines())
+                        else:
+                            upstream = _aiter(reply_events(json.loads(await response.aread())))
+                        async for chunk in relay(upstream):
+                            yield chunk
+                    return
+        except Exception as e:
+            yield format_event('error', {'message': str(e)})
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+async def _aiter(iterable):
+    for item in iterable:
+        yield item
+
+def _projected_columns(code):
+    # The df columns code reads (see code_prep.py); None loads them all.
+    from interpreter_app.code_prep import prepare
+
+    if not getattr(settings, 'EXECUTE_COLUMN_PROJECTION', True):
+        return None
+    try:
+        return prepare(code).columns
+    except SyntaxError:
+        return None
+
 @csrf_exempt
 def execute_code(request):
-    global df_store, metadata_store
+    # Slow runs can be captured with cProfile, see PROFILE_SAMPLE_RATE.
+    with sampled_profile('execute_code'):
+        return _execute_code(request)
+
+def _execute_code(request):
+    from interpreter_app.executor import clean_code, run_code
+    from interpreter_app.helpers import shares_all_columns, update_metadata
+    from interpreter_app.sandbox import read_frame
+
     if request.method == 'POST':
-        if df_store is None:
+        dataset_key = _dataset_key(request)
+        if dataset_key not in df_store:
             return JsonResponse({'status': 'error', 'message': 'No data uploaded yet.'}, status=400)
         data = json.loads(request.body)
         code = data.get('code', '')
-        df = df_store
-        allowed_locals = {
-            'df': df,
-            'pd': pd,
-            'np': np,
-            'plt': plt,
-            'sns': sns,
-            'px': px,
-            'plotly': plotly
-        }
-        exec_globals = {"__builtins__": None}
-        cleaned_code_lines = []
-        for line in code.split("\n"):
-            if not line.strip().startswith("import"):
-                cleaned_code_lines.append(line)
-        cleaned_code = "\n".join(cleaned_code_lines)
-        lines = cleaned_code.strip().split('\n')
-        last_line = lines[-1].strip() if lines else ''
-        def is_expression(s):
-            return (
-                not s.startswith(('print', 'plt.', 'sns.', 'px.' ))
-                and '=' not in s
-                and not s.endswith(':')
-            )
-        result_value = None
-        try:
-            if len(lines) > 1 and is_expression(last_line):
-                code_body = '\n'.join(lines[:-1])
-                exec(code_body, exec_globals, allowed_locals)
-                result_value = eval(last_line, exec_globals, allowed_locals)
-            else:
-                exec(cleaned_code, exec_globals, allowed_locals)
-        except KeyError as e:
+
+        # Same code on the same version of the data gives the same output, so
+        # it is served without running. Runs that modify df are not cached;
+        # storing their frame gives the dataset a new version instead.
+        render_options = _render_options()
+        with stage('result_cache'):
+            cache_key = result_cache.key(df_store.get_version(dataset_key), clean_code(code).strip(), render_options)
+            cached = result_cache.get(cache_key)
+            available = cached is not None and _outputs_available(cached['output_items'])
+        if available:
             return JsonResponse({
-                'status': 'error',
-                'message': f"KeyError: {str(e)}. Check your code logic and variable usage."
-            }, status=200)
-        except TypeError as e:
+                'status': 'success',
+                'result': {
+                    'type': 'multi',
+                    'data': cached['output_items']
+                },
+                'metadata': cached['metadata']
+            })
+
+        # Code that only reads some columns of df gets only those loaded.
+        columns = _projected_columns(code)
+        if getattr(settings, 'EXECUTE_SANDBOX_WORKERS', 0):
+            with stage('frame_file'):
+                frame_path = df_store.frame_file(dataset_key)
+            # The round trip to the worker, which reports its own stages.
+            with stage('sandbox'):
+                result = _get_sandbox_pool().run(frame_path, code, render_options, _sql_options(), columns)
+            new_df = None
+            df_path = result.get('df_path')
+            if df_path:
+                with stage('frame_read'):
+                    new_df = read_frame(df_path)
+        else:
+            df_path = None
+            stored = df_store.get(dataset_key, columns=columns)
+            # Under copy-on-write, the code's writes to this shallow copy
+            # copy the columns they touch and leave the stored version as is.
+            result = run_code(stored.copy(deep=False), code, render_options, _sql_options())
+            new_df = result.get('df')
+            if new_df is not None and shares_all_columns(new_df, stored):
+                new_df = None
+        for name, seconds in result.get('timings', {}).items():
+            record(name, seconds)
+        if result['status'] != 'success':
+            return JsonResponse({'status': 'error', 'message': result['message']}, status=200)
+
+        _link_outputs(result['output_items'])
+        _prune_renders()
+
+        # A modified 'df' becomes a new version of the dataset (see store.py)
+        if new_df is not None:
+            with stage('metadata'):
+                metadata = update_metadata(new_df)
+            with stage('store'):
+                # A shared store takes the worker's file over as is.
+                df_store.commit(dataset_key, new_df, metadata, label=code, path=df_path)
+            if df_path:
+                _remove_frame(df_path)
+        else:
+            with stage('result_cache'):
+                result_cache.put(cache_key, {
+                    'output_items': result['output_items'],
+                    'metadata': df_store.get_metadata(dataset_key),
+                })
+
+        with stage('serialize'):
             return JsonResponse({
-                'status': 'error',
-                'message': f"TypeError: {str(e)}. Ensure your code initializes required variables."
-            }, status=200)
-        except Exception as e:
-            return JsonResponse({'status': 'error', 'message': f"Error: {str(e)}."}, status=200)
-
-        # Update the stored DataFrame and metadata if 'df' is modified
-        if 'df' in allowed_locals and isinstance(allowed_locals['df'], pd.DataFrame):
-            df_store = allowed_locals['df']
-            metadata_store = update_metadata(df_store)  # update metadata
-
-        output_items = []
-        collected_ids = set()
-        def convert_and_add(obj):
-            obj_id = id(obj)
-            if obj_id in collected_ids:
-                return
-            converted = _convert_object_to_output(obj)
-            if converted:
-                collected_ids.add(obj_id)
-                output_items.append(converted)
-        if result_value is not None:
-            convert_and_add(result_value)
-        fig_nums = plt.get_fignums()
-        for fignum in fig_nums:
-            fig = plt.figure(fignum)
-            convert_and_add(fig)
-        plt.close('all')
-        standard_vars = {'pd', 'np', 'plt', 'sns', 'px', 'plotly', 'df'}
-        for var_name, var_value in allowed_locals.items():
-            if var_name in standard_vars:
-                continue
-            convert_and_add(var_value)
-        if not output_items:
-            output_items.append({
-                'type': 'text',
-                'data': "Code executed successfully but no notable object found."
+                'status': 'success',
+                'result': {
+                    'type': 'multi',
+                    'data': result['output_items']
+                },
+                'metadata': df_store.get_metadata(dataset_key)  # include updated metadata in response
             })
+    return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+
+def _remove_frame(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+@csrf_exempt
+async def replay(request):
+    """
+    Re-runs a list of commands against the current dataset in one request,
+    streaming each step's result as a server-sent event. The body gives
+    'entries' (history entry ids, run in that order), 'codes' (code
+    strings) or neither (the whole history, oldest first). Steps that do
+    not depend on each other run in parallel on the sandbox workers (see
+    replay.py). Events:
+      step   {"index", "command", "status", "result" or "message"}
+      done   {"version", "metadata"}  the dataset gets one new version if df changed
+      error  {"message"}
+    """
+    from interpreter_app.executor import run_code
+    from interpreter_app.helpers import shares_all_columns, update_metadata
+    from interpreter_app.replay import Pipeline
+    from interpreter_app.sandbox import read_frame
+
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+    dataset_key = await _adataset_key(request)
+    if not await asyncio.to_thread(df_store.__contains__, dataset_key):
+        return JsonResponse({'status': 'error', 'message': 'No data uploaded yet.'}, status=400)
+    data = json.loads(request.body or b'{}')
+    codes, entries = data.get('codes'), data.get('entries')
+    valid_codes = codes is None or isinstance(codes, list)
+    valid_entries = entries is None or (isinstance(entries, list) and all(type(e) is int for e in entries))
+    if not (valid_codes and valid_entries):
+        return JsonResponse({'status': 'error', 'message': "'codes' and 'entries' must be lists of "
+                                                           "code strings and history entry ids."}, status=400)
+    if codes is not None:
+        steps = [('', code) for code in codes if isinstance(code, str)]
+    else:
+        try:
+            steps = await replay_entries(dataset_key, entries)
+        except KeyError:
+            return JsonResponse({'status': 'error', 'message': 'Unknown history entry.'}, status=404)
+    if not steps:
+        return JsonResponse({'status': 'error', 'message': 'Nothing to replay.'}, status=400)
+    max_steps = getattr(settings, 'REPLAY_MAX_STEPS', 100)
+    if len(steps) > max_steps:
+        return JsonResponse({'status': 'error', 'message': f'At most {max_steps} commands per replay.'}, status=400)
+
+    render_options = _render_options()
+    sql_options = _sql_options()
+    sandbox_workers = getattr(settings, 'EXECUTE_SANDBOX_WORKERS', 0)
+    if sandbox_workers:
+        pool = _get_sandbox_pool()
+        frame = await asyncio.to_thread(df_store.frame_file, dataset_key)
+
+        def run_step(frame_path, code):
+            result = pool.run(frame_path, code, render_options, sql_options)
+            return result, result.pop('df_path', None)
+
+        pipeline = Pipeline([code for _, code in steps], frame, run_step, sandbox_workers, _remove_frame)
+    else:
+        # On a miss the store reads the whole frame.
+        frame = await asyncio.to_thread(df_store.get, dataset_key)
+
+        def run_step(df, code):
+            result = run_code(df.copy(deep=False), code, render_options, sql_options)
+            new_df = result.pop('df', None)
+            if new_df is not None and shares_all_columns(new_df, df):
+                new_df = None
+            return result, new_df
+
+        # In-process, steps run one at a time: pyplot figures are global.
+        pipeline = Pipeline([code for _, code in steps], frame, run_step)
+
+    async def events():
+        try:
+            async for index, result in pipeline.results():
+                for name, seconds in result.get('timings', {}).items():
+                    record(name, seconds)
+                event = {'index': index, 'command': steps[index][0], 'status': result['status']}
+                if result['status'] == 'success':
+                    event['result'] = {'type': 'multi', 'data': _link_outputs(result['output_items'])}
+                else:
+                    event['message'] = result['message']
+                yield format_event('step', event, DjangoJSONEncoder)
+            if pipeline.frame is not frame:
+                # Profiled and stored once, however many steps changed df.
+                new_df = pipeline.frame
+                if sandbox_workers:
+                    new_df = await asyncio.to_thread(read_frame, pipeline.frame)
+                with stage('metadata'):
+                    metadata = await asyncio.to_thread(update_metadata, new_df)
+                await asyncio.to_thread(df_store.commit, dataset_key, new_df, metadata,
+                                        label=f'Replay of {len(steps)} commands',
+                                        path=pipeline.frame if sandbox_workers else None)
+            await asyncio.to_thread(_prune_renders)
+            yield format_event('done', {
+                'version': await asyncio.to_thread(df_store.get_version, dataset_key),
+                'metadata': await asyncio.to_thread(df_store.get_metadata, dataset_key),
+            }, DjangoJSONEncoder)
+        except Exception as e:
+            yield format_event('error', {'message': str(e)})
+        finally:
+            pipeline.close()
+            if sandbox_workers and pipeline.frame is not frame:
+                _remove_frame(pipeline.frame)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def list_versions(request):
+    if request.method == 'GET':
+        dataset_key = _dataset_key(request)
         return JsonResponse({
             'status': 'success',
-            'result': {
-                'type': 'multi',
-                'data': output_items
-            },
-            'metadata': metadata_store  # include updated metadata in response
+            'head': df_store.get_version(dataset_key),
+            'versions': df_store.versions(dataset_key),
         })
     return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
 
-def _convert_object_to_output(obj):
-    import base64
-    import io
-    import plotly
-    if isinstance(obj, pd.DataFrame):
-        return {
-            'type': 'table',
-            'data': obj.to_json(orient="split")
-        }
-    if isinstance(obj, matplotlib.figure.Figure):
-        buf = io.BytesIO()
-        obj.savefig(buf, format='png')
-        buf.seek(0)
-        img_base64 = base64.b64encode(buf.read()).decode("utf-8")
-        return {
-            'type': 'plot',
-            'data': img_base64
-        }
-    if isinstance(obj, Axes):
-        fig = obj.get_figure()
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png')
-        buf.seek(0)
-        img_base64 = base64.b64encode(buf.read()).decode("utf-8")
-        return {
-            'type': 'plot',
-            'data': img_base64
-        }
-    if hasattr(obj, '__class__') and 'plotly' in str(type(obj)):
-        fig_html = plotly.io.to_html(obj, full_html=False)
-        return {
-            'type': 'plotly',
-            'data': fig_html
-        }
-    if isinstance(obj, (str, int, float, bool)):
-        return {
-            'type': 'text',
-            'data': str(obj)
-        }
-    text_repr = str(obj)
-    if len(text_repr) > 2000:
-        text_repr = text_repr[:2000] + " ... [truncated]"
-    return {
-        'type': 'text',
-        'data': text_repr
-    }
+def _version_response(dataset_key):
+    return JsonResponse({
+        'status': 'success',
+        'version': df_store.get_version(dataset_key),
+        'metadata': df_store.get_metadata(dataset_key),
+    })
+
+@csrf_exempt
+def checkout_version(request):
+    """Makes the posted 'version' the current data; its metadata is kept, not re-profiled."""
+    if request.method == 'POST':
+        dataset_key = _dataset_key(request)
+        version = json.loads(request.body).get('version')
+        if not df_store.checkout(dataset_key, version):
+            return JsonResponse({'status': 'error', 'message': 'Unknown version.'}, status=404)
+        return _version_response(dataset_key)
+    return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+
+@csrf_exempt
+def undo_version(request):
+    if request.method == 'POST':
+        dataset_key = _dataset_key(request)
+        if df_store.undo(dataset_key) is None:
+            return JsonResponse({'status': 'error', 'message': 'Nothing to undo.'}, status=400)
+        return _version_response(dataset_key)
+    return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+
+@csrf_exempt
+def redo_version(request):
+    if request.method == 'POST':
+        dataset_key = _dataset_key(request)
+        if df_store.redo(dataset_key) is None:
+            return JsonResponse({'status': 'error', 'message': 'Nothing to redo.'}, status=400)
+        return _version_response(dataset_key)
+    return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+
+def diff_versions(request):
+    """
+    Column-level diff between versions 'from' and 'to' (query parameters).
+    'to' defaults to the current version and 'from' to its parent.
+    """
+    if request.method == 'GET':
+        dataset_key = _dataset_key(request)
+        new = request.GET.get('to') or df_store.get_version(dataset_key)
+        old = request.GET.get('from')
+        if not old:
+            parents = {v['version']: v['parent'] for v in df_store.versions(dataset_key)}
+            old = parents.get(new)
+        diff = df_store.diff(dataset_key, old, new) if old and new else None
+        if diff is None:
+            return JsonResponse({'status': 'error', 'message': 'Unknown version.'}, status=404)
+        return JsonResponse({'status': 'success', 'diff': diff})
+    return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+
+def rendered_output(request, name):
+    from interpreter_app.rendering import IMAGE_TYPES
+
+    if not re.match(r'^[0-9a-f]{64}\.(%s)$' % '|'.join(IMAGE_TYPES), name):
+        raise Http404
+    path = os.path.join(_render_dir(), name)
+    if not os.path.exists(path):
+        raise Http404
+    response = FileResponse(open(path, 'rb'), content_type=IMAGE_TYPES[name.rsplit('.', 1)[1]])
+    # Named by content hash, so the file at a URL never changes.
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+def table_page(request, name):
+    """
+    Rows of a table result. Query parameters: offset, limit, sort (column),
+    descending (1/0), columns (comma-separated projection) and format
+    ('json' for columnar JSON, 'arrow' for an Arrow IPC stream).
+    """
+    from interpreter_app.tables import TABLE_EXTENSION, arrow_stream, page_payload, pager
+
+    if request.method != 'GET':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+    path = os.path.join(_render_dir(), name)
+    if not re.match(r'^[0-9a-f]{32}%s$' % re.escape(TABLE_EXTENSION), name) or not os.path.exists(path):
+        raise Http404
+    try:
+        offset = int(request.GET.get('offset', 0))
+        limit = int(request.GET.get('limit', getattr(settings, 'TABLE_PAGE_ROWS', 100)))
+        columns = [c for c in request.GET.get('columns', '').split(',') if c] or None
+        page, total = pager.page(
+            path, offset=offset, limit=limit,
+            sort=request.GET.get('sort') or None,
+            descending=request.GET.get('descending') in ('1', 'true'),
+            columns=columns,
+        )
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'offset and limit must be integers.'}, status=400)
+    except KeyError as e:
+        return JsonResponse({'status': 'error', 'message': f'Unknown column: {e.args[0]}'}, status=400)
+    if request.GET.get('format') == 'arrow':
+        response = HttpResponse(arrow_stream(page), content_type='application/vnd.apache.arrow.stream')
+        response['X-Total-Rows'] = str(total)
+        return response
+    return JsonResponse({'status': 'success', **page_payload(page, offset, total)})
 
 @csrf_exempt
 def add_history(request):
@@ -291,21 +836,51 @@ def add_history(request):
         data = json.loads(request.body)
         command = data.get('command', '')
         code = data.get('code', '')
-        history = request.session.get('history', [])
-        history.append({'command': command, 'code': code})
-        request.session['history'] = history
-        return JsonResponse({'status': 'success'})
+        entry = add_entry(_dataset_key(request), command, code, _request_user(request))
+        return JsonResponse({'status': 'success', 'id': entry.id, 'position': entry.position})
     return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
 
 def get_history(request):
+    """
+    A page of the command history, newest first. Query parameters: before
+    (the 'next' value of the previous page) and limit.
+    """
     if request.method == 'GET':
-        history = request.session.get('history', [])
-        return JsonResponse({'status': 'success', 'history': history})
+        try:
+            before = int(request.GET['before']) if request.GET.get('before') else None
+            limit = int(request.GET.get('limit', getattr(settings, 'HISTORY_PAGE_SIZE', 50)))
+        except ValueError:
+            return JsonResponse({'status': 'error', 'message': 'before and limit must be integers.'}, status=400)
+        history, next_cursor = entries_page(_dataset_key(request), before, max(1, min(limit, 500)))
+        return JsonResponse({'status': 'success', 'history': history, 'next': next_cursor})
     return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
 
 @csrf_exempt
 def delete_history(request):
     if request.method == 'POST':
-        request.session['history'] = []
+        clear_entries(_dataset_key(request))
         return JsonResponse({'status': 'success'})
     return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+
+def metrics(request):
+    """Request latency histograms (see timing.py) and cache statistics in Prometheus text format."""
+    if request.method != 'GET':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
+    gauges = {}
+    for prefix, stats in (('interpreter_store', df_store.stats()),
+                          ('interpreter_result_cache', result_cache.stats()),
+                          ('interpreter_reply_cache', reply_cache.stats())):
+        gauges.update({f'{prefix}_{name}': value for name, value in stats.items() if isinstance(value, (int, float))})
+    for phase, seconds in startup_report.items():
+        gauges[f'interpreter_startup_{re.sub(r"[^a-z0-9]+", "_", phase)}_seconds'] = seconds
+    return HttpResponse(request_metrics.render(gauges), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def store_stats(request):
+    if request.method == 'GET':
+        return JsonResponse({
+            'status': 'success',
+            'stats': df_store.stats(),
+            'result_cache': result_cache.stats(),
+            'reply_cache': reply_cache.stats(),
+        })
+    return JsonResponse({'status': 'error', 'message': 'Invalid request'}, status=400)
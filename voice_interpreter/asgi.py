@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voice_interpreter.settings')
 
 application = get_asgi_application()
+
+# Load the data libraries and warm up rendering before taking traffic (see
+# interpreter_app/startup.py and STARTUP_PRELOAD).
+from interpreter_app.startup import preload_on_startup
+
+preload_on_startup()
@@ -42,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the endpoint latency it records covers the other middleware.
+    'interpreter_app.timing.timing_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -128,3 +130,179 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Server processes serving the app. uvicorn --workers and gunicorn -w both
+# default to $WEB_CONCURRENCY, which is read here. With more than one,
+# datasets and the cache (upload progress, metadata sent to /converse) are
+# kept under MEDIA_ROOT where every process finds them. Multi-worker setups
+# that pass --workers/-w instead of setting WEB_CONCURRENCY must set this
+# (or DATAFRAME_STORE_SHARED_DIR and CACHES) themselves, or a request can
+# land on a process that does not have the dataset.
+SERVER_WORKERS = int(os.environ.get('WEB_CONCURRENCY', 1))
+if SERVER_WORKERS > 1:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                          'LOCATION': os.path.join(MEDIA_ROOT, 'cache')}}
+
+# In-memory budget for uploaded DataFrames; least recently used frames beyond it
+# are spilled to disk and reloaded on next access.
+DATAFRAME_STORE_MEMORY_BUDGET = 1024 ** 3
+DATAFRAME_STORE_SPILL_DIR = os.path.join(MEDIA_ROOT, 'df_store')
+# Versions kept per dataset for undo/checkout; older ones are squashed, as
+# are old versions of idle datasets when the memory budget is exceeded.
+DATAFRAME_STORE_MAX_VERSIONS = 20
+# A directory all server processes can reach: datasets are kept there as
+# memory-mapped Arrow files that every process opens, sharing the pages, and
+# the memory budget bounds what each process converts into private memory
+# (string columns). Every version is written out in full. Datasets unused
+# for DATAFRAME_STORE_MAX_AGE seconds are removed. None keeps datasets in the
+# memory of the process that received the upload, spilling to
+# DATAFRAME_STORE_SPILL_DIR, which only works with a single process: it is
+# the default unless SERVER_WORKERS (below) is over 1.
+DATAFRAME_STORE_SHARED_DIR = os.path.join(MEDIA_ROOT, 'datasets') if SERVER_WORKERS > 1 else None
+DATAFRAME_STORE_MAX_AGE = 14 * 24 * 60 * 60
+
+# Uploads are parsed in chunks of UPLOAD_CHUNK_ROWS rows; UPLOAD_ROW_BUDGET
+# (None for no limit) stops ingestion after that many rows.
+UPLOAD_CHUNK_ROWS = 100_000
+UPLOAD_ROW_BUDGET = None
+# Dtype downcasting applied while ingesting: any of 'integer', 'float' and
+# 'category'. It shrinks uploads considerably, but generated code then sees
+# narrow dtypes: int8 arithmetic overflows, float32 loses precision and
+# categoricals reject new values (fillna('x'), df.col + 'suffix').
+UPLOAD_DOWNCAST = ()
+
+# Frames with at least this many rows are profiled with bounded-memory
+# sketches (approximate samples, top values and distinct counts); None keeps
+# metadata exact for every frame.
+METADATA_APPROXIMATE_ROWS = None
+
+# Generated code runs in this many pre-warmed worker processes, each run
+# limited in CPU seconds, wall-clock seconds and additional address space.
+# 0 runs the code inside the Django process instead.
+EXECUTE_SANDBOX_WORKERS = 2
+EXECUTE_CPU_TIME_LIMIT = 30
+EXECUTE_WALL_TIME_LIMIT = 60
+EXECUTE_MEMORY_LIMIT = 2 * 1024 ** 3
+EXECUTE_SANDBOX_DIR = os.path.join(MEDIA_ROOT, 'sandbox')
+# Code that only selects named columns of df gets just those columns read
+# from the on-disk frame (sandbox workers, spilled datasets).
+EXECUTE_COLUMN_PROJECTION = True
+
+# execute_code results are cached per (dataset version, code) in up to
+# EXECUTE_RESULT_CACHE_BUDGET bytes of memory, and on disk when
+# EXECUTE_RESULT_CACHE_DIR is set.
+EXECUTE_RESULT_CACHE_BUDGET = 64 * 1024 ** 2
+EXECUTE_RESULT_CACHE_DIR = None
+EXECUTE_RESULT_CACHE_DISK_BUDGET = 1024 ** 3
+
+# /replay/ re-runs at most this many history entries in one request.
+REPLAY_MAX_STEPS = 100
+
+# Output rendering: image format ('png', 'webp' or 'svg'), resolution, a cap
+# on the longest side in pixels, and the point count above which artists are
+# rasterized in SVG output (None to keep them vector). Plotly figures are sent
+# as 'json' specs drawn by the page's plotly.js, or as 'html' snippets.
+RENDER_IMAGE_FORMAT = 'png'
+RENDER_DPI = 100
+RENDER_MAX_PIXELS = 2000
+RENDER_RASTERIZE_POINTS = 5000
+RENDER_PLOTLY_FORMAT = 'json'
+# Threads rendering the figures of one run in parallel. Matplotlib does not
+# guarantee thread safety (font cache, text layout, rcParams), so figures
+# are rendered one at a time unless this is raised.
+RENDER_WORKERS = 1
+# Rendered images are served from here; the oldest are removed beyond the budget.
+RENDER_DIR = os.path.join(MEDIA_ROOT, 'renders')
+RENDER_DIR_BUDGET = 512 * 1024 ** 2
+# Table results are stored with the rendered images and paged from there;
+# this many rows are sent with the result itself.
+TABLE_PAGE_ROWS = 100
+
+# The conversation sent to /converse is the latest CHAT_HISTORY_MAX_MESSAGES
+# messages, cut further to fit CHAT_HISTORY_TOKEN_BUDGET (estimated) tokens.
+# The command history is read HISTORY_PAGE_SIZE entries at a time.
+CHAT_HISTORY_TOKEN_BUDGET = 4000
+CHAT_HISTORY_MAX_MESSAGES = 100
+HISTORY_PAGE_SIZE = 50
+
+# Recordings for /transcribe are decoded, resampled to TRANSCRIBE_SAMPLE_RATE
+# and, with TRANSCRIBE_TRIM_SILENCE, trimmed to the frames louder than
+# TRANSCRIBE_VAD_THRESHOLD_DB (RMS, dBFS) plus TRANSCRIBE_VAD_PADDING_MS on each
+# side, then streamed to the backend as WAV. Recordings uploaded in slices
+# are kept in TRANSCRIBE_UPLOAD_DIR until transcribed (at most
+# TRANSCRIBE_UPLOAD_MAX_AGE seconds and TRANSCRIBE_MAX_UPLOAD_BYTES bytes).
+TRANSCRIBE_SAMPLE_RATE = 16000
+TRANSCRIBE_TRIM_SILENCE = True
+TRANSCRIBE_VAD_THRESHOLD_DB = -50.0
+TRANSCRIBE_VAD_PADDING_MS = 300
+TRANSCRIBE_UPLOAD_DIR = os.path.join(MEDIA_ROOT, 'audio_uploads')
+TRANSCRIBE_UPLOAD_MAX_AGE = 600
+TRANSCRIBE_MAX_UPLOAD_BYTES = 10 * 1024 ** 2
+
+# Opt-in downsampling of plots: series with more points than PLOT_POINT_BUDGET
+# are decimated ('minmax' or 'lttb' for lines), thinned to one point per
+# image cell (scatter) or pre-binned (histograms) before rendering. seaborn
+# line plots of larger frames are aggregated per x before seaborn runs and
+# drawn without their error band. None plots every row.
+PLOT_POINT_BUDGET = None
+PLOT_LINE_DOWNSAMPLING = 'minmax'
+
+# DuckDB engine behind sql() in generated code: threads (None = all cores),
+# memory limit before spilling (e.g. '4GB'; None = 80% of RAM) and where it
+# spills.
+SQL_ENGINE_THREADS = None
+SQL_ENGINE_MEMORY_LIMIT = None
+SQL_ENGINE_TEMP_DIR = os.path.join(MEDIA_ROOT, 'duckdb_tmp')
+
+# Metadata sent to /converse: stats and sample cells for the first
+# CONVERSE_METADATA_MAX_COLUMNS columns (None = all; every column name is
+# always sent), CONVERSE_METADATA_SAMPLE_ROWS sample rows and up to
+# CONVERSE_METADATA_MAX_VALUES values per categorical column. It is sent in
+# full, then as its version hash or a column-level delta once the backend
+# has acknowledged the version (X-Metadata-Version response header); a
+# backend that never does keeps getting full metadata. The acknowledged
+# version is remembered for CONVERSE_METADATA_TIMEOUT seconds. False sends
+# full metadata without a version.
+CONVERSE_METADATA_HANDSHAKE = True
+CONVERSE_METADATA_MAX_COLUMNS = None
+CONVERSE_METADATA_SAMPLE_ROWS = 3
+CONVERSE_METADATA_MAX_VALUES = 20
+CONVERSE_METADATA_TIMEOUT = 3600
+
+# /converse replies are cached by normalized command, dataset schema and the
+# last REPLY_CACHE_HISTORY_MESSAGES messages of the conversation, in up to
+# REPLY_CACHE_BUDGET bytes (0 disables it). A REPLY_CACHE_FUZZY_THRESHOLD
+# between 0 and 1 also serves near-identical commands.
+REPLY_CACHE_BUDGET = 32 * 1024 ** 2
+REPLY_CACHE_HISTORY_MESSAGES = 2
+REPLY_CACHE_FUZZY_THRESHOLD = None
+
+# Speech/LLM backend serving /transcribe and /converse. Point it at
+# `python manage.py run_stub_backend` to work offline.
+BACKEND_API_URL = os.environ.get('BACKEND_API_URL', 'http://10.32.15.88:6000')
+# Per-endpoint timeouts in seconds, retries (with exponential backoff) for
+# connection failures and 502/503/504, and the cap on in-flight calls per
+# event loop.
+BACKEND_TIMEOUTS = {'transcribe': 30, 'converse': 120}
+BACKEND_RETRIES = 2
+BACKEND_RETRY_BACKOFF = 0.5
+BACKEND_MAX_CONCURRENCY = 200
+BACKEND_MAX_CONNECTIONS = 100
+
+# Per-stage request timing (see interpreter_app/timing.py): a Server-Timing
+# header on every response, and latency histograms at /metrics/ with
+# quantiles over the last METRICS_WINDOW samples per stage and endpoint.
+SERVER_TIMING = True
+METRICS_WINDOW = 1024
+# wsgi.py/asgi.py import the data libraries and run a warm-up before serving
+# (True), on a background thread so the server starts at once ('background'),
+# or leave them to the first request that needs them (False). Phase timings
+# are in the startup metrics at /metrics/ and `manage.py startup_report`.
+STARTUP_PRELOAD = 'background' if DEBUG else True
+# Share of execute_code calls run under cProfile (0 disables it); runs that
+# take PROFILE_SLOW_MS or more are saved to PROFILE_DIR, keeping the newest
+# PROFILE_MAX_FILES. Read them with `python -m pstats <file>`.
+PROFILE_SAMPLE_RATE = 0.0
+PROFILE_SLOW_MS = 1000
+PROFILE_DIR = os.path.join(MEDIA_ROOT, 'profiles')
+PROFILE_MAX_FILES = 50